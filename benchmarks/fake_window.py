@@ -0,0 +1,231 @@
+"""
+Synthetic Emulator Window.
+
+A stand-in for the `pygetwindow` mGBA window so the agent can run on a headless
+machine. `SyntheticWindow` exposes the attributes the agent reads (`title`,
+`top`, `left`, `width`, `height`, `activate()`, ...) plus a `grab_frame()`
+method, which `SyntheticGrabber` reads for `capture_emulator_window` and
+`CaptureEngine` instead of grabbing the screen. Frames are either generated (a simple scene that reacts
+to button presses) or replayed from a recorded session. Like a real emulator
+window, the game screen can sit below a menu bar and inside letterbox borders,
+which the capture engine's viewport detection has to cut off.
+
+`FakeInputBackend` is an `InputBackend` for `press_gba_button`: it records the
+key events like `RecordingBackend` and forwards key-downs to the focused
+window, so inputs visibly change the synthetic screen.
+"""
+import threading
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+from sims_gba_ai.config.settings import GBA_KEY_MAPPINGS, GBA_NATIVE_RESOLUTION
+from sims_gba_ai.core.frame_grabber import FrameGrabber
+from sims_gba_ai.core.input_dispatcher import RecordingBackend
+from sims_gba_ai.core.window_tracker import WindowGeometry
+
+# Movement of the generated scene's cursor per direction press, in native pixels.
+_CURSOR_STEP = 8
+_CURSOR_SIZE = 16
+_DIRECTIONS = {"Up": (0, -1), "Down": (0, 1), "Left": (-1, 0), "Right": (1, 0)}
+
+
+class SyntheticWindow:
+    """Fake emulator window rendering its own frames.
+
+    In generated mode the screen shows a tiled background, a cursor moved by
+    the d-pad, a dialog box toggled by 'A'/'B' and a pause overlay toggled by
+    'Start'. After every press the screen animates for `transition_frames`
+    grabs before it becomes static again, so screen-settle waits behave like
+    they do on a real game. In replay mode every press advances to the next
+    recorded frame.
+
+    Args:
+        frames: Native-resolution RGB frames to replay. None generates frames.
+        scale: Integer upscaling applied to native frames (mGBA's window is
+               usually 2-4x the GBA resolution).
+        transition_frames: Number of grabs a press keeps the screen moving.
+        title: Window title.
+        menu_bar: Height of a menu bar drawn above the game screen, in pixels.
+        letterbox: Width of the black border around the game screen, in pixels.
+    """
+
+    def __init__(self, frames: Optional[Sequence[np.ndarray]] = None, scale: int = 3,
+                 transition_frames: int = 4, title: str = "mGBA (synthetic)",
+                 menu_bar: int = 0, letterbox: int = 0) -> None:
+        self.title = title
+        self.scale = scale
+        self.transition_frames = transition_frames
+        native_width, native_height = GBA_NATIVE_RESOLUTION
+        if frames:
+            native_height, native_width = frames[0].shape[:2]
+        self.left = 0
+        self.top = 0
+        self.width = native_width * scale + 2 * letterbox
+        self.height = native_height * scale + 2 * letterbox + menu_bar
+        self.isMinimized = False
+        self.isActive = True
+
+        self._frames = frames
+        self._frame_index = 0
+        self._cursor = [native_width // 2, native_height // 2]
+        self._dialog = False
+        self._paused = False
+        self._transition = 0
+        self._background = self._tile_background(native_width, native_height)
+        self._output = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        if menu_bar:
+            self._output[:menu_bar] = 236
+            for item in range(4):
+                self._output[menu_bar // 3:menu_bar // 3 + 4, 8 + item * 48:40 + item * 48] = 30
+        top = menu_bar + letterbox
+        # The game screen inside the window; grabs render into it in place.
+        self._screen = self._output[top:top + native_height * scale, letterbox:letterbox + native_width * scale]
+        self._lock = threading.Lock()
+        self.presses: list[str] = []
+        self.grabs = 0
+
+    @classmethod
+    def from_session(cls, path: str, **kwargs) -> 'SyntheticWindow':
+        """Creates a window replaying the frames of a recorded session."""
+        # Imported here so generated-frame benchmarks don't need a recording.
+        from sims_gba_ai.core.recorder import SessionReader
+        reader = SessionReader(path)
+        if not len(reader):
+            raise ValueError(f"Session '{path}' contains no frames.")
+        return cls(frames=[reader.rgb(i) for i in range(len(reader))], **kwargs)
+
+    # --- pygetwindow.Window compatible surface ---
+
+    def activate(self) -> None:
+        self.isActive = True
+
+    def restore(self) -> None:
+        self.isMinimized = False
+
+    def minimize(self) -> None:
+        self.isMinimized = True
+        self.isActive = False
+
+    # --- Frames ---
+
+    @staticmethod
+    def _tile_background(width: int, height: int) -> np.ndarray:
+        """A floor-tile pattern with a few text-like bars, roughly like an in-game room."""
+        ys, xs = np.mgrid[0:height, 0:width]
+        checker = ((xs // 16 + ys // 16) % 2).astype(np.uint8)
+        background = np.empty((height, width, 3), dtype=np.uint8)
+        background[..., 0] = 90 + 40 * checker
+        background[..., 1] = 70 + 30 * checker
+        background[..., 2] = 50
+        for row in range(3):
+            top = 8 + row * 10
+            background[top:top + 4, 8:8 + 40 + 30 * row] = 230
+        return background
+
+    def _render_native(self) -> np.ndarray:
+        """Builds the current native-resolution frame."""
+        if self._frames:
+            return self._frames[self._frame_index % len(self._frames)]
+
+        frame = self._background.copy()
+        x, y = self._cursor
+        frame[y:y + _CURSOR_SIZE, x:x + _CURSOR_SIZE] = (40, 160, 230)
+        if self._dialog:
+            frame[-48:-8, 8:-8] = 245
+            frame[-40:-36, 16:160] = 20
+            frame[-28:-24, 16:120] = 20
+        if self._paused:
+            frame //= 3
+        if self._transition:
+            # Simulate a screen transition: shift the brightness for a few frames.
+            frame = np.clip(frame.astype(np.int16) + 12 * self._transition, 0, 255).astype(np.uint8)
+        return frame
+
+    def grab_frame(self) -> np.ndarray:
+        """Returns the current window contents as an RGB array of shape (height, width, 3).
+
+        The array is reused by the next grab.
+        """
+        with self._lock:
+            native = self._render_native()
+            if self._transition:
+                self._transition -= 1
+            self.grabs += 1
+            scaled = native.repeat(self.scale, axis=0).repeat(self.scale, axis=1)
+            np.copyto(self._screen, scaled)
+            return self._output
+
+    # --- Input ---
+
+    def press(self, button: str) -> None:
+        """Applies a GBA button press to the synthetic game state."""
+        with self._lock:
+            self.presses.append(button)
+            self._transition = self.transition_frames
+            if self._frames:
+                self._frame_index += 1
+                return
+            if button == "Start":
+                self._paused = not self._paused
+            elif self._paused:
+                return
+            elif button in _DIRECTIONS and not self._dialog:
+                dx, dy = _DIRECTIONS[button]
+                native_width, native_height = self._background.shape[1], self._background.shape[0]
+                self._cursor[0] = min(max(self._cursor[0] + dx * _CURSOR_STEP, 0), native_width - _CURSOR_SIZE)
+                self._cursor[1] = min(max(self._cursor[1] + dy * _CURSOR_STEP, 0), native_height - _CURSOR_SIZE)
+            elif button == "A":
+                self._dialog = not self._dialog
+            elif button == "B":
+                self._dialog = False
+
+
+class SyntheticGrabber(FrameGrabber):
+    """`FrameGrabber` reading the frames `SyntheticWindow`s render, instead of the screen."""
+
+    def grab(self, session, window: SyntheticWindow, geometry: WindowGeometry) -> np.ndarray:
+        # The window renders its whole client area; cut out what would be grabbed from the screen.
+        return geometry.crop(window.grab_frame())
+
+
+class FakeInputBackend(RecordingBackend):
+    """Records key events and forwards key-downs to the focused `SyntheticWindow`.
+
+    Like a real keyboard, a key goes to whichever window has focus, so with
+    several windows misdirected inputs show up as presses in the wrong game.
+
+    Args:
+        windows: The synthetic window, or windows, receiving the presses. The
+                 first one starts out focused.
+        key_mappings: GBA button name -> keyboard key, used to map keys back
+                      to buttons.
+    """
+
+    shared_focus = True
+
+    def __init__(self, windows: Union[SyntheticWindow, Sequence[SyntheticWindow]],
+                 key_mappings: dict[str, str] = GBA_KEY_MAPPINGS) -> None:
+        super().__init__()
+        self.windows = [windows] if isinstance(windows, SyntheticWindow) else list(windows)
+        self.window = self.windows[0]
+        for other in self.windows[1:]:
+            other.isActive = False
+        self.focused = True
+        self._buttons = {key: button for button, key in key_mappings.items()}
+
+    def key_down(self, key: str) -> None:
+        super().key_down(key)
+        button = self._buttons.get(key)
+        target = next((window for window in self.windows if window.isActive), None)
+        if button and target is not None:
+            target.press(button)
+
+    def is_focused(self, window) -> bool:
+        return self.focused and window.isActive
+
+    def activate(self, window) -> None:
+        super().activate(window)
+        for other in self.windows:
+            other.isActive = False
+        window.activate()
@@ -0,0 +1,196 @@
+"""
+Import-Time Report.
+
+Shows what importing the agent's modules costs and where that time goes,
+from CPython's `-X importtime` output. Each target module is imported in a
+fresh interpreter (the fastest of `--repeat` runs is kept). The report lists
+the modules with the highest self time, the cost per top-level package, and
+which project module pulled in each third-party package, so an eager import
+of a heavy backend is easy to spot.
+
+Usage (from the project root):
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time sims_gba_ai.core.recorder --top 10
+    python -m benchmarks.import_time --json imports.json
+    python -m benchmarks.import_time --baseline imports.json  # exit 1 on regression
+"""
+import argparse
+import json
+import re
+import subprocess
+import sys
+from dataclasses import dataclass, field
+from typing import Optional
+
+# Imported by the agent, replay tools and the screen classifier CLI.
+DEFAULT_TARGETS = (
+    "sims_gba_ai.core",
+    "sims_gba_ai.core.recorder",
+    "sims_gba_ai.core.screen_classifier",
+    "sims_gba_ai.main",
+)
+PROJECT_PACKAGE = "sims_gba_ai"
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$")
+
+
+@dataclass
+class ImportRecord:
+    """One module in the `-X importtime` tree (times in microseconds)."""
+    name: str
+    self_us: int
+    cumulative_us: int
+    children: list['ImportRecord'] = field(default_factory=list)
+
+    @property
+    def package(self) -> str:
+        return self.name.split('.')[0]
+
+
+def parse_importtime(output: str) -> list[ImportRecord]:
+    """Parses `-X importtime` stderr into a forest of `ImportRecord`s.
+
+    Modules are printed after the modules they import, indented two spaces
+    per nesting level.
+    """
+    pending: dict[int, list[ImportRecord]] = {}
+    for line in output.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        depth = (len(match.group(3)) - 1) // 2
+        record = ImportRecord(match.group(4), int(match.group(1)), int(match.group(2)))
+        record.children = pending.pop(depth + 1, [])
+        pending.setdefault(depth, []).append(record)
+    return pending.get(0, [])
+
+
+def _walk(records: list[ImportRecord]):
+    for record in records:
+        yield record
+        yield from _walk(record.children)
+
+
+def _third_party(name: str) -> bool:
+    package = name.split('.')[0]
+    return package != PROJECT_PACKAGE and package not in sys.stdlib_module_names and not package.startswith('_')
+
+
+def _pulled_in(records: list[ImportRecord], importer: Optional[str] = None) -> dict[tuple[str, str], int]:
+    """(project module, third-party package) -> cumulative import time of that package."""
+    costs: dict[tuple[str, str], int] = {}
+    for record in records:
+        if _third_party(record.name) and importer is not None:
+            key = (importer, record.package)
+            costs[key] = costs.get(key, 0) + record.cumulative_us
+            continue  # Its own imports are part of its cumulative time.
+        owner = record.name if record.package == PROJECT_PACKAGE else importer
+        for key, cost in _pulled_in(record.children, owner).items():
+            costs[key] = costs.get(key, 0) + cost
+    return costs
+
+
+def measure(target: str, repeat: int = 3) -> dict:
+    """Imports `target` in fresh interpreters and returns the fastest run's report.
+
+    Raises:
+        RuntimeError: If the import fails.
+    """
+    best: Optional[list[ImportRecord]] = None
+    best_total = None
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {target}"],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing {target} failed:\n{result.stderr.strip().splitlines()[-1]}")
+        roots = parse_importtime(result.stderr)
+        # Interpreter start-up imports come first and end with `site`.
+        names = [record.name for record in roots]
+        roots = roots[names.index("site") + 1:] if "site" in names else roots
+        total = sum(record.cumulative_us for record in roots)
+        if best_total is None or total < best_total:
+            best, best_total = roots, total
+
+    records = list(_walk(best))
+    packages: dict[str, int] = {}
+    for record in records:
+        packages[record.package] = packages.get(record.package, 0) + record.self_us
+    return {
+        "target": target,
+        "total_ms": best_total / 1000,
+        "modules": len(records),
+        "slowest": [
+            {"module": record.name, "self_ms": record.self_us / 1000, "cumulative_ms": record.cumulative_us / 1000}
+            for record in sorted(records, key=lambda record: record.self_us, reverse=True)
+        ],
+        "packages": {name: cost / 1000 for name, cost in sorted(packages.items(), key=lambda item: -item[1])},
+        "pulled_in": [
+            {"by": importer, "package": package, "cumulative_ms": cost / 1000}
+            for (importer, package), cost in sorted(_pulled_in(best).items(), key=lambda item: -item[1])
+        ],
+    }
+
+
+def print_report(report: dict, top: int) -> None:
+    print(f"\n{report['target']}: {report['total_ms']:.1f} ms, {report['modules']} modules")
+    print(f"  {'slowest modules (self)':<48} {'self':>9} {'cumul.':>9}")
+    for entry in report["slowest"][:top]:
+        print(f"  {entry['module']:<48} {entry['self_ms']:>7.1f}ms {entry['cumulative_ms']:>7.1f}ms")
+    print("  per package: " + ", ".join(
+        f"{name} {cost:.1f}ms" for name, cost in list(report["packages"].items())[:top]))
+    if report["pulled_in"]:
+        print("  third-party packages imported by project modules:")
+        for entry in report["pulled_in"][:top]:
+            print(f"    {entry['by']} -> {entry['package']} ({entry['cumulative_ms']:.1f} ms)")
+
+
+def compare_to_baseline(reports: list[dict], baseline: list[dict], tolerance: float,
+                        slack_ms: float = 5.0) -> list[str]:
+    """Returns a message per target whose import got slower than the baseline allows.
+
+    `slack_ms` absorbs timer noise on imports that take only a few milliseconds.
+    """
+    previous = {report["target"]: report for report in baseline}
+    regressions = []
+    for report in reports:
+        old = previous.get(report["target"])
+        if old and report["total_ms"] > old["total_ms"] * (1 + tolerance) + slack_ms:
+            regressions.append(f"{report['target']}: {old['total_ms']:.1f} ms -> {report['total_ms']:.1f} ms")
+    return regressions
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("targets", nargs="*", default=list(DEFAULT_TARGETS), help="Modules to import.")
+    parser.add_argument("--repeat", type=int, default=3, help="Imports per target; the fastest is reported.")
+    parser.add_argument("--top", type=int, default=8, help="Rows shown per table.")
+    parser.add_argument("--json", help="Write the reports to this JSON file.")
+    parser.add_argument("--baseline", help="Compare against a previous JSON report; exit 1 on regression.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression vs. baseline (fraction).")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = parse_args(argv)
+    reports = [measure(target, args.repeat) for target in args.targets]
+    for report in reports:
+        print_report(report, args.top)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+        print(f"Report written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_to_baseline(reports, json.load(f), args.tolerance)
+        if regressions:
+            print("Import-time regressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,354 @@
+"""
+Main Loop Benchmark.
+
+Runs `main_loop` offline against a `SyntheticWindow` (generated or replayed
+frames), a local `StubLLMServer` and a `FakeInputBackend`, then reports
+per-stage p50/p95/p99 latency, loop throughput and memory use. Nothing needs
+a display, an emulator or a real LLM, so this runs on a headless Linux box.
+
+Usage (from the project root):
+    python -m benchmarks.run_benchmark --iterations 50 --latency 0.4 --jitter 0.2
+    python -m benchmarks.run_benchmark --json results.json
+    python -m benchmarks.run_benchmark --baseline results.json  # exit 1 on regression
+    python -m benchmarks.run_benchmark --no-stream  # compare against non-streaming requests
+    python -m benchmarks.run_benchmark --instances 4  # multi-emulator orchestrator
+
+Stage latencies come from the per-iteration `latencies` the loops already
+pass to the session recorder: the benchmark swaps `SessionRecorder` for a
+collector (optionally still writing a real recording with `--record-dir`).
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import redirect_stdout
+from typing import Optional
+
+from sims_gba_ai.config import settings
+
+try:
+    import resource  # Unix only.
+except ImportError:
+    resource = None
+
+# Stages whose p95 latency is compared against a baseline.
+_GATED_STAGES = ("capture", "ocr", "decide", "act", "iteration")
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of `values` (pct in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+class StageRecorder:
+    """Collects the stage latencies of every loop iteration.
+
+    Used in place of `SessionRecorder`; calls are forwarded to `inner` if given.
+    Thread-safe, so the agents of a multi-instance run can share one; the
+    "iteration" stage is timed per agent thread.
+    """
+
+    def __init__(self, inner=None) -> None:
+        self.inner = inner
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.iterations = 0
+        self.cache_hits = 0
+        self.started = time.perf_counter()
+        self._last: dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, frame, *, latencies: Optional[dict[str, float]] = None, **kwargs) -> int:
+        now = time.perf_counter()
+        with self._lock:
+            for stage, seconds in (latencies or {}).items():
+                self.samples[stage].append(seconds)
+            thread = threading.get_ident()
+            self.samples["iteration"].append(now - self._last.get(thread, self.started))
+            self._last[thread] = now
+            self.iterations += 1
+            if kwargs.get("from_cache"):
+                self.cache_hits += 1
+            if self.inner:
+                self.inner.record(frame, latencies=latencies, **kwargs)
+            return self.iterations - 1
+
+    def close(self) -> None:
+        # Called once per agent; the inner recording is closed at the end of the run.
+        pass
+
+
+def _configure(args: argparse.Namespace, base_url: str, ocr: str) -> None:
+    """Points the agent at the stub server and applies benchmark settings.
+
+    Must run before the agent modules are imported, since they copy settings
+    into module globals and default arguments at import time.
+    """
+    settings.LLM_PROVIDER = "lmstudio"
+    settings.LMSTUDIO_API_BASE = base_url
+    settings.LOOP_MODE = args.mode
+    settings.LLM_STREAMING = args.stream
+    settings.LLM_MAX_CONCURRENT_REQUESTS = args.max_concurrent
+    settings.FRAME_WORKERS = args.frame_workers
+    if ocr == "off":
+        settings.FRAME_WORKER_TASKS = tuple(task for task in settings.FRAME_WORKER_TASKS if task != "ocr")
+    settings.PLAN_MODE_ENABLED = args.plan_mode
+    settings.TEXT_FIRST_ENABLED = args.text_first
+    settings.SPECULATIVE_INFERENCE = args.speculative
+    settings.STUCK_DETECTION_ENABLED = args.stuck_detection
+    settings.DECISION_CACHE_ENABLED = not args.no_cache
+    settings.DECISION_CACHE_PATH = None  # Never read or overwrite the real cache.
+    settings.ADAPTIVE_SCHEDULING = not args.fixed_delay
+    settings.RECORDING_ENABLED = True  # Replaced by the StageRecorder.
+    settings.LOG_LEVEL = "INFO" if args.verbose else "WARNING"
+    if args.loop_delay is not None:
+        settings.LOOP_DELAY = args.loop_delay
+    if args.templates:
+        settings.SCREEN_TEMPLATE_DIR = args.templates
+    settings.SCREEN_CLASSIFIER_ENABLED = bool(args.templates)
+
+
+def _tesseract_available() -> bool:
+    return bool(shutil.which(settings.TESSERACT_CMD_PATH or "tesseract"))
+
+
+def run(args: argparse.Namespace) -> dict:
+    """Runs one benchmark and returns the report."""
+    from benchmarks.stub_llm_server import StubLLMServer
+
+    responses = [r.strip() for r in args.responses.split(",") if r.strip()]
+    with StubLLMServer(responses, latency=args.latency, jitter=args.jitter,
+                       error_rate=args.error_rate, token_delay=args.token_delay, capacity=args.stub_capacity,
+                       text_latency=args.text_latency, seed=args.seed) as server:
+        ocr = args.ocr
+        if ocr == "auto":
+            ocr = "tesseract" if _tesseract_available() else "off"
+        _configure(args, server.base_url, ocr)
+
+        # Imported after _configure so the overridden settings are picked up.
+        from benchmarks.fake_window import FakeInputBackend, SyntheticGrabber, SyntheticWindow
+        from sims_gba_ai import main, pipeline
+        from sims_gba_ai.core import metrics
+        from sims_gba_ai.core.frame_grabber import set_default_grabber
+        from sims_gba_ai.core.input_dispatcher import set_default_backend
+        from sims_gba_ai.core.llm_client import provider_stats
+        from sims_gba_ai.core.llm_interaction import path_stats
+        from sims_gba_ai.core.recorder import SessionRecorder
+
+        windows = []
+        chrome = {"menu_bar": 20, "letterbox": 24} if args.window_chrome else {}
+        for index in range(args.instances):
+            if args.session:
+                window = SyntheticWindow.from_session(args.session, scale=args.scale, **chrome)
+            else:
+                window = SyntheticWindow(scale=args.scale, **chrome)
+            window.title = f"{window.title} #{index}"
+            windows.append(window)
+        set_default_backend(FakeInputBackend(windows))
+        set_default_grabber(SyntheticGrabber())
+
+        if ocr == "off":
+            main.read_regions = pipeline.read_regions = lambda image: {}
+
+        inner = SessionRecorder(args.record_dir) if args.record_dir else None
+        stage_recorder = StageRecorder(inner)
+        main.SessionRecorder = lambda: stage_recorder
+
+        if args.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, redirect_stdout(sys.stdout if args.verbose else devnull):
+            if args.instances == 1:
+                main.main_loop(windows[0], max_iterations=args.iterations)
+            else:
+                from sims_gba_ai.orchestrator import Orchestrator
+                Orchestrator(windows=windows, rescan_interval=0,
+                             recorder_factory=lambda index: stage_recorder).run(args.iterations)
+        wall = time.perf_counter() - start
+        if inner:
+            inner.close()
+        traced_peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+        if args.trace_memory:
+            tracemalloc.stop()
+        set_default_backend(None)
+        set_default_grabber(None)
+
+        report = {
+            "config": {
+                "mode": args.mode,
+                "instances": args.instances,
+                "iterations": args.iterations,
+                "latency": args.latency,
+                "jitter": args.jitter,
+                "error_rate": args.error_rate,
+                "stream": args.stream,
+                "token_delay": args.token_delay,
+                "ocr": ocr,
+                "frame_workers": args.frame_workers,
+                "plan_mode": args.plan_mode,
+                "text_first": args.text_first,
+                "speculative": args.speculative,
+                "stuck_detection": args.stuck_detection,
+                "cache": not args.no_cache,
+                "frames": "session" if args.session else "generated",
+            },
+            "wall_seconds": wall,
+            "iterations": stage_recorder.iterations,
+            "throughput_per_s": stage_recorder.iterations / wall if wall else 0.0,
+            "cache_hits": stage_recorder.cache_hits,
+            "stages": {
+                stage: {
+                    "count": len(values),
+                    "mean_ms": sum(values) / len(values) * 1000,
+                    "p50_ms": percentile(values, 50) * 1000,
+                    "p95_ms": percentile(values, 95) * 1000,
+                    "p99_ms": percentile(values, 99) * 1000,
+                }
+                for stage, values in stage_recorder.samples.items() if values
+            },
+            "memory": {
+                "traced_peak_mb": traced_peak / 2**20 if traced_peak is not None else None,
+                # ru_maxrss is in KiB on Linux.
+                "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else None,
+            },
+            "stub_server": server.stats(),
+            "window": {"grabs": sum(window.grabs for window in windows),
+                       "presses": sum(len(window.presses) for window in windows)},
+            "providers": provider_stats(),
+            "llm_paths": path_stats(),
+            "counters": metrics.REGISTRY.snapshot()["counters"],
+        }
+    return report
+
+
+def print_report(report: dict) -> None:
+    """Prints a human-readable summary of a report."""
+    config = report["config"]
+    print(f"Benchmark: mode={config['mode']} instances={config['instances']} frames={config['frames']} ocr={config['ocr']} "
+          f"frame_workers={config.get('frame_workers', 0)} "
+          f"plan_mode={config['plan_mode']} cache={config['cache']} "
+          f"stub latency={config['latency']}s+{config['jitter']}s "
+          f"stream={config['stream']} token_delay={config['token_delay']}s")
+    print(f"{'stage':<12} {'count':>6} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for stage, values in report["stages"].items():
+        print(f"{stage:<12} {values['count']:>6} {values['mean_ms']:>7.1f}ms {values['p50_ms']:>7.1f}ms "
+              f"{values['p95_ms']:>7.1f}ms {values['p99_ms']:>7.1f}ms")
+    print(f"Iterations: {report['iterations']} in {report['wall_seconds']:.2f}s "
+          f"({report['throughput_per_s']:.2f}/s), cache hits: {report['cache_hits']}")
+    memory = report["memory"]
+    if memory["traced_peak_mb"] is not None:
+        print(f"Python heap peak: {memory['traced_peak_mb']:.1f} MB")
+    if memory["max_rss_mb"] is not None:
+        print(f"Max RSS: {memory['max_rss_mb']:.1f} MB")
+    print(f"Stub server: {report['stub_server']}, window: {report['window']}")
+    if config.get("text_first"):
+        for path, stats in report["llm_paths"].items():
+            print(f"LLM {path} path: {stats}")
+    for name, series in report["counters"].items():
+        print(f"{name}: {series}")
+
+
+def compare_to_baseline(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Returns descriptions of metrics that regressed by more than `tolerance` (a fraction)."""
+    regressions = []
+    for stage in _GATED_STAGES:
+        old = baseline.get("stages", {}).get(stage)
+        new = report["stages"].get(stage)
+        if old and new and new["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{stage} p95 {old['p95_ms']:.1f}ms -> {new['p95_ms']:.1f}ms")
+    old_throughput = baseline.get("throughput_per_s")
+    if old_throughput and report["throughput_per_s"] < old_throughput * (1 - tolerance):
+        regressions.append(f"throughput {old_throughput:.2f}/s -> {report['throughput_per_s']:.2f}/s")
+    old_rss = baseline.get("memory", {}).get("max_rss_mb")
+    new_rss = report["memory"]["max_rss_mb"]
+    if old_rss and new_rss and new_rss > old_rss * (1 + tolerance):
+        regressions.append(f"max RSS {old_rss:.1f}MB -> {new_rss:.1f}MB")
+    return regressions
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline benchmark of the Sims GBA AI main loop.")
+    parser.add_argument("--iterations", type=int, default=30, help="Loop iterations to run (per instance).")
+    parser.add_argument("--instances", type=int, default=1,
+                        help="Synthetic emulator windows driven at once through the orchestrator.")
+    parser.add_argument("--mode", choices=("sequential", "pipelined"), default="sequential")
+    parser.add_argument("--latency", type=float, default=0.3, help="Stub LLM base latency (s).")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Stub LLM extra random latency (s).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of stub requests failing with 503.")
+    parser.add_argument("--responses", default="A,Right,Down,B,Left,Up",
+                        help="Comma-separated stub responses, returned in turn.")
+    parser.add_argument("--stream", action=argparse.BooleanOptionalAction, default=True,
+                        help="Stream suggestions and stop at the first button (LLM_STREAMING).")
+    parser.add_argument("--token-delay", type=float, default=0.02,
+                        help="Stub delay between streamed tokens (s); --latency is the time to first token.")
+    parser.add_argument("--stub-capacity", type=int, default=0,
+                        help="Requests the stub serves at once, like an inference server's slots (0 = unlimited).")
+    parser.add_argument("--max-concurrent", type=int, default=0,
+                        help="Agent-side limit on LLM requests in flight (LLM_MAX_CONCURRENT_REQUESTS).")
+    parser.add_argument("--frame-workers", type=int, default=0,
+                        help="Frame worker processes for OCR, encoding and classification (FRAME_WORKERS).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--session", help="Replay frames from a recorded session directory.")
+    parser.add_argument("--scale", type=int, default=3, help="Synthetic window upscaling factor.")
+    parser.add_argument("--window-chrome", action="store_true",
+                        help="Draw a menu bar and letterbox borders around the synthetic game screen.")
+    parser.add_argument("--ocr", choices=("auto", "tesseract", "off"), default="auto",
+                        help="'auto' disables OCR when Tesseract is not installed.")
+    parser.add_argument("--plan-mode", action="store_true", help="Request multi-button plans.")
+    parser.add_argument("--text-first", action="store_true",
+                        help="Ask a text model from the OCR text first (TEXT_FIRST_ENABLED); needs OCR.")
+    parser.add_argument("--text-latency", type=float,
+                        help="Stub delay for text-only requests (s), like a smaller model. Default: --latency.")
+    parser.add_argument("--speculative", action="store_true",
+                        help="Start LLM requests before the screen settles (SPECULATIVE_INFERENCE).")
+    parser.add_argument("--stuck-detection", action="store_true",
+                        help="Detect stuck loops and send montages of recent frames (STUCK_DETECTION_ENABLED).")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the decision cache.")
+    parser.add_argument("--templates", help="Enable the screen classifier with this template directory.")
+    parser.add_argument("--fixed-delay", action="store_true", help="Use LOOP_DELAY instead of adaptive scheduling.")
+    parser.add_argument("--loop-delay", type=float, help="Override LOOP_DELAY (s).")
+    parser.add_argument("--record-dir", help="Also write a session recording to this directory.")
+    parser.add_argument("--no-trace-memory", dest="trace_memory", action="store_false",
+                        help="Skip tracemalloc (lower overhead, no heap peak).")
+    parser.add_argument("--json", help="Write the report to this JSON file.")
+    parser.add_argument("--baseline", help="Compare against a previous JSON report; exit 1 on regression.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression vs. baseline (fraction).")
+    parser.add_argument("--verbose", action="store_true", help="Show the agent's own output.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_to_baseline(report, json.load(f), args.tolerance)
+        if regressions:
+            print("Performance regressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""
+Stub LLM Server.
+
+A local OpenAI-compatible HTTP server for benchmarks. It answers
+`POST /v1/chat/completions` after a configurable delay with canned (or
+computed) responses, and can inject errors, so the agent's LLM path can be
+measured without LM Studio or OpenRouter.
+
+Requests with `"stream": true` are answered with a server-sent events stream
+of `chat.completion.chunk` objects, one short token every `token_delay`
+seconds, like LM Studio's streaming API. The server counts streams the client
+closed before the end, which shows early termination working.
+
+Requests without an image (the agent's text-first requests) can be answered
+after a shorter `text_latency`, like a small text model, and every completion
+reports an estimate of its prompt tokens in `usage`.
+"""
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional, Sequence, Union
+
+Responder = Callable[[dict], str]
+
+# Roughly token-sized pieces: up to four characters, with leading whitespace.
+_TOKEN = re.compile(r"\s*\S{1,4}")
+# Prompt tokens counted per image: a GBA-sized image costs one 512px tile
+# (85 + 170 tokens) in OpenAI's vision pricing scheme.
+_IMAGE_TOKENS = 255
+
+
+def _prompt_tokens(payload: dict) -> tuple[int, bool]:
+    """Estimates the prompt tokens of a chat payload. Returns `(tokens, has_image)`."""
+    characters = images = 0
+    for message in payload.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            characters += len(content)
+            continue
+        for item in content or []:
+            if item.get("type") == "text":
+                characters += len(item["text"])
+            elif item.get("type") == "image_url":
+                images += 1
+    return characters // 4 + images * _IMAGE_TOKENS, images > 0
+
+
+class StubLLMServer:
+    """OpenAI-compatible `/chat/completions` server running on a background thread.
+
+    Args:
+        responses: Response texts returned in turn, or a callable mapping the
+                   request payload to a response text.
+        latency: Base delay before answering, in seconds.
+        jitter: Extra uniformly distributed delay (0..jitter seconds).
+        error_rate: Fraction of requests answered with HTTP 503.
+        token_delay: Delay between streamed tokens, in seconds. `latency`
+                     is the delay before the first one.
+        capacity: Requests generated at once, like the parallel slots of an
+                  inference server; further requests wait. 0 for unlimited.
+        text_latency: Base delay for requests without an image. None uses `latency`.
+        statuses: HTTP error statuses answered to the first requests in turn
+                  (e.g. `(429, 503)`), before any normal answer.
+        retry_after: `Retry-After` header value sent with `statuses`, or None.
+        host: Interface to bind.
+        port: Port to bind; 0 picks a free port.
+        seed: Seed for the latency jitter and error injection.
+
+    Example:
+        with StubLLMServer(["A", "Up"], latency=0.4) as server:
+            settings.LMSTUDIO_API_BASE = server.base_url
+    """
+
+    def __init__(self, responses: Union[Sequence[str], Responder] = ("A",),
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 token_delay: float = 0.0, capacity: int = 0, text_latency: Optional[float] = None,
+                 statuses: Sequence[int] = (), retry_after: Optional[str] = None,
+                 host: str = "127.0.0.1", port: int = 0, seed: Optional[int] = None) -> None:
+        if callable(responses):
+            self._responder = responses
+        else:
+            cycle = itertools.cycle(list(responses))
+            self._responder = lambda payload: next(cycle)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.token_delay = token_delay
+        self.text_latency = text_latency
+        self.retry_after = retry_after
+        self._statuses = list(statuses)
+        self._slots = threading.BoundedSemaphore(capacity) if capacity else None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.text_requests = 0
+        self.errors = 0
+        self.request_bytes = 0
+        self.streams = 0
+        self.streams_closed_early = 0
+        self.tokens_sent = 0
+
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """API base URL to configure as `LMSTUDIO_API_BASE`."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> None:
+        """Starts serving on a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="StubLLMServer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the server and closes its socket."""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> 'StubLLMServer':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+    def stats(self) -> dict:
+        """Returns request counters."""
+        with self._lock:
+            return {"requests": self.requests, "text_requests": self.text_requests, "errors": self.errors, "request_bytes": self.request_bytes,
+                    "streams": self.streams, "streams_closed_early": self.streams_closed_early,
+                    "tokens_sent": self.tokens_sent}
+
+    def _admit(self, body: bytes) -> tuple[dict, Optional[int]]:
+        """Counts a request and waits its latency. Returns `(payload, error_status)`."""
+        payload = json.loads(body or b"{}")
+        _, has_image = _prompt_tokens(payload)
+        with self._lock:
+            self.requests += 1
+            self.request_bytes += len(body)
+            latency = self.latency
+            if not has_image:
+                self.text_requests += 1
+                if self.text_latency is not None:
+                    latency = self.text_latency
+            delay = latency + self._random.uniform(0, self.jitter)
+            if self._statuses:
+                status = self._statuses.pop(0)
+            else:
+                status = 503 if self._random.random() < self.error_rate else None
+            if status is not None:
+                self.errors += 1
+        time.sleep(delay)
+        return payload, status
+
+    def _completion(self, payload: dict) -> dict:
+        """Builds the JSON body of a non-streaming completion."""
+        content = self._responder(payload)
+        prompt_tokens, _ = _prompt_tokens(payload)
+        completion_tokens = len(_TOKEN.findall(content))
+        return {
+            "id": f"chatcmpl-stub-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "stub-model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def _make_handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 keeps connections alive, like the real providers.
+            protocol_version = "HTTP/1.1"
+
+            def _send_json(self, status: int, body: dict, headers: Optional[dict[str, str]] = None) -> None:
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, payload: dict) -> None:
+                content = server._responder(payload)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                # No Content-Length: the end of the stream is the end of the connection.
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+
+                chunk = {"id": f"chatcmpl-stub-{server.requests}", "object": "chat.completion.chunk",
+                         "created": int(time.time()), "model": payload.get("model", "stub-model")}
+                events = [{"role": "assistant", "content": token} for token in _TOKEN.findall(content)]
+                with server._lock:
+                    server.streams += 1
+                try:
+                    for index, delta in enumerate(events):
+                        if index and server.token_delay:
+                            time.sleep(server.token_delay)
+                        event = {**chunk, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                        self.wfile.write(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+                        self.wfile.flush()
+                        with server._lock:
+                            server.tokens_sent += 1
+                    event = {**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+                    self.wfile.write(f"data: {json.dumps(event)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    with server._lock:
+                        server.streams_closed_early += 1
+
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not self.path.rstrip('/').endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                    return
+                if server._slots:
+                    server._slots.acquire()
+                try:
+                    payload, status = server._admit(body)
+                    if status is not None:
+                        headers = {"Retry-After": server.retry_after} if server.retry_after is not None else None
+                        self._send_json(status, {"error": {"message": "Injected stub server error",
+                                                           "type": "server_error"}}, headers)
+                    elif payload.get("stream"):
+                        self._send_stream(payload)
+                    else:
+                        self._send_json(200, server._completion(payload))
+                finally:
+                    if server._slots:
+                        server._slots.release()
+
+            def do_GET(self) -> None:
+                if self.path.rstrip('/').endswith("/models"):
+                    self._send_json(200, {"object": "list", "data": [{"id": "stub-model", "object": "model"}]})
+                else:
+                    self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+            def log_message(self, format: str, *args) -> None:
+                pass  # Keep benchmark output readable.
+
+        return Handler
@@ -0,0 +1,703 @@
+"""
+Agent Step Helpers.
+
+Building blocks shared by the agent loops (`main.main_loop` and the pipelined
+loop in `pipeline.py`): reading frames from the capture engine, choosing a
+button or action plan (decision cache first, then the LLM) and executing it,
+including the 'A' then 'START' fallback for paused screens.
+
+With `FRAME_WORKERS` set, `prefetch_frame` starts OCR, image encoding and
+screen classification of a new frame in the frame worker processes as soon
+as it is read; the loop and the `DecisionMaker` then pick up the results.
+
+With `TEXT_FIRST_ENABLED`, the `DecisionMaker` first asks a text-only model,
+from the OCR'd screen text and a short state summary, and sends the
+screenshot to the vision model only if the OCR confidence is low or the text
+model's answer is invalid.
+
+With `SPECULATIVE_INFERENCE`, `speculate_after_input` starts the next LLM
+request on the first frame captured after an input, while the loop still
+waits for the screen to settle. The next decision uses the request's answer
+if the settled frame matches the speculated one, and cancels it otherwise.
+
+With `STUCK_DETECTION_ENABLED`, a `FrameHistory` of the recent decisions
+tells the `DecisionMaker` when the agent is going in circles; it then shows
+the LLM a montage of the last frames and inputs (see `frame_history.py`).
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from PIL import Image
+
+from sims_gba_ai.core import metrics
+from sims_gba_ai.core.action_plan import (
+    PlanStep, describe_plan, execute_plan, format_plan, parse_plan,
+)
+from sims_gba_ai.core.capture_engine import CaptureEngine
+from sims_gba_ai.core.change_detection import detect_change
+from sims_gba_ai.core.decision_cache import DecisionCache, dhash, hamming_distance
+from sims_gba_ai.core.frame_history import FrameHistory, StuckContext, StuckPattern
+from sims_gba_ai.core.frame_transport import FrameRef, FrameWorkerPool, get_frame_pool
+from sims_gba_ai.core.image_encoding import EncodedImage, encode_frame_task
+from sims_gba_ai.core.input_simulation import press_gba_button
+from sims_gba_ai.core.ocr import OCRResult, format_ocr_results, read_regions, read_regions_task
+from sims_gba_ai.core.scheduler import AdaptiveScheduler, WaitRecord
+from sims_gba_ai.core.screen_classifier import ScreenClassifier, ScreenMatch, classify_task
+from sims_gba_ai.core.llm_interaction import (
+    LLMExchange, cancellable, get_last_exchange, get_llm_suggestion, get_llm_plan, get_text_plan,
+    get_text_suggestion,
+)
+from sims_gba_ai.config.settings import (
+    DECISION_CACHE_HAMMING_TOLERANCE, FRAME_WAIT_TIMEOUT, FRAME_WORKER_TASKS, PLAN_MODE_ENABLED,
+    SPECULATION_DELAY, SPECULATION_HAMMING_TOLERANCE, SPECULATIVE_INFERENCE,
+    TEXT_FIRST_ENABLED, TEXT_FIRST_MIN_CHARS, TEXT_FIRST_MIN_CONFIDENCE,
+)
+
+# Pause after pressing 'A' before checking whether the screen changed.
+A_VERIFY_DELAY: float = 0.5
+
+# Console labels for `DecisionMaker.last_source`.
+SOURCE_LABELS: dict[str, str] = {"rule": "Screen rule", "cache": "Decision cache", "llm": "LLM",
+                                 "text": "Text LLM", "stuck": "LLM (stuck, with recent frames)"}
+
+
+@metrics.timed("capture")
+def latest_frame(engine: CaptureEngine, after_seq: int = -1) -> Optional[tuple[int, Image.Image]]:
+    """Returns `(sequence, image)` for the newest captured frame newer than `after_seq`."""
+    result = engine.wait_for_frame(after_seq, timeout=FRAME_WAIT_TIMEOUT)
+    if result is None:
+        return None
+    return result[0], Image.fromarray(result[1])
+
+
+def latest_frame_image(engine: CaptureEngine, after_seq: int = -1) -> Optional[Image.Image]:
+    """Returns the newest captured frame (newer than `after_seq`) as a PIL Image."""
+    result = latest_frame(engine, after_seq)
+    return result[1] if result else None
+
+
+class FramePrefetch:
+    """OCR, encoding and classification of one frame, running in frame workers.
+
+    Every analysis falls back to running in the agent process if its worker
+    task failed, e.g. because the capture engine overwrote the frame in the
+    shared ring before the worker got to it.
+
+    Args:
+        pool: The frame worker pool.
+        ref: The frame in the capture engine's shared ring.
+        image: The same frame as a PIL Image, for fallbacks.
+        tasks: Analyses to run in the workers (see `FRAME_WORKER_TASKS`).
+        classify: False to skip classification (no classifier configured).
+    """
+
+    def __init__(self, pool: FrameWorkerPool, ref: FrameRef, image: Image.Image,
+                 tasks: tuple[str, ...] = FRAME_WORKER_TASKS, classify: bool = True) -> None:
+        self.image = image
+        self._futures: dict[str, Future] = {}
+        if "ocr" in tasks:
+            self._futures["ocr"] = pool.submit(read_regions_task, ref)
+        if "encode" in tasks:
+            self._futures["encode"] = pool.submit(encode_frame_task, ref)
+        if "classify" in tasks and classify:
+            self._futures["classify"] = pool.submit(classify_task, ref)
+
+    def _result(self, task: str):
+        """Returns the worker's result for `task`, or None if it was not run or failed."""
+        future = self._futures.get(task)
+        if future is None:
+            return None
+        try:
+            return future.result()
+        except Exception as e:
+            metrics.inc("sims_frame_worker_fallbacks_total", task=task)
+            logging.warning("Frame worker %s task failed (%s); running it in the agent.", task, e)
+            return None
+
+    def ocr_results(self, fallback: Callable[[Image.Image], dict[str, OCRResult]]) -> dict[str, OCRResult]:
+        """Returns the frame's OCR results, computed with `fallback` if no worker read them."""
+        results = self._result("ocr")
+        return results if results is not None else fallback(self.image)
+
+    def encoded(self) -> Optional[EncodedImage]:
+        """Returns the frame encoded for the LLM, or None to encode it in-process."""
+        encoded = self._result("encode")
+        if encoded is not None:
+            metrics.observe(metrics.STAGE_METRIC, encoded.encode_ms / 1000, stage="encode")
+        return encoded
+
+    def screen_match(self, classifier: ScreenClassifier) -> Optional[ScreenMatch]:
+        """Returns the frame's classification, recorded in `classifier`'s statistics."""
+        result = self._result("classify")
+        if result is None:
+            return classifier.classify(self.image)
+        match, elapsed = result
+        classifier.record(match, elapsed)
+        return match
+
+
+def prefetch_frame(engine: CaptureEngine, seq: int, image: Image.Image,
+                   classifier: Optional[ScreenClassifier] = None) -> Optional[FramePrefetch]:
+    """Starts the frame worker analyses of frame `seq`.
+
+    Returns:
+        The pending analyses, or None if `FRAME_WORKERS` is 0 (or the frame
+        left the ring already), in which case everything runs in-process.
+    """
+    pool = get_frame_pool()
+    ref = engine.frame_ref(seq) if pool else None
+    if ref is None:
+        return None
+    return FramePrefetch(pool, ref, image, classify=classifier is not None)
+
+
+@dataclass
+class LLMAnswer:
+    """An LLM decision (in its cacheable text form) and the requests behind it.
+
+    `source` is "text" if the text-first request answered, else "llm".
+    `text_exchange` is also set if the text-first request escalated.
+    """
+    decision: Optional[str]
+    source: str
+    exchange: Optional[LLMExchange]
+    text_exchange: Optional[LLMExchange] = None
+
+
+class Speculation:
+    """An LLM request started on a frame captured before the screen settled.
+
+    The request runs on its own thread inside `cancellable`, so `cancel()`
+    stops a streamed request at its next token. A non-streaming request
+    cannot be interrupted; its answer is discarded.
+
+    Args:
+        image: The frame the request is made for.
+        run: Makes the request and returns its answer.
+    """
+
+    def __init__(self, image: Image.Image, run: Callable[[], LLMAnswer]) -> None:
+        self.frame_hash = dhash(image)
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.result: Future = Future()
+        self._cancel = threading.Event()
+        threading.Thread(target=self._run, args=(run,), name="Speculation", daemon=True).start()
+
+    def _run(self, run: Callable[[], LLMAnswer]) -> None:
+        with cancellable(self._cancel):
+            try:
+                answer = run()
+            except Exception as e:
+                self.finished = time.perf_counter()
+                self.result.set_exception(e)
+                return
+        self.finished = time.perf_counter()
+        self.result.set_result(answer)
+
+    def matches(self, frame_hash: int, tolerance: int = SPECULATION_HAMMING_TOLERANCE) -> bool:
+        """Whether a frame with `frame_hash` looks like the speculated one."""
+        return hamming_distance(frame_hash, self.frame_hash) <= tolerance
+
+    def cancel(self) -> None:
+        """Abandons the request; its answer will not be used."""
+        self._cancel.set()
+
+
+class DecisionMaker:
+    """Chooses the next action: screen rules first, then the decision cache, then the LLM.
+
+    If a cached decision left the screen unchanged (the next frame matches the
+    previous one), the cache entry is dropped and the LLM is asked instead, so
+    a bad cached decision cannot repeat forever. A screen rule whose action
+    left the screen unchanged is likewise skipped once.
+
+    With `text_first`, the LLM is first asked through the text-first path:
+    the OCR results of the frame and a state summary go to a text-only model.
+    Frames whose text is too short or read with low confidence, and answers
+    that name no valid button (or plan), escalate to the vision request.
+
+    With `speculative`, `speculate` starts the LLM request for the next
+    decision early, on a frame captured while the screen may still change.
+    If the next decision needs the LLM and its frame matches the speculated
+    one (perceptual hashes within `SPECULATION_HAMMING_TOLERANCE`), the
+    speculation's answer is used; otherwise it is cancelled.
+
+    With a `history`, every decision is recorded in it. When it shows that
+    the agent is stuck (no progress or a repeating cycle), screen rules, the
+    cache and speculation are bypassed and the LLM gets a montage of the
+    recent frames and the inputs pressed between them.
+
+    Args:
+        cache: The decision cache, or None if caching is disabled.
+        plan_mode: Ask the LLM for multi-button plans instead of single buttons.
+        classifier: Screen classifier with rule-based actions for known
+                    screens, or None to always use the cache/LLM.
+        text_first: Try the text-first path before the vision request.
+        speculative: Allow speculative requests (see `speculate`).
+        history: Recent decisions for stuck-loop detection, or None to disable it.
+    """
+
+    def __init__(self, cache: Optional[DecisionCache],
+                 plan_mode: bool = PLAN_MODE_ENABLED,
+                 classifier: Optional[ScreenClassifier] = None,
+                 text_first: bool = TEXT_FIRST_ENABLED,
+                 speculative: bool = SPECULATIVE_INFERENCE,
+                 history: Optional[FrameHistory] = None) -> None:
+        self.cache = cache
+        self.plan_mode = plan_mode
+        self.classifier = classifier
+        self.text_first = text_first
+        self.speculative = speculative
+        self.history = history
+        # Hash of the previous frame if its decision came from the cache.
+        self._last_cached_hash: Optional[int] = None
+        # Hash of the previous frame if its decision came from a screen rule.
+        self._last_rule_hash: Optional[int] = None
+        # Prompt/response of the LLM request behind the last decision (None on cache hits).
+        self.last_exchange: Optional[LLMExchange] = None
+        # Where the last decision came from: "rule", "cache", "llm", "text" or "stuck".
+        self.last_source: Optional[str] = None
+        # The screen rule behind the last decision, if any.
+        self.last_match: Optional[ScreenMatch] = None
+        # Number of decisions made so far, by source.
+        self.source_counts: dict[str, int] = {}
+        # Frame worker results and OCR results for the frame being decided, if any.
+        self._prefetch: Optional[FramePrefetch] = None
+        self._ocr: Optional[dict[str, OCRResult]] = None
+        # The text-first request of the last decision, if one was made.
+        self.last_text_exchange: Optional[LLMExchange] = None
+        # Text-first outcomes: "answered", or the reason the vision model was asked.
+        self.text_first_counts: dict[str, int] = {}
+        # Name of the screen the classifier recognized (without a rule) in the current frame.
+        self._screen_name: Optional[str] = None
+        # The previous decision and the hash of the frame it was made on, for the state summary.
+        self._previous_decision: Optional[str] = None
+        self._previous_hash: Optional[int] = None
+        # The speculation started for the next decision, and the one the current decision may use.
+        self._speculation: Optional[Speculation] = None
+        self._pending_speculation: Optional[Speculation] = None
+        # Speculation outcomes: "hit", "miss", "unused", "failed" or "skipped".
+        self.speculation_counts: dict[str, int] = {}
+        # Seconds of speculative inference that ran before the decisions using it were due.
+        self._speculation_overlap = 0.0
+        # The stuck pattern detected for the last decision, if any.
+        self.last_stuck: Optional[StuckPattern] = None
+
+    def _text_first_gate(self, ocr: Optional[dict[str, OCRResult]]) -> Optional[str]:
+        """Returns why the frame's OCR text is not good enough for the text model, or None."""
+        if not ocr:
+            return "no_ocr"
+        read = [result for result in ocr.values() if result.text]
+        if sum(len(result.text) for result in read) < TEXT_FIRST_MIN_CHARS:
+            return "no_text"
+        if min(result.confidence for result in read) < TEXT_FIRST_MIN_CONFIDENCE:
+            return "low_confidence"
+        return None
+
+    def _state_summary(self, image: Image.Image, screen_name: Optional[str]) -> str:
+        """Describes what is known about the game besides the screen text, in a few lines."""
+        lines = []
+        if screen_name:
+            lines.append(f"Recognized screen: {screen_name}.")
+        if self._previous_decision:
+            changed = hamming_distance(dhash(image), self._previous_hash) > DECISION_CACHE_HAMMING_TOLERANCE
+            lines.append(f"Previous input: {describe_plan(parse_plan(self._previous_decision))} "
+                         f"({'the screen changed' if changed else 'the screen did not change'}).")
+        return "\n".join(lines) or "Nothing else is known."
+
+    def _count_text_first(self, result: str) -> None:
+        self.text_first_counts[result] = self.text_first_counts.get(result, 0) + 1
+        metrics.inc("sims_text_first_total", result=result)
+
+    def _ask_text_model(self, image: Image.Image, ocr: Optional[dict[str, OCRResult]],
+                        screen_name: Optional[str]) -> tuple[Optional[str], Optional[LLMExchange]]:
+        """Returns the text model's decision (None to ask the vision model) and its request, if one was made."""
+        reason = self._text_first_gate(ocr)
+        if reason:
+            self._count_text_first(reason)
+            return None, None
+        screen_text = format_ocr_results(ocr)
+        state = self._state_summary(image, screen_name)
+        if self.plan_mode:
+            plan = get_text_plan(screen_text, state)
+            decision = format_plan(plan) if plan else None
+        else:
+            decision = get_text_suggestion(screen_text, state)
+        self._count_text_first("answered" if decision else "invalid")
+        return decision, get_last_exchange()
+
+    def _query_llm(self, image: Image.Image, prefetch: Optional[FramePrefetch],
+                   ocr: Optional[dict[str, OCRResult]], screen_name: Optional[str],
+                   stuck: Optional[StuckContext] = None) -> LLMAnswer:
+        """Asks the LLM (text-first, then vision) for a decision on `image`. Safe to run on another thread.
+
+        With `stuck`, only the vision model is asked, with the montage of recent frames.
+        """
+        text_exchange = None
+        if self.text_first and stuck is None:
+            decision, text_exchange = self._ask_text_model(image, ocr, screen_name)
+            if decision:
+                return LLMAnswer(decision, "text", text_exchange, text_exchange)
+        encoded = prefetch.encoded() if prefetch and stuck is None else None
+        if self.plan_mode:
+            plan = get_llm_plan(image, encoded, stuck)
+            decision = format_plan(plan) if plan else None
+        else:
+            decision = get_llm_suggestion(image, encoded, stuck)
+        return LLMAnswer(decision, "stuck" if stuck else "llm", get_last_exchange(), text_exchange)
+
+    def _ask_llm(self, image: Image.Image) -> Optional[str]:
+        """Returns the LLM's decision in its cacheable text form, from a matching speculation if there is one."""
+        answer = self._take_speculation(image)
+        if answer is None:
+            answer = self._query_llm(image, self._prefetch, self._ocr, self._screen_name)
+        self.last_source = answer.source
+        self.last_exchange = answer.exchange
+        self.last_text_exchange = answer.text_exchange
+        return answer.decision
+
+    def _count_speculation(self, result: str) -> None:
+        self.speculation_counts[result] = self.speculation_counts.get(result, 0) + 1
+        metrics.inc("sims_speculations_total", result=result)
+
+    def _take_speculation(self, image: Image.Image) -> Optional[LLMAnswer]:
+        """Returns the answer of the pending speculation if it was made for a frame like `image`."""
+        speculation, self._pending_speculation = self._pending_speculation, None
+        if speculation is None:
+            return None
+        if not speculation.matches(dhash(image)):
+            speculation.cancel()
+            self._count_speculation("miss")
+            return None
+        needed_at = time.perf_counter()
+        try:
+            answer = speculation.result.result()
+        except Exception as e:
+            logging.warning("Speculative LLM request failed: %s", e)
+            answer = None
+        if answer is None or not answer.decision:
+            # The screen is the same, but the request gave no answer: ask again.
+            self._count_speculation("failed")
+            return None
+        self._count_speculation("hit")
+        self._speculation_overlap += min(needed_at, speculation.finished) - speculation.started
+        return answer
+
+    def speculate(self, image: Image.Image, prefetch: Optional[FramePrefetch] = None) -> bool:
+        """Starts the LLM request for the next decision on a frame that may still change.
+
+        Call it after an input, with the first frame captured since. The next
+        `decide` uses the answer if its frame matches this one. Screens the
+        decision cache already answers are not speculated on.
+
+        Args:
+            image: The frame captured after the input.
+            prefetch: Frame worker analyses of the same frame, if started.
+
+        Returns:
+            True if a speculative request was started.
+        """
+        self.cancel_speculation()
+        frame_hash = dhash(image)
+        # Cached screens are answered without the LLM, stuck ones with a different request.
+        if ((self.cache is not None and frame_hash in self.cache)
+                or (self.history is not None and self.history.detect(image, count=False))):
+            self._count_speculation("skipped")
+            return False
+
+        def run() -> LLMAnswer:
+            ocr = None
+            if self.text_first:
+                ocr = prefetch.ocr_results(read_regions) if prefetch else read_regions(image)
+            # Classification waits for the settled frame, so no screen name is known yet.
+            return self._query_llm(image, prefetch, ocr, None)
+
+        self._speculation = Speculation(image, run)
+        return True
+
+    def cancel_speculation(self) -> None:
+        """Cancels a speculation that no decision has used yet."""
+        if self._speculation is not None:
+            self._speculation.cancel()
+            self._count_speculation("unused")
+            self._speculation = None
+
+    def _match_rule(self, image: Image.Image) -> Optional[str]:
+        """Returns the action of a recognized screen, or None to fall through."""
+        if self._prefetch:
+            match = self._prefetch.screen_match(self.classifier)
+        else:
+            match = self.classifier.classify(image)
+        self._screen_name = match.name if match is not None else None
+        frame_hash = dhash(image)
+        rule_stuck = (
+            self._last_rule_hash is not None
+            and hamming_distance(frame_hash, self._last_rule_hash) <= DECISION_CACHE_HAMMING_TOLERANCE
+        )
+        self._last_rule_hash = None
+        if match is None or match.action is None:
+            return None
+        if rule_stuck:
+            logging.info("Screen rule '%s' did not change the screen. Asking the LLM instead.", match.name)
+            return None
+        self._last_rule_hash = frame_hash
+        self.last_match = match
+        return match.action
+
+    def _decide_text(self, image: Image.Image) -> tuple[Optional[str], bool]:
+        """Returns `(decision_text, from_cache)` for the given frame.
+
+        `from_cache` is True for every decision made without the LLM (screen
+        rules and cache hits); `last_source` tells them apart.
+        """
+        self.last_exchange = None
+        self.last_text_exchange = None
+        self.last_match = None
+        self._screen_name = None
+        if self.history is not None:
+            self.last_stuck = self.history.detect(image)
+            if self.last_stuck is not None:
+                return self._decide_stuck(image), False
+        if self.classifier is not None:
+            action = self._match_rule(image)
+            if action:
+                self.last_source = "rule"
+                return action, True
+
+        self.last_source = "llm"
+        if self.cache is None:
+            return self._ask_llm(image), False
+
+        frame_hash = dhash(image)
+        cached_action_stuck = (
+            self._last_cached_hash is not None
+            and hamming_distance(frame_hash, self._last_cached_hash) <= self.cache.tolerance
+        )
+        self._last_cached_hash = None
+
+        if cached_action_stuck:
+            logging.info("Cached decision did not change the screen. Asking the LLM instead.")
+            self.cache.invalidate(frame_hash)
+        else:
+            cached = self.cache.get(frame_hash)
+            if cached:
+                self._last_cached_hash = frame_hash
+                self.last_source = "cache"
+                return cached, True
+
+        decision = self._ask_llm(image)
+        if decision:
+            self.cache.put(frame_hash, decision)
+        return decision, False
+
+    def _decide_stuck(self, image: Image.Image) -> Optional[str]:
+        """Asks the LLM with the recent frames and inputs, bypassing screen rules, the cache and speculation.
+
+        The decision is not cached: it depends on the trail of inputs, not only on the screen.
+        """
+        logging.info("Agent seems stuck: %s. Asking the LLM with the recent frames.", self.last_stuck.describe())
+        self._last_rule_hash = None
+        self._last_cached_hash = None
+        if self.cache is not None:
+            # The cached decision for this screen may be part of the loop.
+            self.cache.invalidate(dhash(image))
+        answer = self._query_llm(image, self._prefetch, self._ocr, None,
+                                 self.history.stuck_context(image, self.last_stuck))
+        self.last_source = answer.source
+        self.last_exchange = answer.exchange
+        return answer.decision
+
+    @property
+    def source_label(self) -> str:
+        """Human-readable source of the last decision."""
+        label = SOURCE_LABELS.get(self.last_source, "LLM")
+        if self.last_match is not None:
+            label = f"{label} '{self.last_match.name}'"
+        return label
+
+    @metrics.timed("decide")
+    def decide(self, image: Image.Image, prefetch: Optional[FramePrefetch] = None,
+               ocr: Optional[dict[str, OCRResult]] = None) -> tuple[Optional[list[PlanStep]], bool]:
+        """Returns `(plan, from_cache)` for the given frame.
+
+        Outside plan mode the plan holds a single step. `plan` is None if the
+        LLM did not provide a valid suggestion.
+
+        Args:
+            image: The frame to decide on.
+            prefetch: Frame worker analyses of the same frame, if started.
+            ocr: OCR results of the same frame, for the text-first path.
+        """
+        self._prefetch = prefetch
+        self._ocr = ocr
+        self._pending_speculation, self._speculation = self._speculation, None
+        try:
+            decision, from_cache = self._decide_text(image)
+        finally:
+            self._prefetch = None
+            self._ocr = None
+            if self._pending_speculation is not None:
+                # Decided without the LLM (screen rule or cache hit).
+                self._pending_speculation.cancel()
+                self._count_speculation("unused")
+                self._pending_speculation = None
+        self.source_counts[self.last_source] = self.source_counts.get(self.last_source, 0) + 1
+        if decision and self.text_first:
+            self._previous_decision, self._previous_hash = decision, dhash(image)
+        if decision and self.history is not None:
+            self.history.record(image, decision)
+        return (parse_plan(decision) if decision else None), from_cache
+
+    def llm_latencies(self) -> dict[str, float]:
+        """Returns the LLM latencies of the last decision, in the session recorder's `latencies` format.
+
+        Holds both requests if the text-first path escalated to the vision model.
+        """
+        latencies = {}
+        if self.last_text_exchange is not None:
+            latencies.update(self.last_text_exchange.stage_latencies())
+        if self.last_exchange is not None:
+            latencies.update(self.last_exchange.stage_latencies())
+        return latencies
+
+    def text_first_stats(self) -> dict:
+        """Returns text-first outcomes and the fraction of them that escalated to the vision model."""
+        total = sum(self.text_first_counts.values())
+        answered = self.text_first_counts.get("answered", 0)
+        return {**self.text_first_counts, "escalation_rate": (total - answered) / total if total else 0.0}
+
+    def speculation_stats(self) -> dict:
+        """Returns speculation outcomes, the fractions used and wasted, and the mean inference time they hid.
+
+        Skipped speculations sent no request and are left out of the rates.
+        """
+        started = sum(count for result, count in self.speculation_counts.items() if result != "skipped")
+        hits = self.speculation_counts.get("hit", 0)
+        return {
+            **self.speculation_counts,
+            "hit_rate": hits / started if started else 0.0,
+            "waste_rate": (started - hits) / started if started else 0.0,
+            "mean_overlap": self._speculation_overlap / hits if hits else 0.0,
+        }
+
+
+def speculate_after_input(engine: CaptureEngine, decision_maker: DecisionMaker, after_seq: int,
+                          delay: float = SPECULATION_DELAY) -> bool:
+    """Starts a speculative decision on the first frame captured `delay` seconds after an input.
+
+    Does nothing unless the decision maker is `speculative`.
+
+    Args:
+        engine: The running capture engine.
+        decision_maker: Makes the speculative request.
+        after_seq: The engine's sequence number when the last input was sent.
+        delay: Seconds to wait for the emulator to react to the input.
+
+    Returns:
+        True if a speculative request was started.
+    """
+    if not decision_maker.speculative:
+        return False
+    time.sleep(delay)
+    result = engine.wait_for_frame(after_seq, timeout=FRAME_WAIT_TIMEOUT)
+    if result is None:
+        return False
+    seq, frame = result
+    image = Image.fromarray(frame)
+    # No classification: screen rules are applied to the settled frame.
+    return decision_maker.speculate(image, prefetch_frame(engine, seq, image))
+
+
+def execute_action(hwnd, engine: CaptureEngine, button: str, before_image: Image.Image,
+                   scheduler: Optional[AdaptiveScheduler] = None) -> Optional[WaitRecord]:
+    """Presses `button`, falling back to 'START' if an 'A' press changes nothing.
+
+    Special handling for 'A' button: Often used for confirmation or interaction,
+    but sometimes the game might be paused, requiring 'START'.
+
+    Args:
+        hwnd: The emulator window.
+        engine: The running capture engine, used to read a post-press frame.
+        button: The button to press.
+        before_image: The frame the decision was based on.
+        scheduler: If given, waits for the screen to settle after 'A' instead
+                   of a fixed pause.
+
+    Returns:
+        The scheduler's wait if the screen already settled after the last
+        press (an effective 'A'), so the caller does not wait again; else None.
+    """
+    if button != 'A':
+        # If the suggestion is not 'A', press the suggested button directly.
+        logging.debug("Executing suggested button press: %s", button)
+        press_gba_button(hwnd, button)
+        logging.debug("Pressed '%s'.", button)
+        return None
+
+    logging.debug("LLM suggested 'A'. Executing 'A' and verifying state change...")
+    seq_before_press = engine.sequence
+    press_gba_button(hwnd, 'A')
+    logging.debug("Pressed 'A'.")
+    record = None
+    if scheduler is not None:
+        # Wait until the screen settles (or the max wait passes), then use the settled frame.
+        record = scheduler.wait_for_settle(before_image)
+        new_image = Image.fromarray(record.frame) if record.frame is not None else None
+    else:
+        with metrics.span("sleep"):
+            time.sleep(A_VERIFY_DELAY) # Brief pause to allow the screen to potentially update.
+        logging.debug("Reading a post-'A' frame to check if 'A' was effective...")
+        new_image = latest_frame_image(engine, after_seq=seq_before_press)
+    if not new_image:
+        # If capture fails after pressing 'A', we can't verify.
+        # As a fallback, assume 'A' might not have worked (e.g., game was paused)
+        # and try pressing 'START' instead.
+        logging.warning("Failed to capture screen after pressing 'A'.")
+        logging.info("Fallback: Assuming 'A' was ineffective, trying 'START'...")
+        press_gba_button(hwnd, 'Start')
+        logging.debug("Pressed 'START'.")
+        return None
+
+    # Compare the frames before and after pressing 'A'.
+    # If the screen hasn't changed, 'A' likely didn't advance the game state
+    # (e.g., the game might be paused). Try 'START' as a fallback.
+    change = detect_change(before_image, new_image)
+    logging.debug("Frame change after 'A': score=%.4f, changed=%s", change.score, change.changed)
+    if not change.changed:
+        logging.info("Screen unchanged after 'A'. Fallback: Trying 'START'...")
+        press_gba_button(hwnd, 'Start')
+        logging.debug("Pressed 'START'.")
+        return None
+    # If the screen changed, assume 'A' was the correct action.
+    logging.debug("'A' press appears to have changed the game state. Proceeding.")
+    return record
+
+
+@metrics.timed("act")
+def perform_plan(hwnd, engine: CaptureEngine, plan: list[PlanStep], before_image: Image.Image,
+                 scheduler: Optional[AdaptiveScheduler] = None) -> Optional[WaitRecord]:
+    """Executes a decided plan.
+
+    A plan of one plain press goes through `execute_action`, keeping the 'A'
+    then 'START' fallback. Longer plans run through `execute_plan`, which
+    stops early on an unexpected screen transition.
+
+    Returns:
+        The settle wait `execute_action` already made, or None if the caller
+        still has to wait for the screen to settle.
+    """
+    if len(plan) == 1 and plan[0].is_single_press:
+        return execute_action(hwnd, engine, plan[0].button, before_image, scheduler)
+
+    logging.debug("Executing plan: %s", describe_plan(plan))
+    result = execute_plan(hwnd, plan, engine)
+    if result.aborted:
+        logging.info("Plan cut short after %d presses (screen changed, score %.2f).", result.presses, result.change_score)
+    else:
+        logging.debug("Plan completed: %d presses.", result.presses)
+    return None
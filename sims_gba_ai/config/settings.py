@@ -14,12 +14,98 @@ and preferences.
 # Example (Linux/macOS): "/usr/local/bin/tesseract" or "/usr/bin/tesseract"
 # Set to None or "" if Tesseract is correctly installed and in the system PATH.
 TESSERACT_CMD_PATH: str | None = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+# Screen regions OCR runs on, at native GBA resolution (240x160). Each entry
+# maps a region name to:
+#   "box":       (x, y, width, height) of the region.
+#   "psm":       Tesseract page segmentation mode (6 = block of text,
+#                7 = single line, 8 = single word).
+#   "whitelist": Characters Tesseract may output, or None for any.
+# Adjust the boxes to the game's layout. An empty dict OCRs the whole frame.
+OCR_REGIONS: dict[str, dict] = {
+    "dialog": {"box": (8, 112, 224, 44), "psm": 6, "whitelist": None},
+    "money": {"box": (168, 2, 70, 12), "psm": 7, "whitelist": "$§0123456789,"},
+    "needs": {"box": (4, 2, 120, 12), "psm": 7, "whitelist": None},
+}
+# Factor the binarized region is upscaled by before recognition; Tesseract
+# needs glyphs well above the 8px GBA font height.
+OCR_UPSCALE: int = 4
+# Number of recent results kept per region, keyed by a hash of the region's
+# pixels. An unchanged region is never OCRed twice.
+OCR_CACHE_SIZE: int = 64
+# How Tesseract is run (see core/ocr_backend.py):
+#   "auto"      - "tesserocr" if the tesserocr package is installed, else "process".
+#   "tesserocr" - in-process bindings; one warm engine per worker thread.
+#   "process"   - long-lived worker processes fed through shared memory.
+#   "inline"    - pytesseract in the calling thread (one tesseract process per call).
+OCR_BACKEND: str = "auto"
+# Worker threads/processes of the pooled OCR backends.
+OCR_WORKERS: int = 2
+# Size of each shared-memory image slot of the process backend, in bytes.
+OCR_SHM_SLOT_BYTES: int = 1 << 20
 
 # --- Emulator Configuration ---
 # The exact title of the emulator window the agent should target.
 # Use tools like `pygetwindow.getAllTitles()` to find the correct title if needed.
 EMULATOR_WINDOW_TITLE: str = "mGBA"
 
+# --- Multi-Emulator Orchestration ---
+# `python -m sims_gba_ai.orchestrator` drives every window whose title contains
+# EMULATOR_WINDOW_TITLE, one agent per window. The windows must not overlap on
+# screen, since frames are grabbed from the screen.
+# Maximum number of emulator windows driven at once (None for all of them).
+ORCHESTRATOR_MAX_INSTANCES: int | None = None
+# Seconds between scans for new or closed emulator windows (0 disables rescanning).
+ORCHESTRATOR_RESCAN_INTERVAL: float = 5.0
+
+# --- Frame Geometry ---
+# The GBA's native screen resolution as (width, height). Frame analysis
+# (change detection, hashing, template matching) samples captures down to this size.
+GBA_NATIVE_RESOLUTION: tuple[int, int] = (240, 160)
+
+# --- Capture Engine Settings ---
+# Target rate (frames per second) of the background capture thread.
+# The GBA renders at ~60 FPS; the agent rarely needs more than a fraction of that.
+CAPTURE_FPS: float = 30.0
+# Number of preallocated frame slots in the capture ring buffer.
+# One slot is reserved for the writer, so `CAPTURE_BUFFER_SIZE - 1` recent frames are readable.
+CAPTURE_BUFFER_SIZE: int = 8
+# Maximum time (in seconds) the main loop waits for the capture engine to
+# publish a frame before treating the capture as failed.
+FRAME_WAIT_TIMEOUT: float = 1.0
+
+# --- Window Geometry Tracking ---
+# The capture engine caches the emulator window's client-area rectangle and
+# grabs only the game viewport inside it (see core/window_tracker.py).
+# Seconds between checks of the cached rectangle; a moved, resized or closed
+# window is noticed within this interval (or on the next failed grab).
+WINDOW_CHECK_INTERVAL: float = 0.5
+# Detect the 3:2 GBA viewport inside the client area (skipping menus, status
+# bars and letterbox borders) and capture only its pixels.
+VIEWPORT_DETECTION: bool = True
+# Seconds between detection attempts while the viewport can't be found
+# (e.g. the game shows a black screen that blends into the letterbox).
+VIEWPORT_DETECTION_RETRY: float = 1.0
+
+# --- Frame Worker Processes ---
+# Worker processes that run OCR, LLM image encoding and screen classification
+# on captured frames, off the agent process. They read the frames in place from
+# the capture engine's ring, which then lives in shared memory (see
+# core/frame_transport.py). 0 runs these steps in the agent process.
+FRAME_WORKERS: int = 0
+# Steps handed to the frame workers: any of "ocr", "encode" and "classify".
+FRAME_WORKER_TASKS: tuple[str, ...] = ("ocr", "encode", "classify")
+
+# --- Change Detection Settings ---
+# Minimum per-pixel difference (0-255, max over RGB channels) for a pixel to
+# count as changed. Filters out scaling and capture noise.
+CHANGE_PIXEL_THRESHOLD: int = 24
+# Fraction of compared pixels that must change for two frames to be considered
+# different (0.005 = 0.5%, roughly 190 pixels at native resolution).
+CHANGE_RATIO_THRESHOLD: float = 0.005
+# Regions ignored by change detection, as (left, top, right, bottom) in native
+# GBA pixels. Use this for the in-game clock or sprites that animate on their own.
+CHANGE_IGNORE_REGIONS: list[tuple[int, int, int, int]] = []
+
 # --- LLM Interaction Settings ---
 # Specify which LLM provider backend to use.
 # Options: "lmstudio" (for local models served via LM Studio), "openrouter"
@@ -41,10 +127,189 @@ OPENROUTER_API_BASE: str = "https://openrouter.ai/api/v1"
 # Ensure the chosen model supports vision capabilities if needed.
 LLM_MODEL: str = "openai/gpt-4-vision-preview"
 
+# --- LLM HTTP Client Settings ---
+# Seconds to wait for a connection to the LLM server to be established.
+LLM_CONNECT_TIMEOUT: float = 5.0
+# Seconds to wait for the LLM server to send response data.
+LLM_READ_TIMEOUT: float = 30.0
+# Number of retries for connection errors, HTTP 429 and 5xx responses.
+LLM_MAX_RETRIES: int = 3
+# Base and maximum delay (in seconds) for jittered exponential backoff between retries.
+# A server-provided Retry-After header is honoured, capped at LLM_BACKOFF_MAX.
+LLM_BACKOFF_BASE: float = 0.5
+LLM_BACKOFF_MAX: float = 10.0
+# Maximum number of keep-alive connections pooled per provider.
+LLM_POOL_SIZE: int = 4
+# Maximum requests in flight per provider (or LM Studio server). Agents of a
+# multi-emulator run beyond this wait in line, first come, first served.
+# 0 disables the limit.
+LLM_MAX_CONCURRENT_REQUESTS: int = 0
+
+# --- Multi-Backend Dispatch ---
+# LLM backends raced for every decision, in order of preference. Empty (the
+# default) sends every request to LLM_PROVIDER only. Each entry names a
+# "provider" ("lmstudio" or "openrouter") and optionally a "model" (replaces
+# LLM_MODEL / the LM Studio model), a "base_url" (e.g. a second LM Studio
+# server) and a "name" for logs and metrics. Example:
+#   LLM_BACKENDS = [
+#       {"provider": "lmstudio"},
+#       {"provider": "openrouter", "model": "google/gemini-flash-1.5"},
+#   ]
+LLM_BACKENDS: list[dict[str, str]] = []
+# If the first backend has not answered after this percentile of its recent
+# latencies, the same request is also sent to the next backend (a hedged
+# request). The first valid answer wins; the other requests are cancelled.
+LLM_HEDGE_PERCENTILE: float = 90.0
+# Hedge delay (seconds) used until LLM_HEDGE_MIN_SAMPLES latencies are known,
+# and the lower bound of the hedge delay afterwards.
+LLM_HEDGE_INITIAL_DELAY: float = 2.0
+LLM_HEDGE_MIN_DELAY: float = 0.2
+LLM_HEDGE_MIN_SAMPLES: int = 10
+# Per-backend read timeout: LLM_TIMEOUT_FACTOR times the backend's p99
+# latency, clamped to [LLM_TIMEOUT_MIN, LLM_READ_TIMEOUT].
+LLM_TIMEOUT_FACTOR: float = 3.0
+LLM_TIMEOUT_MIN: float = 2.0
+# Circuit breaker: after this many consecutive failures a backend is skipped
+# for LLM_BREAKER_COOLDOWN seconds, then a single probe request is let through.
+LLM_BREAKER_FAILURES: int = 3
+LLM_BREAKER_COOLDOWN: float = 30.0
+
+# --- LLM Image Encoding ---
+# Optional crop box (left, top, right, bottom) in captured-frame pixels. The
+# capture engine already grabs only the game viewport (see VIEWPORT_DETECTION),
+# so this is in viewport coordinates and cuts into the game image; use it only
+# to send part of the screen. Boxes set up for full-window captures must be
+# removed. None sends the whole captured viewport.
+LLM_IMAGE_CROP: tuple[int, int, int, int] | None = None
+# Size (width, height) the image is resized to before encoding. The GBA's native
+# resolution carries all the information there is; None keeps the captured size.
+LLM_IMAGE_SIZE: tuple[int, int] | None = GBA_NATIVE_RESOLUTION
+# Encoding format for LLM images: "png", "png-palette", "jpeg" or "webp".
+LLM_IMAGE_FORMAT: str = "png"
+# Quality (1-100) used for "jpeg" and "webp".
+LLM_IMAGE_QUALITY: int = 85
+# Number of colours used by the "png-palette" format.
+LLM_IMAGE_PALETTE_COLORS: int = 256
+
 # --- LLM Output Control ---
 # A list of GBA button names that the LLM is allowed to suggest.
 # This helps constrain the LLM's output to valid game inputs.
 VALID_GBA_BUTTONS: list[str] = ["Up", "Down", "Left", "Right", "A", "B", "L", "R", "Start", "Select"]
+# Stream single-button suggestions (server-sent events) and close the stream
+# as soon as a button is recognized in the text, instead of waiting for the
+# complete response. The button is matched case-insensitively, so verbose
+# answers such as "I would press START." work too.
+LLM_STREAMING: bool = True
+# Token limit for streamed suggestions. Higher than the non-streaming limit of
+# 10 because the stream is closed at the first button anyway; it only caps
+# answers that never name one.
+LLM_STREAM_MAX_TOKENS: int = 64
+
+# --- Text-First Decisions ---
+# Ask a text-only model first, with a prompt built from the OCR'd screen text
+# and a short state summary (recognized screen, previous input and whether it
+# changed the screen) instead of an image. The prompt has far fewer input
+# tokens, and a small text model answers faster. The vision request is sent
+# only if the OCR confidence is low or the text model's answer is invalid.
+TEXT_FIRST_ENABLED: bool = False
+# Provider ("lmstudio" or "openrouter"), model and base URL of the text model.
+# None uses LLM_PROVIDER, its model and its base URL.
+TEXT_LLM_PROVIDER: str | None = None
+TEXT_LLM_MODEL: str | None = None
+TEXT_LLM_BASE_URL: str | None = None
+# Minimum Tesseract confidence (0-100) of every OCR region with text.
+# Screens read with less confidence go straight to the vision model.
+TEXT_FIRST_MIN_CONFIDENCE: float = 75.0
+# Minimum number of recognized characters. Screens with less text (e.g. a
+# room without a dialog) go straight to the vision model.
+TEXT_FIRST_MIN_CHARS: int = 8
+# Token limit for single-button answers of the text model (plans use PLAN_MAX_TOKENS).
+TEXT_LLM_MAX_TOKENS: int = 16
+
+# --- Action Plan Settings ---
+# When enabled, the LLM returns a short sequence of buttons (each with an
+# optional repeat count or hold duration) that is executed locally, instead of
+# a single button per request.
+PLAN_MODE_ENABLED: bool = False
+# Maximum number of steps accepted in one plan; longer plans are truncated.
+PLAN_MAX_STEPS: int = 6
+# Maximum repeat count for a single plan step.
+PLAN_MAX_REPEAT: int = 8
+# Maximum hold duration (in seconds) for a single plan step.
+PLAN_MAX_HOLD: float = 2.0
+# Token limit for plan responses (single-button responses use 10).
+PLAN_MAX_TOKENS: int = 120
+# Plan execution stops when a press changes more than this fraction of the
+# screen (0.0-1.0), i.e. an unexpected transition such as a new room or dialog.
+PLAN_ABORT_CHANGE_SCORE: float = 0.35
+
+# --- Decision Cache Settings ---
+# Reuse earlier LLM decisions for screens that look the same (matched by a
+# perceptual hash of the frame) instead of querying the model again.
+DECISION_CACHE_ENABLED: bool = True
+# Maximum number of cached screens; the least recently used entry is evicted first.
+DECISION_CACHE_MAX_ENTRIES: int = 2048
+# Cached decisions older than this (in seconds) are discarded. None keeps them forever.
+DECISION_CACHE_TTL_SECONDS: float | None = 6 * 60 * 60
+# Maximum number of differing bits (out of 64) for two screen hashes to match.
+DECISION_CACHE_HAMMING_TOLERANCE: int = 4
+# Optional JSON file used to persist the cache across runs. None keeps it in memory only.
+DECISION_CACHE_PATH: str | None = "decision_cache.json"
+# Persist the cache automatically after this many new entries (0 = only on exit).
+DECISION_CACHE_SAVE_INTERVAL: int = 25
+
+# --- Screen Classifier Settings ---
+# Recognize known screens (pause menu, dialog boxes, save prompts, title
+# screen, ...) by template matching and apply their rule-based action
+# without asking the LLM.
+SCREEN_CLASSIFIER_ENABLED: bool = True
+# Directory holding the reference templates and their `screens.json` manifest.
+# The classifier is skipped if the manifest does not exist.
+SCREEN_TEMPLATE_DIR: str = "templates"
+# Default minimum match score (0.0-1.0) for a template to count as recognized.
+# Templates can override it in the manifest.
+SCREEN_MATCH_THRESHOLD: float = 0.92
+# Pixels (at native resolution) the search window extends beyond a template's
+# recorded position, to tolerate small shifts of UI elements.
+SCREEN_MATCH_MARGIN: int = 4
+
+# --- Stuck-Loop Detection ---
+# Keep the recent decisions (frame hashes and actions) and detect when the
+# agent is stuck: the screen did not change for several decisions, or screens
+# and actions repeat in a short cycle (e.g. Up/Down back and forth). The next
+# request then shows the LLM a montage of the last frames and the inputs
+# pressed between them, instead of a single screenshot.
+STUCK_DETECTION_ENABLED: bool = False
+# Number of recent decisions kept.
+STUCK_HISTORY_SIZE: int = 16
+# Consecutive decisions that left the screen unchanged before the agent counts as stuck.
+STUCK_NO_PROGRESS_STREAK: int = 3
+# Grid size of the perceptual hash the history compares screens by (a
+# 16x16 grid gives 256 bits), and the number of differing bits up to which
+# two screens count as the same. Finer than the decision cache's hash, so a
+# cursor moving in a menu counts as progress.
+STUCK_HASH_SIZE: int = 16
+STUCK_HAMMING_TOLERANCE: int = 2
+# Longest cycle of inputs detected, and how often it must repeat in a row.
+STUCK_MAX_CYCLE_PERIOD: int = 4
+STUCK_CYCLE_REPEATS: int = 2
+# Number of native-resolution frames tiled into the montage (the last one is the current screen).
+STUCK_MONTAGE_FRAMES: int = 4
+# Estimated tokens (montage plus prompt) a stuck request may use. Frames are
+# left out of the montage, and then the montage is scaled down, until it fits.
+STUCK_TOKEN_BUDGET: int = 800
+
+# --- Session Recording ---
+# Record every decision (native-resolution frame, OCR text, LLM prompt and
+# response, chosen button, stage latencies) for offline replay and benchmarking.
+# Off by default: frames take about 38 KB each and recordings are never pruned,
+# so enable it for the runs you want to reproduce. The orchestrator then
+# records one session per emulator window.
+RECORDING_ENABLED: bool = False
+# Directory that session recordings are written to (one sub-directory per run).
+RECORDING_DIR: str = "recordings"
+# Number of frames the memory-mapped frame file grows by at a time.
+RECORDING_CHUNK_FRAMES: int = 256
 
 # --- Input Simulation Settings ---
 # Maps GBA button names (used internally and by the LLM) to the corresponding
@@ -63,11 +328,69 @@ GBA_KEY_MAPPINGS: dict[str, str] = {
     "Select": "backspace" # GBA Select Button -> Keyboard Backspace key
 }
 
-# The duration (in seconds) to pause briefly after simulating a key press.
+# The minimum pause (in seconds) between the release of one key press and the next.
 # Helps prevent inputs from being registered too quickly by the emulator.
 KEY_PRESS_PAUSE: float = 0.1
+# Duration of a normal button tap, in GBA frames (~16.7ms each). Two frames
+# guarantee the emulator samples the key as pressed at least once.
+INPUT_TAP_FRAMES: int = 2
+# Seconds a successful focus check is trusted before the emulator window's
+# focus is verified again. The window is only re-activated if focus was lost.
+INPUT_FOCUS_CHECK_INTERVAL: float = 1.0
+# Seconds to wait after activating the emulator window for the OS to apply focus.
+INPUT_ACTIVATION_DELAY: float = 0.1
 
 # --- Main Loop Timing ---
 # The delay (in seconds) between the end of one main loop iteration and the
-# beginning of the next. Controls how frequently the agent acts.
-LOOP_DELAY: float = 2.0
\ No newline at end of file
+# beginning of the next when adaptive scheduling is disabled, and the retry
+# delay after capture or LLM errors.
+LOOP_DELAY: float = 2.0
+# Wait for the screen to settle after each input (see below) instead of
+# sleeping a fixed LOOP_DELAY. LOOP_DELAY is still used after errors.
+ADAPTIVE_SCHEDULING: bool = True
+# Number of consecutive near-identical frame comparisons that count as "settled".
+SCHEDULER_SETTLE_FRAMES: int = 3
+# Seconds to wait after an input before sampling starts.
+SCHEDULER_MIN_WAIT: float = 0.05
+# Maximum seconds to wait for the screen to settle (e.g. during long animations).
+SCHEDULER_MAX_WAIT: float = 2.0
+# Minimum seconds between sampled frames while waiting.
+SCHEDULER_SAMPLE_INTERVAL: float = 0.05
+# When inputs leave the screen unchanged, an extra delay starting at
+# SCHEDULER_BACKOFF_BASE and doubling per unproductive input (up to
+# SCHEDULER_MAX_BACKOFF seconds) is added before the next decision.
+SCHEDULER_BACKOFF_BASE: float = 0.5
+SCHEDULER_MAX_BACKOFF: float = 4.0
+# Start the next LLM request on the first frame captured after an input,
+# while the game may still be animating, so inference overlaps the wait for
+# the screen to settle. The request's answer is used only if the settled
+# frame matches the speculated one; otherwise it is cancelled and the LLM is
+# asked again. Every missed speculation costs one extra request.
+SPECULATIVE_INFERENCE: bool = False
+# Seconds after the last input before the frame to speculate on is taken
+# (input latency of the emulator; earlier frames still show the old screen).
+SPECULATION_DELAY: float = 0.05
+# Maximum number of differing bits (out of 64) between the perceptual hashes
+# of the speculated and the settled frame for the speculation to be used.
+SPECULATION_HAMMING_TOLERANCE: int = 4
+# How the agent loop is run:
+#   "sequential" - capture, OCR, LLM, input and delay strictly one after another.
+#   "pipelined"  - asyncio stages connected by bounded queues; capture and OCR
+#                  for the next step overlap the in-flight LLM request.
+LOOP_MODE: str = "sequential"
+# In "pipelined" mode, the time (in seconds) after an action before newly
+# captured frames may drive the next decision.
+PIPELINE_SETTLE_DELAY: float = 0.5
+# --- Instrumentation ---
+# Record timing spans, counters and histograms for the hot path (see core/metrics.py).
+METRICS_ENABLED: bool = True
+# Port of the local Prometheus-style text endpoint (http://127.0.0.1:<port>/metrics).
+# None disables the endpoint.
+METRICS_HTTP_PORT: int | None = None
+# Optional JSON file the metrics are dumped to every METRICS_DUMP_INTERVAL
+# seconds (and on exit). None disables the dump.
+METRICS_JSON_PATH: str | None = None
+METRICS_DUMP_INTERVAL: float = 30.0
+# Logging level of the agent ("DEBUG", "INFO", "WARNING", ...). Verbose
+# diagnostics, such as LLM request summaries, are only formatted at DEBUG.
+LOG_LEVEL: str = "INFO"
@@ -1,7 +1,29 @@
 # Core module initialization
-from .screen_capture import capture_emulator_window
-# Import other core components as they are developed
-from .llm_interaction import get_llm_suggestion
-# from .input_simulation import ...
-# from .ocr import ...
-from .input_simulation import press_gba_button
\ No newline at end of file
+#
+# The components are loaded on first access (PEP 562), so importing one core
+# module (e.g. `sims_gba_ai.core.recorder` in a replay tool) does not pull in
+# the capture, input and LLM backends with it.
+import importlib
+
+# Public name -> submodule defining it.
+_EXPORTS = {
+    "capture_emulator_window": "screen_capture",
+    "CaptureEngine": "capture_engine",
+    "get_llm_suggestion": "llm_interaction",
+    "press_gba_button": "input_simulation",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value  # Later lookups skip __getattr__.
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
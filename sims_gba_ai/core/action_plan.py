@@ -0,0 +1,199 @@
+"""
+Action Plan Module.
+
+Lets one LLM call drive several inputs. In plan mode the model answers with a
+short JSON list of steps, each a button with an optional repeat count or hold
+duration, e.g. `[{"button": "Right", "repeat": 3}, {"button": "A"}]`. Plans
+are validated against `VALID_GBA_BUTTONS` and the configured limits, then
+executed locally through `press_gba_button`. Execution stops early if the
+change detector sees an unexpected screen transition (a new room, a dialog
+popping up), since the rest of the plan was made for a screen that is gone.
+"""
+import json
+import logging
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+from sims_gba_ai.config.settings import (
+    VALID_GBA_BUTTONS,
+    PLAN_MAX_STEPS,
+    PLAN_MAX_REPEAT,
+    PLAN_MAX_HOLD,
+    PLAN_ABORT_CHANGE_SCORE,
+    FRAME_WAIT_TIMEOUT,
+)
+from sims_gba_ai.core.capture_engine import CaptureEngine
+from sims_gba_ai.core.change_detection import ChangeDetector
+from sims_gba_ai.core.input_simulation import press_gba_button
+
+# Case-insensitive lookup of canonical button names.
+_BUTTONS_BY_LOWER = {button.lower(): button for button in VALID_GBA_BUTTONS}
+_JSON_ARRAY_PATTERN = re.compile(r"\[.*\]", re.DOTALL)
+
+
+@dataclass(frozen=True)
+class PlanStep:
+    """One step of an action plan.
+
+    Attributes:
+        button: Canonical GBA button name.
+        repeat: Number of times the button is pressed.
+        hold: Seconds the button is held per press (0 for a normal tap).
+    """
+    button: str
+    repeat: int = 1
+    hold: float = 0.0
+
+    @property
+    def is_single_press(self) -> bool:
+        """True for a plain single tap."""
+        return self.repeat == 1 and self.hold == 0.0
+
+
+@dataclass(frozen=True)
+class PlanResult:
+    """Outcome of executing a plan.
+
+    Attributes:
+        presses: Number of button presses actually sent.
+        aborted: True if execution stopped early on a screen transition.
+        change_score: Change score that triggered the abort (0.0 if not aborted).
+    """
+    presses: int
+    aborted: bool
+    change_score: float = 0.0
+
+
+def _normalize_button(name) -> Optional[str]:
+    if not isinstance(name, str):
+        return None
+    return _BUTTONS_BY_LOWER.get(name.strip().strip('"\'').lower())
+
+
+def _parse_step(raw) -> Optional[PlanStep]:
+    """Validates one raw step (a button name or a dict). Returns None if invalid."""
+    if isinstance(raw, str):
+        button = _normalize_button(raw)
+        return PlanStep(button) if button else None
+    if not isinstance(raw, dict):
+        return None
+
+    button = _normalize_button(raw.get("button"))
+    if not button:
+        return None
+    try:
+        repeat = int(raw.get("repeat", 1))
+        hold = float(raw.get("hold", 0.0))
+    except (TypeError, ValueError):
+        return None
+    if not 1 <= repeat <= PLAN_MAX_REPEAT or not 0.0 <= hold <= PLAN_MAX_HOLD:
+        return None
+    return PlanStep(button, repeat, hold)
+
+
+def parse_plan(text: str) -> Optional[list[PlanStep]]:
+    """Parses and validates a plan from LLM output.
+
+    Accepts a JSON list of steps (possibly surrounded by other text) or a bare
+    button name, which becomes a one-step plan. Plans longer than
+    `PLAN_MAX_STEPS` are truncated.
+
+    Returns:
+        The list of steps, or None if the text holds no valid plan. A plan
+        with any invalid step is rejected as a whole.
+    """
+    if not text:
+        return None
+
+    button = _normalize_button(text)
+    if button:
+        return [PlanStep(button)]
+
+    match = _JSON_ARRAY_PATTERN.search(text)
+    if not match:
+        return None
+    try:
+        raw_steps = json.loads(match.group(0))
+    except ValueError:
+        return None
+    if not isinstance(raw_steps, list) or not raw_steps:
+        return None
+
+    steps = [_parse_step(raw) for raw in raw_steps[:PLAN_MAX_STEPS]]
+    if any(step is None for step in steps):
+        return None
+    return steps
+
+
+def format_plan(plan: list[PlanStep]) -> str:
+    """Serializes a plan to the compact JSON accepted by `parse_plan`."""
+    raw_steps = []
+    for step in plan:
+        raw = {"button": step.button}
+        if step.repeat != 1:
+            raw["repeat"] = step.repeat
+        if step.hold:
+            raw["hold"] = step.hold
+        raw_steps.append(raw)
+    return json.dumps(raw_steps, separators=(',', ':'))
+
+
+def describe_plan(plan: list[PlanStep]) -> str:
+    """Human-readable plan summary, e.g. "Right x3, A (hold 0.5s)"."""
+    parts = []
+    for step in plan:
+        part = step.button
+        if step.repeat != 1:
+            part += f" x{step.repeat}"
+        if step.hold:
+            part += f" (hold {step.hold}s)"
+        parts.append(part)
+    return ", ".join(parts)
+
+
+def execute_plan(emulator_window, plan: list[PlanStep], engine: CaptureEngine,
+                 detector: Optional[ChangeDetector] = None,
+                 abort_score: float = PLAN_ABORT_CHANGE_SCORE) -> PlanResult:
+    """Executes a plan press by press, stopping on an unexpected screen transition.
+
+    After every press the newest post-press frame is compared with the frame
+    before it. Small changes (a Sim walking, a cursor moving) are expected;
+    a change score above `abort_score` means the screen was replaced and the
+    remaining steps are skipped.
+
+    Args:
+        emulator_window: The emulator window to send input to.
+        plan: The validated plan.
+        engine: The running capture engine.
+        detector: Change detector used for the transition check.
+        abort_score: Change score above which execution stops.
+
+    Returns:
+        A `PlanResult` describing what was executed.
+    """
+    detector = detector or ChangeDetector()
+    total_presses = sum(step.repeat for step in plan)
+    presses = 0
+
+    previous = engine.latest_with_sequence()
+    for step in plan:
+        for _ in range(step.repeat):
+            press_gba_button(emulator_window, step.button, hold=step.hold)
+            presses += 1
+            if presses == total_presses or previous is None:
+                continue
+
+            current = engine.wait_for_frame(previous[0], timeout=FRAME_WAIT_TIMEOUT)
+            if current is None:
+                continue
+            change = detector.compare(previous[1], current[1])
+            if change.score > abort_score:
+                logging.info(
+                    f"Plan aborted after {presses}/{total_presses} presses: "
+                    f"screen transition (change score {change.score:.2f})."
+                )
+                return PlanResult(presses, aborted=True, change_score=change.score)
+            previous = current
+
+    return PlanResult(presses, aborted=False)
@@ -0,0 +1,102 @@
+"""
+Button Matcher Module.
+
+Finds the suggested GBA button in LLM output while it is still streaming.
+Verbose local models rarely answer with the bare button name; they write
+"I would press **Start** to open the menu." The matcher reads the text
+incrementally, compares whole words case-insensitively against the button
+vocabulary and reports the first button as soon as its word is complete, so
+the stream can be closed without waiting for the rest of the explanation.
+
+A word only counts once the character after it has arrived ("Le" may still
+become "Left", "Start" may still become "Starting"). Reasoning wrapped in
+`<think>...</think>` is ignored. Past the first word of the answer, a button
+word in lower case is prose ("pick up the item", "that is right", "press a
+button") and only counts when it is capitalised ("Up") or quoted ("'up'",
+"**up**").
+"""
+import re
+from typing import Optional, Sequence
+
+_WORD = re.compile(r"[A-Za-z]+")
+_THINK_BLOCK = re.compile(r"<think>.*?</think>", re.DOTALL)
+_THINK_OPEN = "<think>"
+# Characters that mark a lower-case word as a quoted button name.
+_QUOTES = "'\"*`"
+
+
+class ButtonMatcher:
+    """Incremental, case-insensitive button matcher for streamed LLM output.
+
+    Args:
+        buttons: The button vocabulary, e.g. `VALID_GBA_BUTTONS`.
+
+    Example:
+        matcher = ButtonMatcher(VALID_GBA_BUTTONS)
+        for delta in stream:
+            button = matcher.feed(delta)
+            if button:
+                break
+        else:
+            button = matcher.finish()
+    """
+
+    def __init__(self, buttons: Sequence[str]) -> None:
+        self._buttons = {button.lower(): button for button in buttons}
+        self.text = ""
+        self.button: Optional[str] = None
+        # Offset into the visible text up to which complete words were checked.
+        self._scanned = 0
+        self._words = 0
+
+    def _visible(self, final: bool) -> str:
+        """The text received so far without reasoning blocks (cut at an unclosed one)."""
+        visible = _THINK_BLOCK.sub("", self.text)
+        open_at = visible.find(_THINK_OPEN)
+        if open_at >= 0:
+            visible = visible[:open_at]
+        elif not final and "<" in visible[self._scanned:]:
+            # Do not read into a tag that may still turn out to be "<think>".
+            tail = visible[visible.rfind("<"):]
+            if _THINK_OPEN.startswith(tail):
+                visible = visible[:-len(tail)]
+        return visible
+
+    def _scan(self, visible: str, final: bool) -> Optional[str]:
+        for word in _WORD.finditer(visible, self._scanned):
+            if word.end() == len(visible) and not final:
+                break  # The word may still continue in the next delta.
+            self._scanned = word.end()
+            self._words += 1
+            token = word.group()
+            button = self._buttons.get(token.lower())
+            if button is None:
+                continue
+            if (token[0].islower() and self._words > 1
+                    and not (word.start() and visible[word.start() - 1] in _QUOTES)):
+                continue  # "up" or "a" in running text is prose, not a button.
+            self.button = button
+            return button
+        return None
+
+    def feed(self, delta: str) -> Optional[str]:
+        """Adds a streamed text delta.
+
+        Returns:
+            The canonical button name once one is recognized, otherwise None.
+            After a match, further deltas are ignored.
+        """
+        if self.button is not None:
+            return self.button
+        self.text += delta
+        return self._scan(self._visible(final=False), final=False)
+
+    def finish(self) -> Optional[str]:
+        """Marks the end of the stream and checks the last word.
+
+        Returns:
+            The recognized button, or None if the response named no button.
+        """
+        if self.button is not None:
+            return self.button
+        return self._scan(self._visible(final=True), final=True)
@@ -0,0 +1,298 @@
+"""
+Capture Engine Module.
+
+Provides a persistent, background screen capture engine for the emulator
+window. Unlike `capture_emulator_window`, which opens a fresh grab session for
+every frame, the `CaptureEngine` keeps one grabber session open on a worker
+thread, grabs frames at a fixed rate and writes them into a ring buffer of
+preallocated NumPy arrays. Callers read the latest frame (or the last N frames)
+without waiting for a grab, which takes capture off the decision loop's
+critical path.
+
+The engine grabs only the game viewport of the window, as located by a
+`WindowTracker` (see `window_tracker.py`), which also finds the window again
+if it moves or the emulator is restarted.
+
+With `shared=True` (the default when `FRAME_WORKERS` is set) the ring lives in
+a `SharedFrameRing`, so frame worker processes read the captured frames in
+place instead of receiving pickled copies (see `frame_transport.py`).
+"""
+import threading
+import time
+import logging
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from sims_gba_ai.core import metrics
+from sims_gba_ai.core.frame_grabber import FrameGrabber, get_default_grabber
+from sims_gba_ai.core.frame_transport import FrameRef, SharedFrameRing
+from sims_gba_ai.core.window_tracker import WindowTracker
+from sims_gba_ai.config.settings import CAPTURE_FPS, CAPTURE_BUFFER_SIZE, FRAME_WORKERS
+
+
+class CaptureEngine:
+    """Background frame grabber writing into a fixed-size ring buffer.
+
+    Frames are stored as `uint8` RGB arrays of shape `(height, width, 3)`.
+    The buffer is allocated on the first grab (and reallocated if the window
+    size changes), after which the grab loop never allocates frame memory.
+
+    The writer fills the slot of the oldest frame without holding the lock and
+    only takes the lock to publish the new sequence number. Readers copy frames
+    out under the lock, so a read never observes a half-written frame. One slot
+    is always reserved for the writer, so at most `buffer_size - 1` frames are
+    readable at once.
+
+    Example:
+        with CaptureEngine(window) as engine:
+            frame = engine.latest()
+    """
+
+    def __init__(self, window: 'pygetwindow.Window | WindowTracker', fps: float = CAPTURE_FPS,
+                 buffer_size: int = CAPTURE_BUFFER_SIZE, shared: bool = FRAME_WORKERS > 0,
+                 grabber: Optional[FrameGrabber] = None) -> None:
+        """Initializes the engine without starting the capture thread.
+
+        Args:
+            window: A window object providing `top`, `left`, `width` and
+                    `height` attributes, e.g. a `pygetwindow.Window`, or a
+                    `WindowTracker` for one. A plain window gets a tracker
+                    that does not re-find it by title.
+            fps: Target capture rate in frames per second.
+            buffer_size: Number of preallocated frame slots. Must be at least 2.
+            shared: Keep the slots in shared memory, so other processes can
+                    read frames by `frame_ref`.
+            grabber: The pixel source; defaults to the module default
+                     grabber (the `mss` screen grabber unless changed via
+                     `frame_grabber.set_default_grabber`).
+        """
+        if fps <= 0:
+            raise ValueError(f"fps must be positive, got {fps}")
+        if buffer_size < 2:
+            raise ValueError(f"buffer_size must be at least 2, got {buffer_size}")
+
+        self.tracker = window if isinstance(window, WindowTracker) else WindowTracker(window)
+        self.fps = fps
+        self.buffer_size = buffer_size
+        self.shared = shared
+        self.grabber = grabber or get_default_grabber()
+
+        self._frames: Optional[np.ndarray] = None  # (buffer_size, h, w, 3) uint8
+        self._ring: Optional[SharedFrameRing] = None  # Backs `_frames` if shared.
+        self._timestamps = np.zeros(buffer_size, dtype=np.float64)
+        self._seq = 0          # Sequence number of the next frame to be written.
+        self._valid_from = 0   # First sequence number held in the current buffer.
+        self._lock = threading.Lock()
+        self._new_frame = threading.Condition(self._lock)
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.grab_failures = 0
+
+    # --- Lifecycle ---
+
+    def start(self) -> None:
+        """Starts the background capture thread. Does nothing if already running."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="CaptureEngine", daemon=True)
+        self._thread.start()
+        logging.info("Capture engine started at %s FPS with %d slots.", self.fps, self.buffer_size)
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """Stops the background capture thread and waits for it to exit."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        with self._new_frame:
+            self._new_frame.notify_all()
+            if self._ring is not None:
+                self._frames = None
+                self._ring.close()
+                self._ring = None
+        logging.info("Capture engine stopped.")
+
+    @property
+    def window(self):
+        """The current emulator window (it changes if the tracker had to find it again)."""
+        return self.tracker.window
+
+    @property
+    def running(self) -> bool:
+        """Whether the capture thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def __enter__(self) -> 'CaptureEngine':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+    # --- Reading ---
+
+    @property
+    def sequence(self) -> int:
+        """Sequence number of the most recently published frame, or -1 if none."""
+        with self._lock:
+            return self._seq - 1
+
+    def latest(self) -> Optional[np.ndarray]:
+        """Returns a copy of the most recent frame, or None if none was captured yet."""
+        result = self.latest_with_sequence()
+        return result[1] if result else None
+
+    def latest_with_sequence(self) -> Optional[tuple[int, np.ndarray]]:
+        """Returns `(sequence, frame)` for the most recent frame, or None."""
+        with self._lock:
+            if self._frames is None or self._seq <= self._valid_from:
+                return None
+            seq = self._seq - 1
+            return seq, self._copy(seq)
+
+    def latest_image(self) -> Optional[Image.Image]:
+        """Returns the most recent frame as an RGB PIL Image, or None."""
+        frame = self.latest()
+        return Image.fromarray(frame) if frame is not None else None
+
+    def recent(self, n: int) -> list[np.ndarray]:
+        """Returns copies of up to `n` most recent frames, oldest first.
+
+        At most `buffer_size - 1` frames are returned.
+        """
+        with self._lock:
+            if self._frames is None:
+                return []
+            available = min(self._seq - self._valid_from, self.buffer_size - 1)
+            count = max(0, min(n, available))
+            return [self._copy(seq) for seq in range(self._seq - count, self._seq)]
+
+    def wait_for_frame(self, after_seq: int = -1,
+                       timeout: Optional[float] = None) -> Optional[tuple[int, np.ndarray]]:
+        """Blocks until a frame newer than `after_seq` is published.
+
+        Useful after sending an input, to make sure the next decision is based
+        on a frame captured after the input rather than a buffered one.
+
+        Args:
+            after_seq: Sequence number the returned frame must be newer than.
+            timeout: Maximum time to wait in seconds. None waits indefinitely.
+
+        Returns:
+            `(sequence, frame)` for the newest frame, or None on timeout or if
+            the engine is stopped.
+        """
+        with self._new_frame:
+            ready = self._new_frame.wait_for(
+                lambda: self._seq - 1 > after_seq or self._stop_event.is_set(), timeout)
+            if not ready or self._seq - 1 <= after_seq or self._frames is None:
+                return None
+            seq = self._seq - 1
+            return seq, self._copy(seq)
+
+    def frame_ref(self, seq: int) -> Optional[FrameRef]:
+        """Returns a handle other processes can read frame `seq` through.
+
+        None if the engine is not shared or the frame is no longer buffered.
+        """
+        with self._lock:
+            if self._ring is None or not max(self._valid_from, self._seq - self.buffer_size + 1) <= seq < self._seq:
+                return None
+            return self._ring.ref(seq)
+
+    def ring_stats(self) -> Optional[list[dict]]:
+        """Frames written and dropped per shared slot, or None if not shared."""
+        with self._lock:
+            return self._ring.slot_stats() if self._ring is not None else None
+
+    def _copy(self, seq: int) -> np.ndarray:
+        """Copies frame `seq` out of the ring. Call with the lock held."""
+        slot = seq % self.buffer_size
+        if self._ring is not None:
+            self._ring.mark_read(slot, seq)
+        return self._frames[slot].copy()
+
+    # --- Capture thread ---
+
+    def _prepare_slot(self, width: int, height: int) -> int:
+        """Returns the ring slot for the next frame, (re)allocating the buffer if needed."""
+        if self._frames is None or self._frames.shape[1:3] != (height, width):
+            # First frame or the window was resized: reallocate the ring and
+            # invalidate frames of the previous size.
+            with self._lock:
+                if not self.shared:
+                    self._frames = np.empty((self.buffer_size, height, width, 3), dtype=np.uint8)
+                else:
+                    if self._ring is None or not self._ring.fits(height, width):
+                        # Frames already handed to workers stay readable until they unmap the old ring.
+                        self._frames = None
+                        if self._ring is not None:
+                            self._ring.close()
+                        self._ring = SharedFrameRing(self.buffer_size, height * width * 3)
+                    self._frames = self._ring.frames(height, width)
+                self._valid_from = self._seq
+            logging.debug("Capture buffer allocated for %dx%d frames.", width, height)
+        slot = self._seq % self.buffer_size
+        if self._ring is not None:
+            self._ring.begin_write(slot)
+        return slot
+
+    def _publish(self, slot: int) -> None:
+        """Marks the frame in `slot` as the newest one and wakes waiting readers."""
+        self._timestamps[slot] = time.monotonic()
+        with self._new_frame:
+            if self._ring is not None:
+                height, width = self._frames.shape[1:3]
+                self._ring.commit(slot, self._seq, height, width)
+            self._seq += 1
+            self._new_frame.notify_all()
+
+    def _write(self, frame: np.ndarray) -> int:
+        """Copies a grabbed RGB frame (often a view of the grabber's buffer) into the next ring slot.
+
+        Returns:
+            The slot written.
+        """
+        height, width = frame.shape[:2]
+        slot = self._prepare_slot(width, height)
+        np.copyto(self._frames[slot], frame[:, :, :3])
+        self._publish(slot)
+        return slot
+
+    def _grab(self, session) -> None:
+        """Grabs one frame of the game viewport (or the whole client area until it is detected)."""
+        geometry = self.tracker.geometry()
+        if geometry is None:
+            return  # Window gone or minimized; the tracker checks again later.
+        slot = self._write(self.grabber.grab(session, self.window, geometry))
+        if self.tracker.needs_viewport(geometry):
+            # Only this thread writes slots, so the frame stays put while it is analysed.
+            self.tracker.detect_frame(geometry, self._frames[slot])
+
+    def _run(self) -> None:
+        """Grab loop executed on the background thread."""
+        interval = 1.0 / self.fps
+        next_tick = time.monotonic()
+        # Opened here: readers of the ring don't need the grabber's backend (e.g. `mss`).
+        with self.grabber.session() as session:
+            while not self._stop_event.is_set():
+                try:
+                    with metrics.span("grab"):
+                        self._grab(session)
+                except Exception as e:
+                    self.grab_failures += 1
+                    metrics.inc("sims_capture_grab_failures_total")
+                    logging.warning("Capture engine grab failed: %s", e)
+                    self.tracker.capture_failed(e)
+
+                next_tick += interval
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    self._stop_event.wait(delay)
+                else:
+                    # Fell behind (slow grab or system stall); don't try to catch up.
+                    next_tick = time.monotonic()
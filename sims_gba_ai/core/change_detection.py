@@ -0,0 +1,100 @@
+"""
+Change Detection Module.
+
+Provides a fast, vectorized frame-difference check used to decide whether an
+input actually changed the game screen. Frames are sampled to the GBA's native
+resolution and compared pixel by pixel with NumPy, which takes a few
+milliseconds and, unlike comparing OCR output, also works on screens without
+any text. Regions that animate on their own (the in-game clock, idle sprites)
+can be excluded from the comparison.
+"""
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+import numpy as np
+
+from sims_gba_ai.config.settings import (
+    CHANGE_PIXEL_THRESHOLD,
+    CHANGE_RATIO_THRESHOLD,
+    CHANGE_IGNORE_REGIONS,
+    GBA_NATIVE_RESOLUTION,
+)
+from sims_gba_ai.utils.image_utils import Frame, to_native
+
+Region = tuple[int, int, int, int]  # (left, top, right, bottom) in native pixels
+
+
+@dataclass(frozen=True)
+class ChangeResult:
+    """Outcome of comparing two frames.
+
+    Attributes:
+        changed: True if the fraction of changed pixels exceeds the ratio threshold.
+        score: Fraction (0.0-1.0) of compared pixels whose difference exceeds
+               the per-pixel threshold.
+        mean_diff: Mean absolute per-pixel difference (0-255) over compared pixels.
+    """
+    changed: bool
+    score: float
+    mean_diff: float
+
+
+class ChangeDetector:
+    """Compares frames at native resolution, ignoring configured regions.
+
+    Args:
+        pixel_threshold: Minimum max-channel difference (0-255) for a pixel to
+                         count as changed. Filters out capture/scaling noise.
+        ratio_threshold: Fraction of compared pixels that must change for the
+                         frames to be considered different.
+        ignore_regions: Rectangles `(left, top, right, bottom)` in native
+                        coordinates excluded from the comparison.
+        resolution: `(width, height)` frames are sampled to before comparing.
+    """
+
+    def __init__(self, pixel_threshold: int = CHANGE_PIXEL_THRESHOLD,
+                 ratio_threshold: float = CHANGE_RATIO_THRESHOLD,
+                 ignore_regions: Sequence[Region] = CHANGE_IGNORE_REGIONS,
+                 resolution: tuple[int, int] = GBA_NATIVE_RESOLUTION) -> None:
+        self.pixel_threshold = pixel_threshold
+        self.ratio_threshold = ratio_threshold
+        self.resolution = resolution
+
+        width, height = resolution
+        self._mask = np.ones((height, width), dtype=bool)
+        for left, top, right, bottom in ignore_regions:
+            self._mask[max(0, top):min(height, bottom), max(0, left):min(width, right)] = False
+        self._compared_pixels = int(self._mask.sum())
+        if self._compared_pixels == 0:
+            raise ValueError("ignore_regions exclude the entire frame.")
+
+    def compare(self, before: Frame, after: Frame) -> ChangeResult:
+        """Compares two frames and returns a `ChangeResult`.
+
+        Args:
+            before: Frame captured before the input (PIL Image or NumPy array).
+            after: Frame captured after the input.
+        """
+        a = to_native(before, self.resolution).astype(np.int16)
+        b = to_native(after, self.resolution).astype(np.int16)
+        diff = np.abs(a - b).max(axis=2)
+
+        masked = diff[self._mask]
+        changed_pixels = int(np.count_nonzero(masked > self.pixel_threshold))
+        score = changed_pixels / self._compared_pixels
+        return ChangeResult(
+            changed=score > self.ratio_threshold,
+            score=score,
+            mean_diff=float(masked.mean()),
+        )
+
+
+_default_detector: Optional[ChangeDetector] = None
+
+
+def detect_change(before: Frame, after: Frame) -> ChangeResult:
+    """Compares two frames using a detector built from `settings.py`."""
+    global _default_detector
+    if _default_detector is None:
+        _default_detector = ChangeDetector()
+    return _default_detector.compare(before, after)
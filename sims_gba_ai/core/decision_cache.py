@@ -0,0 +1,237 @@
+"""
+Decision Cache Module.
+
+Caches LLM button decisions keyed by a perceptual hash (dHash) of the game
+screen. Menus, dialogs and other screens the agent has already seen are
+answered from memory in microseconds instead of a multi-second model round
+trip. Lookups tolerate a small Hamming distance between hashes, so capture
+noise or a blinking cursor still hits the cache.
+
+The cache is bounded (LRU eviction plus an optional time-to-live), keeps
+hit/miss counters, and can persist its entries to a JSON file so they survive
+restarts.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from sims_gba_ai.core import metrics
+from sims_gba_ai.config.settings import (
+    DECISION_CACHE_MAX_ENTRIES,
+    DECISION_CACHE_TTL_SECONDS,
+    DECISION_CACHE_HAMMING_TOLERANCE,
+    DECISION_CACHE_PATH,
+    DECISION_CACHE_SAVE_INTERVAL,
+)
+from sims_gba_ai.utils.image_utils import Frame, to_native
+
+
+def dhash(frame: Frame, hash_size: int = 8) -> int:
+    """Computes the difference hash (dHash) of a frame.
+
+    The frame is sampled to native resolution, converted to grayscale and
+    shrunk to `(hash_size + 1) x hash_size`. Each bit records whether a pixel
+    is brighter than its right-hand neighbour.
+
+    Args:
+        frame: A PIL Image or NumPy array.
+        hash_size: Hash grid size; the resulting hash has `hash_size ** 2` bits.
+
+    Returns:
+        The hash as a non-negative integer.
+    """
+    gray = Image.fromarray(to_native(frame)).convert('L')
+    small = np.asarray(gray.resize((hash_size + 1, hash_size), Image.Resampling.BOX), dtype=np.int16)
+    bits = (small[:, 1:] < small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Returns the number of differing bits between two hashes."""
+    return (a ^ b).bit_count()
+
+
+class DecisionCache:
+    """Bounded LRU/TTL cache mapping frame hashes to button decisions.
+
+    All public methods are thread-safe.
+
+    Args:
+        max_entries: Maximum number of entries before the least recently used
+                     entry is evicted.
+        ttl_seconds: Entries older than this are treated as missing. None
+                     disables expiry.
+        tolerance: Maximum Hamming distance for a hash to match a cached entry.
+        path: Optional JSON file the cache is loaded from and saved to.
+        save_interval: Save to `path` automatically after this many new
+                       entries. 0 disables automatic saving.
+    """
+
+    def __init__(self, max_entries: int = DECISION_CACHE_MAX_ENTRIES,
+                 ttl_seconds: Optional[float] = DECISION_CACHE_TTL_SECONDS,
+                 tolerance: int = DECISION_CACHE_HAMMING_TOLERANCE,
+                 path: Optional[str] = DECISION_CACHE_PATH,
+                 save_interval: int = DECISION_CACHE_SAVE_INTERVAL) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.tolerance = tolerance
+        self.path = path
+        self.save_interval = save_interval
+
+        # hash -> (decision, created wall-clock time)
+        self._entries: OrderedDict[int, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        # Serializes `save`: the orchestrator's agents share one cache.
+        self._save_lock = threading.Lock()
+        self._unsaved = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if path:
+            self.load()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, frame_hash: int) -> bool:
+        """Whether a live entry matches `frame_hash`. Unlike `get`, not counted as a lookup."""
+        with self._lock:
+            key = self._find(frame_hash)
+            return key is not None and not self._expired(self._entries[key][1], time.time())
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created > self.ttl_seconds
+
+    def _find(self, frame_hash: int) -> Optional[int]:
+        """Returns the key matching `frame_hash` within tolerance. Caller holds the lock."""
+        if frame_hash in self._entries:
+            return frame_hash
+        if self.tolerance <= 0:
+            return None
+        best_key, best_distance = None, self.tolerance + 1
+        for key in self._entries:
+            distance = (key ^ frame_hash).bit_count()
+            if distance < best_distance:
+                best_key, best_distance = key, distance
+        return best_key
+
+    def get(self, frame_hash: int) -> Optional[str]:
+        """Returns the cached decision for a frame hash, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            key = self._find(frame_hash)
+            if key is not None:
+                decision, created = self._entries[key]
+                if not self._expired(created, now):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    metrics.inc("sims_decision_cache_lookups_total", result="hit")
+                    return decision
+                del self._entries[key]
+            self.misses += 1
+            metrics.inc("sims_decision_cache_lookups_total", result="miss")
+            return None
+
+    def put(self, frame_hash: int, decision: str) -> None:
+        """Stores a decision for a frame hash, evicting the LRU entry if full."""
+        with self._lock:
+            self._entries[frame_hash] = (decision, time.time())
+            self._entries.move_to_end(frame_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._unsaved += 1
+            autosave = bool(self.path) and 0 < self.save_interval <= self._unsaved
+        if autosave:
+            self.save()
+
+    def invalidate(self, frame_hash: int) -> bool:
+        """Removes the entry matching a frame hash. Returns True if one was removed."""
+        with self._lock:
+            key = self._find(frame_hash)
+            if key is None:
+                return False
+            del self._entries[key]
+            return True
+
+    def stats(self) -> dict:
+        """Returns a snapshot of the cache counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    # --- Persistence ---
+
+    def load(self) -> None:
+        """Loads entries from `path`, skipping expired ones. Missing files are ignored."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning("Could not load decision cache from '%s': %s", self.path, e)
+            return
+
+        entries = data.get("entries", []) if isinstance(data, dict) else None
+        if not isinstance(entries, list):
+            logging.warning("Could not load decision cache from '%s': no entry list.", self.path)
+            return
+        now = time.time()
+        skipped = 0
+        with self._lock:
+            for entry in entries:
+                try:
+                    hash_hex, decision, created = entry
+                    key, created = int(hash_hex, 16), float(created)
+                    if not isinstance(decision, str):
+                        raise TypeError(f"decision is {type(decision).__name__}")
+                except (TypeError, ValueError):
+                    skipped += 1
+                    continue
+                if not self._expired(created, now):
+                    self._entries[key] = (decision, created)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if skipped:
+            logging.warning("Skipped %d malformed decision cache entries in '%s'.", skipped, self.path)
+        logging.info("Loaded %d decision cache entries from '%s'.", len(self._entries), self.path)
+
+    def save(self) -> None:
+        """Writes all entries to `path` atomically (via a temporary file)."""
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                entries = [[f"{key:x}", decision, created]
+                           for key, (decision, created) in self._entries.items()]
+                self._unsaved = 0
+
+            tmp_path = None
+            try:
+                with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix=".tmp", delete=False,
+                                                 dir=os.path.dirname(os.path.abspath(self.path))) as f:
+                    tmp_path = f.name
+                    json.dump({"version": 1, "entries": entries}, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logging.warning("Could not save decision cache to '%s': %s", self.path, e)
+                if tmp_path and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
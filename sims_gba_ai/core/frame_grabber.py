@@ -0,0 +1,67 @@
+"""
+Frame Grabber Module.
+
+The pixel source of screen capture is a pluggable `FrameGrabber`:
+`ScreenGrabber` grabs the emulator window's area of the screen with `mss`,
+while other grabbers read frames from elsewhere (the benchmarks' synthetic
+emulator renders its own). `CaptureEngine` and `capture_emulator_window` use
+the module default grabber unless they are given one, so the capture code
+does not depend on where frames come from.
+"""
+import contextlib
+from typing import Optional
+
+import numpy as np
+
+from sims_gba_ai.core.window_tracker import WindowGeometry
+
+
+class FrameGrabber:
+    """Interface for the pixel source of screen capture."""
+
+    def session(self) -> contextlib.AbstractContextManager:
+        """Returns a context manager for a grab session (e.g. a screen
+        grabber's handle), whose value is passed to `grab`."""
+        return contextlib.nullcontext()
+
+    def grab(self, session, window, geometry: WindowGeometry) -> np.ndarray:
+        """Returns the RGB pixels of `geometry.capture_box` of `window`.
+
+        The array may be a view into the grabber's buffers; it is only valid
+        until the next grab, so callers copy what they keep.
+        """
+        raise NotImplementedError
+
+
+class ScreenGrabber(FrameGrabber):
+    """Grabs the window's area of the screen with `mss` (imported on the first session)."""
+
+    def session(self) -> contextlib.AbstractContextManager:
+        import mss
+        return mss.mss()
+
+    def grab(self, session, window, geometry: WindowGeometry) -> np.ndarray:
+        sct_img = session.grab(geometry.region())
+        width, height = sct_img.size
+        # View the raw BGRA data as RGB without copying (the alpha channel is dropped).
+        return np.frombuffer(sct_img.bgra, dtype=np.uint8).reshape(height, width, 4)[:, :, 2::-1]
+
+
+_default_grabber: Optional[FrameGrabber] = None
+
+
+def get_default_grabber() -> FrameGrabber:
+    """Returns the grabber used when none is given, creating the screen grabber on first use."""
+    global _default_grabber
+    if _default_grabber is None:
+        _default_grabber = ScreenGrabber()
+    return _default_grabber
+
+
+def set_default_grabber(grabber: Optional[FrameGrabber]) -> None:
+    """Replaces the grabber used when none is given (None restores the screen grabber).
+
+    Capture engines already created keep their grabber.
+    """
+    global _default_grabber
+    _default_grabber = grabber
@@ -0,0 +1,274 @@
+"""
+Frame History Module.
+
+The LLM sees one frame per request and nothing of what came before, so it
+can keep oscillating (Up, Down, Up, ...) or keep pressing a button that does
+nothing, spending a round trip on every repeat. The `FrameHistory` keeps a
+bounded window of recent decisions (perceptual hash of the frame and the
+action taken on it) and detects two patterns with a few integer comparisons:
+
+    no_progress - the last decisions all left the screen unchanged
+    cycle       - screens and actions repeat with a short period
+
+When the agent is stuck, `stuck_context` returns the material for a request
+that shows what happened: the last frames at native resolution tiled into a
+small montage, plus the trail of inputs pressed between them. The montage and
+the prompt are sized to fit `STUCK_TOKEN_BUDGET`.
+"""
+import math
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from sims_gba_ai.core import metrics
+from sims_gba_ai.core.action_plan import describe_plan, parse_plan
+from sims_gba_ai.core.decision_cache import dhash, hamming_distance
+from sims_gba_ai.core.image_encoding import EncodedImage, ImageEncoder
+from sims_gba_ai.config.settings import (
+    STUCK_CYCLE_REPEATS,
+    STUCK_HAMMING_TOLERANCE,
+    STUCK_HASH_SIZE,
+    STUCK_HISTORY_SIZE,
+    STUCK_MAX_CYCLE_PERIOD,
+    STUCK_MONTAGE_FRAMES,
+    STUCK_NO_PROGRESS_STREAK,
+    STUCK_TOKEN_BUDGET,
+)
+from sims_gba_ai.utils.image_utils import Frame, to_native
+
+# Rough token cost estimates, used to fit stuck requests into their budget:
+# vision models bill about one token per 750 image pixels, text about one
+# token per 4 characters.
+_PIXELS_PER_TOKEN = 750
+_CHARS_PER_TOKEN = 4
+# Width of the separator lines between montage tiles, in pixels.
+_TILE_GAP = 4
+_GAP_COLOUR = (255, 0, 255)
+
+# Montages are sent as they are built: not resized to LLM_IMAGE_SIZE.
+_montage_encoder: Optional[ImageEncoder] = None
+
+
+@dataclass(frozen=True)
+class StuckPattern:
+    """A detected stuck pattern.
+
+    Attributes:
+        kind: "no_progress" or "cycle".
+        period: Number of decisions per cycle (1 for no progress).
+        length: Number of past decisions the pattern spans.
+    """
+    kind: str
+    period: int
+    length: int
+
+    def describe(self) -> str:
+        if self.kind == "cycle":
+            return (f"the same {self.period} screens and inputs have repeated "
+                    f"{self.length // self.period} times in a row")
+        return f"the last {self.length} inputs did not change the screen"
+
+
+def _tile_grid(count: int) -> tuple[int, int]:
+    """`(columns, rows)` of the most compact grid for `count` tiles."""
+    columns = math.ceil(math.sqrt(count))
+    return columns, math.ceil(count / columns)
+
+
+def _montage_size(count: int, tile: tuple[int, int]) -> tuple[int, int]:
+    columns, rows = _tile_grid(count)
+    return columns * tile[0] + (columns - 1) * _TILE_GAP, rows * tile[1] + (rows - 1) * _TILE_GAP
+
+
+def build_montage(frames: list[np.ndarray]) -> Image.Image:
+    """Tiles equally sized RGB frames row by row, oldest first, with separator lines."""
+    height, width = frames[0].shape[:2]
+    columns, _ = _tile_grid(len(frames))
+    montage = Image.new('RGB', _montage_size(len(frames), (width, height)), _GAP_COLOUR)
+    for index, frame in enumerate(frames):
+        row, column = divmod(index, columns)
+        montage.paste(Image.fromarray(frame), (column * (width + _TILE_GAP), row * (height + _TILE_GAP)))
+    return montage
+
+
+@dataclass
+class StuckContext:
+    """What a stuck request shows the LLM: recent frames and the inputs pressed between them.
+
+    Attributes:
+        pattern: The detected pattern.
+        frames: Native-resolution frames, oldest first; the last one is the current screen.
+        actions: Inputs of the recent decisions, oldest first (described, e.g. "Up x2").
+        budget: Estimated tokens the montage and the prompt may use together.
+    """
+    pattern: StuckPattern
+    frames: list[np.ndarray]
+    actions: list[str]
+    budget: int = STUCK_TOKEN_BUDGET
+
+    def _note(self, actions: list[str], frames: int) -> str:
+        return (
+            f"You seem to be stuck: {self.pattern.describe()}. The image is not a single screenshot: it shows "
+            f"the last {frames} screens in order (left to right, then top to bottom), and the last one is the "
+            f"current screen. Inputs pressed most recently, oldest first: {', '.join(actions)}. "
+            "Choose an input that gets out of this loop instead of repeating them."
+        )
+
+    def build(self, prompt: str) -> tuple[str, EncodedImage]:
+        """Extends `prompt` with the stuck note and encodes the montage, both within `budget`.
+
+        The oldest inputs are dropped while the text takes more than half the
+        budget. Then the oldest frames are left out (keeping at least two)
+        while the montage exceeds the rest of it, and finally the montage is
+        scaled down.
+
+        Returns:
+            `(prompt, encoded_montage)`.
+        """
+        global _montage_encoder
+        actions = list(self.actions)
+        frame_count = len(self.frames)
+        note = self._note(actions, frame_count)
+        while len(actions) > 1 and (len(prompt) + len(note)) / _CHARS_PER_TOKEN > self.budget / 2:
+            actions.pop(0)
+            note = self._note(actions, frame_count)
+        image_tokens = self.budget - math.ceil((len(prompt) + len(note) + 1) / _CHARS_PER_TOKEN)
+
+        tile = (self.frames[0].shape[1], self.frames[0].shape[0])
+
+        def tokens(count: int) -> int:
+            width, height = _montage_size(count, tile)
+            return math.ceil(width * height / _PIXELS_PER_TOKEN)
+
+        while frame_count > 2 and tokens(frame_count) > image_tokens:
+            frame_count -= 1
+        if frame_count != len(self.frames):
+            note = self._note(actions, frame_count)
+        montage = build_montage(self.frames[-frame_count:])
+        if tokens(frame_count) > image_tokens:
+            scale = math.sqrt(max(image_tokens, 1) / tokens(frame_count))
+            size = (max(1, int(montage.width * scale)), max(1, int(montage.height * scale)))
+            montage = montage.resize(size, Image.Resampling.NEAREST)
+
+        if _montage_encoder is None:
+            _montage_encoder = ImageEncoder(size=None, crop=None)
+        encoded = _montage_encoder.encode(montage)
+        estimated = math.ceil(montage.width * montage.height / _PIXELS_PER_TOKEN
+                              + (len(prompt) + len(note) + 1) / _CHARS_PER_TOKEN)
+        metrics.inc("sims_stuck_request_tokens_total", estimated)
+        return f"{prompt}\n{note}", encoded
+
+
+@dataclass
+class _Entry:
+    frame_hash: int
+    action: str
+
+
+class FrameHistory:
+    """Bounded history of decisions that detects when the agent is stuck.
+
+    Args:
+        size: Number of recent decisions kept.
+        streak: Unchanged-screen decisions in a row that count as no progress.
+        max_period: Longest cycle (in decisions) detected.
+        repeats: Times a cycle must repeat in a row.
+        montage_frames: Frames kept for the montage of a stuck request.
+        hash_size: Grid size of the dHash screens are compared by.
+        tolerance: Maximum Hamming distance for two frame hashes to count as the same screen.
+        budget: Estimated token budget of a stuck request.
+
+    Example:
+        pattern = history.detect(image)
+        if pattern:
+            context = history.stuck_context(image, pattern)
+        ...
+        history.record(image, decision)
+    """
+
+    def __init__(self, size: int = STUCK_HISTORY_SIZE, streak: int = STUCK_NO_PROGRESS_STREAK,
+                 max_period: int = STUCK_MAX_CYCLE_PERIOD, repeats: int = STUCK_CYCLE_REPEATS,
+                 montage_frames: int = STUCK_MONTAGE_FRAMES, hash_size: int = STUCK_HASH_SIZE,
+                 tolerance: int = STUCK_HAMMING_TOLERANCE, budget: int = STUCK_TOKEN_BUDGET) -> None:
+        if montage_frames < 2:
+            raise ValueError(f"montage_frames must be at least 2, got {montage_frames}")
+        self.streak = streak
+        self.max_period = max_period
+        self.repeats = repeats
+        self.hash_size = hash_size
+        self.tolerance = tolerance
+        self.budget = budget
+        self._entries: deque[_Entry] = deque(maxlen=size)
+        # Native-resolution frames of the newest entries (the current frame completes the montage).
+        self._frames: deque[np.ndarray] = deque(maxlen=montage_frames - 1)
+        self._lock = threading.Lock()
+
+        self.detections: dict[str, int] = {}
+
+    def _same(self, a: int, b: int) -> bool:
+        return hamming_distance(a, b) <= self.tolerance
+
+    def record(self, image: Frame, action: str) -> None:
+        """Adds a decision: the frame it was made on and its cacheable text form."""
+        native = np.array(to_native(image))
+        entry = _Entry(dhash(native, self.hash_size), action)
+        with self._lock:
+            self._entries.append(entry)
+            self._frames.append(native)
+
+    def detect(self, image: Frame, count: bool = True) -> Optional[StuckPattern]:
+        """Returns the pattern the agent is stuck in if it decides on `image` next, or None.
+
+        Args:
+            image: The frame about to be decided on.
+            count: Count a detection in `stats()` and the metrics; pass
+                   False to only look (e.g. before a speculative request).
+        """
+        frame_hash = dhash(image, self.hash_size)
+        with self._lock:
+            pattern = self._match(list(self._entries), frame_hash)
+        if pattern is not None and count:
+            self.detections[pattern.kind] = self.detections.get(pattern.kind, 0) + 1
+            metrics.inc("sims_stuck_detections_total", kind=pattern.kind)
+        return pattern
+
+    def _match(self, entries: list[_Entry], frame_hash: int) -> Optional[StuckPattern]:
+        hashes = [entry.frame_hash for entry in entries] + [frame_hash]
+        actions = [entry.action for entry in entries]
+
+        streak = 0
+        for entry in reversed(entries):
+            if not self._same(entry.frame_hash, frame_hash):
+                break
+            streak += 1
+        if streak >= self.streak:
+            return StuckPattern("no_progress", 1, streak)
+
+        for period in range(2, self.max_period + 1):
+            length = period * self.repeats
+            if len(actions) < length:
+                break
+            # The screens before each of the last `length` actions and the current one.
+            screens = hashes[-length - 1:]
+            recent = actions[-length:]
+            if (all(self._same(screens[i], screens[i + period]) for i in range(length - period + 1))
+                    and all(recent[i] == recent[i + period] for i in range(length - period))
+                    # A cycle through a single screen is a no-progress streak, not a cycle.
+                    and any(not self._same(screens[-1], screens[-1 - i]) for i in range(1, period))):
+                return StuckPattern("cycle", period, length)
+        return None
+
+    def stuck_context(self, image: Frame, pattern: StuckPattern) -> StuckContext:
+        """Collects the recent frames (plus `image`, the current one) and actions for a stuck request."""
+        with self._lock:
+            frames = [*self._frames, np.array(to_native(image))]
+            actions = [describe_plan(parse_plan(entry.action)) for entry in self._entries]
+        return StuckContext(pattern, frames, actions, self.budget)
+
+    def stats(self) -> dict:
+        """Returns the number of stuck detections by kind."""
+        return dict(self.detections)
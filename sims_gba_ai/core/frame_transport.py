@@ -0,0 +1,385 @@
+"""
+Frame Transport Module.
+
+Moves captured frames to worker processes without pickling or copying them.
+OCR, image encoding and template matching are CPU-bound; running them in
+worker processes takes them off the agent's GIL, but sending a frame through
+a `ProcessPoolExecutor` pickles a megabyte of pixels per task.
+
+A `SharedFrameRing` is a fixed number of frame slots in one
+`multiprocessing.shared_memory` block. The capture engine writes each frame
+straight into the next slot (see `CaptureEngine(shared=True)`), and worker
+processes map the same block and read the pixels in place through a
+`FrameView`. Tasks only carry a small `FrameRef` (ring name and sequence
+number).
+
+There is one writer and no lock between processes. Each slot is a seqlock:
+its version is odd while the writer fills it and even once the frame is
+published. A reader notes the version when it takes a view and checks it
+again when it releases the view; if the slot was rewritten in between, the
+pixels it read may be torn and the read fails with `FrameOverwrittenError`.
+Readers therefore copy out what they need (a crop, a downsampled frame, an
+encoded image) and release the view before the slow part of their work.
+
+Per-slot counters live in the shared header: frames written, and frames
+dropped (overwritten before any reader looked at them). The
+`FrameWorkerPool` adds reads, overruns and the handoff latency from publish
+to the worker's view.
+"""
+import importlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from sims_gba_ai.core import metrics
+from sims_gba_ai.config.settings import FRAME_WORKERS
+
+# Ring header: slot count and slot size, then one row of fields per slot.
+_RING_FIELDS = 2
+_SLOTS, _SLOT_BYTES = range(_RING_FIELDS)
+_SLOT_FIELDS = 8
+_VERSION, _SEQ, _HEIGHT, _WIDTH, _WRITTEN_NS, _READ_SEQ, _WRITES, _DROPS = range(_SLOT_FIELDS)
+# Frame data starts on a cache line boundary.
+_ALIGN = 64
+
+
+def _header_bytes(slots: int) -> int:
+    size = (_RING_FIELDS + slots * _SLOT_FIELDS) * 8
+    return (size + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class FrameOverwrittenError(Exception):
+    """The frame was overwritten before (or while) a reader used it."""
+
+    def __init__(self, seq: int, slot: int) -> None:
+        super().__init__(seq, slot)
+        self.seq = seq
+        self.slot = slot
+
+    def __str__(self) -> str:
+        return f"Frame {self.seq} in slot {self.slot} was overwritten"
+
+
+@dataclass(frozen=True)
+class FrameRef:
+    """Picklable handle to one frame in a `SharedFrameRing`.
+
+    Attributes:
+        ring: Shared memory name of the ring.
+        seq: Sequence number of the frame.
+    """
+    ring: str
+    seq: int
+
+
+class FrameView:
+    """Read-only, zero-copy view of one frame in a `SharedFrameRing`.
+
+    `array` points into shared memory and is only trustworthy until
+    `release()` succeeds; copy out what is needed first.
+    """
+
+    def __init__(self, ring: 'SharedFrameRing', slot: int, seq: int, version: int,
+                 array: np.ndarray, written_ns: int) -> None:
+        self.ring = ring
+        self.slot = slot
+        self.seq = seq
+        self.array = array
+        self._version = version
+        self.acquired_ns = time.monotonic_ns()
+        # Time from the frame being published to this view, in seconds.
+        self.handoff_latency = max(0, self.acquired_ns - written_ns) / 1e9
+        self.hold_time: Optional[float] = None
+
+    def valid(self) -> bool:
+        """True while the slot still holds this frame."""
+        return self.ring._version(self.slot) == self._version
+
+    def release(self) -> None:
+        """Ends the read. Releasing twice is a no-op.
+
+        Raises:
+            FrameOverwrittenError: If the writer reused the slot during the
+                                   read, so data copied from `array` may be torn.
+        """
+        if self.hold_time is not None:
+            return
+        self.hold_time = (time.monotonic_ns() - self.acquired_ns) / 1e9
+        if not self.valid():
+            raise FrameOverwrittenError(self.seq, self.slot)
+
+
+class SharedFrameRing:
+    """Fixed-slot frame buffers in shared memory with seqlock handoff.
+
+    Create the ring in the writer process with `slots` and `slot_bytes`; other
+    processes open it with `SharedFrameRing.attach(name)`.
+
+    Args:
+        slots: Number of frame slots.
+        slot_bytes: Capacity of each slot; frames up to this many bytes of
+                    `(height, width, 3)` uint8 RGB fit.
+    """
+
+    def __init__(self, slots: int, slot_bytes: int, _shm: Optional['shared_memory.SharedMemory'] = None) -> None:
+        from multiprocessing import shared_memory
+        self._owner = _shm is None
+        if _shm is None:
+            if slots < 2:
+                raise ValueError(f"slots must be at least 2, got {slots}")
+            slot_bytes = (slot_bytes + _ALIGN - 1) // _ALIGN * _ALIGN
+            _shm = shared_memory.SharedMemory(create=True, size=_header_bytes(slots) + slots * slot_bytes)
+        self._shm = _shm
+        ring_header = np.ndarray((_RING_FIELDS,), dtype=np.int64, buffer=_shm.buf)
+        if self._owner:
+            ring_header[:] = (slots, slot_bytes)
+        self.slots = int(ring_header[_SLOTS])
+        self.slot_bytes = int(ring_header[_SLOT_BYTES])
+        self._header = np.ndarray((self.slots, _SLOT_FIELDS), dtype=np.int64, buffer=_shm.buf,
+                                  offset=_RING_FIELDS * 8)
+        if self._owner:
+            self._header[:] = 0
+            self._header[:, _SEQ] = -1
+            self._header[:, _READ_SEQ] = -1
+        self._data_offset = _header_bytes(self.slots)
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedFrameRing':
+        """Opens a ring created by another process."""
+        from multiprocessing import shared_memory
+        return cls(0, 0, _shm=shared_memory.SharedMemory(name=name))
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def ref(self, seq: int) -> FrameRef:
+        return FrameRef(self.name, seq)
+
+    def _version(self, slot: int) -> int:
+        return int(self._header[slot, _VERSION])
+
+    def _frame_array(self, slot: int, height: int, width: int) -> np.ndarray:
+        return np.ndarray((height, width, 3), dtype=np.uint8, buffer=self._shm.buf,
+                          offset=self._data_offset + slot * self.slot_bytes)
+
+    # --- Writer side (one writer per ring) ---
+
+    def fits(self, height: int, width: int) -> bool:
+        return height * width * 3 <= self.slot_bytes
+
+    def frames(self, height: int, width: int) -> np.ndarray:
+        """Writable `(slots, height, width, 3)` view over every slot, for the writer.
+
+        Raises:
+            ValueError: If a frame of that size does not fit a slot.
+        """
+        if not self.fits(height, width):
+            raise ValueError(f"{width}x{height} frames do not fit {self.slot_bytes}-byte slots")
+        return np.ndarray((self.slots, height, width, 3), dtype=np.uint8, buffer=self._shm.buf,
+                          offset=self._data_offset, strides=(self.slot_bytes, width * 3, 3, 1))
+
+    def begin_write(self, slot: int) -> None:
+        """Marks `slot` as being written; readers of its old frame will fail."""
+        header = self._header[slot]
+        if header[_WRITES] and header[_READ_SEQ] != header[_SEQ]:
+            header[_DROPS] += 1
+        header[_VERSION] += 1  # Odd: write in progress.
+
+    def commit(self, slot: int, seq: int, height: int, width: int) -> None:
+        """Publishes the frame written into `slot` since `begin_write`."""
+        header = self._header[slot]
+        header[_SEQ] = seq
+        header[_HEIGHT] = height
+        header[_WIDTH] = width
+        header[_WRITTEN_NS] = time.monotonic_ns()
+        header[_WRITES] += 1
+        header[_VERSION] += 1  # Even: readable.
+
+    # --- Reader side ---
+
+    def read(self, seq: int) -> Optional[FrameView]:
+        """Returns a view of frame `seq`, or None if it is not in the ring (any more)."""
+        slot = seq % self.slots
+        header = self._header[slot]
+        version = int(header[_VERSION])
+        if version % 2 or header[_SEQ] != seq:
+            return None
+        array = self._frame_array(slot, int(header[_HEIGHT]), int(header[_WIDTH]))
+        array.flags.writeable = False
+        view = FrameView(self, slot, seq, version, array, int(header[_WRITTEN_NS]))
+        if not view.valid():
+            return None
+        self.mark_read(slot, seq)
+        return view
+
+    def mark_read(self, slot: int, seq: int) -> None:
+        """Records that frame `seq` was consumed, so overwriting it is not a drop."""
+        self._header[slot, _READ_SEQ] = seq
+
+    def slot_stats(self) -> list[dict]:
+        """Returns the frames written and dropped per slot."""
+        return [{"writes": int(row[_WRITES]), "drops": int(row[_DROPS])} for row in self._header]
+
+    def close(self) -> None:
+        """Unmaps the ring; the creating process also frees it."""
+        self._header = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # A view handed out earlier is still alive; the mapping goes with it.
+            logging.debug("Frame ring %s still has live views; leaving it mapped.", self.name)
+        if self._owner:
+            self._shm.unlink()
+
+
+# --- Worker processes ---
+
+# Rings the worker process has attached to, most recently used last.
+_attached: OrderedDict[str, SharedFrameRing] = OrderedDict()
+# Several capture engines (one per emulator) may feed the same workers.
+_MAX_ATTACHED = 16
+
+
+def _attach(name: str) -> SharedFrameRing:
+    ring = _attached.get(name)
+    if ring is None:
+        ring = _attached[name] = SharedFrameRing.attach(name)
+        if len(_attached) > _MAX_ATTACHED:
+            _attached.popitem(last=False)[1].close()
+    _attached.move_to_end(name)
+    return ring
+
+
+def _run_task(ref: FrameRef, fn: Callable, args: tuple) -> tuple[Any, int, float, float]:
+    """Runs `fn(view, *args)` on a frame inside a worker process."""
+    ring = _attach(ref.ring)
+    view = ring.read(ref.seq)
+    if view is None:
+        raise FrameOverwrittenError(ref.seq, ref.seq % ring.slots)
+    result = fn(view, *args)
+    view.release()
+    return result, view.slot, view.handoff_latency, view.hold_time
+
+
+def _warm_up(modules: tuple[str, ...]) -> None:
+    """Imports the task modules in a worker process."""
+    for module in modules:
+        importlib.import_module(module)
+
+
+class _SlotReads:
+    """Reader-side counters of one slot, kept by the pool."""
+
+    def __init__(self) -> None:
+        self.reads = 0
+        self.overruns = 0
+        self.handoff_total = 0.0
+        self.handoff_max = 0.0
+
+    def summary(self) -> dict:
+        return {
+            "reads": self.reads,
+            "overruns": self.overruns,
+            "mean_handoff_ms": self.handoff_total / self.reads * 1000 if self.reads else 0.0,
+            "max_handoff_ms": self.handoff_max * 1000,
+        }
+
+
+class FrameWorkerPool:
+    """Worker processes running frame analyses on views of a `SharedFrameRing`.
+
+    Task functions run in the workers as `fn(view, *args)`. They must be
+    module-level (picklable by reference), should release the view once they
+    have copied out what they need, and their result is sent back pickled.
+
+    Args:
+        workers: Number of worker processes.
+    """
+
+    def __init__(self, workers: int = FRAME_WORKERS) -> None:
+        if workers < 1:
+            raise ValueError(f"workers must be at least 1, got {workers}")
+        from concurrent.futures import ProcessPoolExecutor  # Loads multiprocessing; only needed here.
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+        self._reads: dict[int, _SlotReads] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, ref: FrameRef, *args) -> Future:
+        """Runs `fn` on the frame `ref` in a worker.
+
+        Returns:
+            A future resolving to `fn`'s result, or failing with
+            `FrameOverwrittenError` if the frame was overwritten before the
+            worker released it.
+        """
+        future: Future = Future()
+        task = self._executor.submit(_run_task, ref, fn, args)
+
+        def _done(done: Future) -> None:
+            try:
+                result, slot, handoff, hold = done.result()
+            except FrameOverwrittenError as e:
+                with self._lock:
+                    self._reads.setdefault(e.slot, _SlotReads()).overruns += 1
+                metrics.inc("sims_frame_overruns_total")
+                future.set_exception(e)
+                return
+            except Exception as e:
+                future.set_exception(e)
+                return
+            with self._lock:
+                reads = self._reads.setdefault(slot, _SlotReads())
+                reads.reads += 1
+                reads.handoff_total += handoff
+                reads.handoff_max = max(reads.handoff_max, handoff)
+            metrics.observe(metrics.STAGE_METRIC, handoff, stage="frame_handoff")
+            future.set_result(result)
+
+        task.add_done_callback(_done)
+        return future
+
+    def warm_up(self, modules: tuple[str, ...] = ()) -> None:
+        """Starts the worker processes and imports `modules` in them, ahead of the first frame."""
+        for future in [self._executor.submit(_warm_up, modules) for _ in range(self.workers)]:
+            future.result()
+
+    def stats(self) -> dict[int, dict]:
+        """Returns reads, overruns and handoff latency per slot."""
+        with self._lock:
+            return {slot: reads.summary() for slot, reads in sorted(self._reads.items())}
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+_default_pool: Optional[FrameWorkerPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_frame_pool() -> Optional[FrameWorkerPool]:
+    """Returns the shared frame worker pool, or None if `FRAME_WORKERS` is 0."""
+    global _default_pool
+    if FRAME_WORKERS <= 0:
+        return None
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = FrameWorkerPool(FRAME_WORKERS)
+            logging.info("Started %d frame worker processes.", FRAME_WORKERS)
+        return _default_pool
+
+
+def close_frame_pool() -> None:
+    """Shuts the shared frame worker pool down, if it was started."""
+    global _default_pool
+    with _default_pool_lock:
+        pool, _default_pool = _default_pool, None
+    if pool:
+        pool.close()
@@ -0,0 +1,150 @@
+"""
+Image Encoding Module.
+
+Prepares screen captures for LLM requests. Captures of the game viewport
+carry the emulator's upscaling, so encoding them as-is produces payloads
+many times larger than the 240x160 picture they carry. The `ImageEncoder`
+optionally crops, downsamples (nearest-neighbour, to keep pixel art
+sharp), encodes as PNG, palette PNG, JPEG or WebP and base64-encodes the
+result from a reusable buffer. Every encode reports its payload size and
+encode time, so image quality can be traded against upload size and latency.
+"""
+import base64
+import io
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image
+
+from sims_gba_ai.core import metrics
+from sims_gba_ai.core.frame_transport import FrameView
+from sims_gba_ai.config.settings import (
+    LLM_IMAGE_CROP,
+    LLM_IMAGE_SIZE,
+    LLM_IMAGE_FORMAT,
+    LLM_IMAGE_QUALITY,
+    LLM_IMAGE_PALETTE_COLORS,
+)
+
+# Encoding format name -> (PIL format, MIME type)
+_FORMATS: dict[str, tuple[str, str]] = {
+    "png": ("PNG", "image/png"),
+    "png-palette": ("PNG", "image/png"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
+
+
+@dataclass(frozen=True)
+class EncodedImage:
+    """A base64-encoded image ready to embed in an LLM request.
+
+    Attributes:
+        base64_data: The base64-encoded image bytes.
+        mime_type: MIME type matching the encoding format.
+        size: `(width, height)` of the encoded image.
+        raw_bytes: Size of the encoded image before base64.
+        payload_bytes: Size of the base64 string sent in the request.
+        encode_ms: Time spent cropping, resizing and encoding, in milliseconds.
+    """
+    base64_data: str
+    mime_type: str
+    size: tuple[int, int]
+    raw_bytes: int
+    payload_bytes: int
+    encode_ms: float
+
+    @property
+    def data_url(self) -> str:
+        """The image as a `data:` URL for OpenAI-style `image_url` content."""
+        return f"data:{self.mime_type};base64,{self.base64_data}"
+
+
+class ImageEncoder:
+    """Configurable crop/resize/encode pipeline for LLM image payloads.
+
+    Args:
+        fmt: One of "png", "png-palette", "jpeg" or "webp".
+        quality: Quality (1-100) for JPEG and WebP. Ignored for PNG.
+        size: Target `(width, height)`, or None to keep the cropped size.
+        crop: `(left, top, right, bottom)` box in pixels of the captured
+              viewport, or None to keep the whole capture.
+        palette_colors: Number of colours used by "png-palette".
+    """
+
+    def __init__(self, fmt: str = LLM_IMAGE_FORMAT, quality: int = LLM_IMAGE_QUALITY,
+                 size: Optional[tuple[int, int]] = LLM_IMAGE_SIZE,
+                 crop: Optional[tuple[int, int, int, int]] = LLM_IMAGE_CROP,
+                 palette_colors: int = LLM_IMAGE_PALETTE_COLORS) -> None:
+        if fmt not in _FORMATS:
+            raise ValueError(f"Unsupported image format '{fmt}'. Options: {', '.join(_FORMATS)}")
+        self.fmt = fmt
+        self.quality = quality
+        self.size = size
+        self.crop = crop
+        self.palette_colors = palette_colors
+
+        self._buffer = io.BytesIO()  # Reused across encodes to avoid reallocating.
+        self._lock = threading.Lock()
+
+    def prepare(self, image: Image.Image) -> Image.Image:
+        """Applies the crop and resize steps and returns the resulting image."""
+        if self.crop:
+            image = image.crop(self.crop)
+        if self.size and image.size != tuple(self.size):
+            image = image.resize(self.size, Image.Resampling.NEAREST)
+        return image
+
+    def encode(self, image: Image.Image) -> EncodedImage:
+        """Runs the full pipeline on a PIL Image and returns an `EncodedImage`."""
+        start = time.perf_counter()
+        image = self.prepare(image)
+        pil_format, mime_type = _FORMATS[self.fmt]
+
+        if self.fmt == "png-palette":
+            image = image.convert('RGB').quantize(self.palette_colors, method=Image.Quantize.FASTOCTREE)
+            save_kwargs = {"optimize": True}
+        elif self.fmt == "png":
+            save_kwargs = {}
+        else:
+            image = image.convert('RGB')
+            save_kwargs = {"quality": self.quality}
+
+        with self._lock:
+            self._buffer.seek(0)
+            self._buffer.truncate()
+            image.save(self._buffer, format=pil_format, **save_kwargs)
+            raw_bytes = self._buffer.tell()
+            with self._buffer.getbuffer() as view:
+                base64_data = base64.b64encode(view).decode('ascii')
+
+        elapsed = time.perf_counter() - start
+        metrics.observe(metrics.STAGE_METRIC, elapsed, stage="encode")
+        return EncodedImage(
+            base64_data=base64_data,
+            mime_type=mime_type,
+            size=image.size,
+            raw_bytes=raw_bytes,
+            payload_bytes=len(base64_data),
+            encode_ms=elapsed * 1000,
+        )
+
+
+_default_encoder: Optional[ImageEncoder] = None
+
+
+def encode_image(image: Image.Image) -> EncodedImage:
+    """Encodes an image with an `ImageEncoder` built from `settings.py`."""
+    global _default_encoder
+    if _default_encoder is None:
+        _default_encoder = ImageEncoder()
+    return _default_encoder.encode(image)
+
+
+def encode_frame_task(view: FrameView) -> EncodedImage:
+    """Frame worker task: encodes a shared frame for an LLM request."""
+    image = Image.fromarray(view.array)  # PIL copies RGB pixels into its own buffer.
+    view.release()
+    return encode_image(image)
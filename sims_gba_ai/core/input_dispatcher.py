@@ -0,0 +1,392 @@
+"""
+Input Dispatcher Module.
+
+Sends GBA button input to the emulator window through a timed event queue.
+The original input path re-activated the window, slept, queried the active
+window and slept again on every press, costing 200ms or more even when the
+emulator already had focus. The `InputDispatcher` instead tracks focus state
+and only re-activates the window after focus was lost (or could not be
+confirmed for `INPUT_FOCUS_CHECK_INTERVAL` seconds).
+
+Presses, holds, releases and chords (e.g. L+R) are scheduled as timed
+key-down/key-up events and sent by a worker thread, so hold durations can be
+given in GBA frames. The OS-facing side is a pluggable `InputBackend`:
+`PyDirectInputBackend` drives the real emulator on Windows, while
+`RecordingBackend` records events so the dispatcher can be exercised on any
+platform.
+
+Backends that type into whichever window has focus (`shared_focus`) are
+shared by every dispatcher: when several emulator windows are driven at once,
+each input (focus check, key-down, key-up) holds a process-wide lock, and a
+dispatcher re-checks focus whenever another window had it in between.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Hashable, Optional, Sequence
+
+from sims_gba_ai.config.settings import (
+    GBA_KEY_MAPPINGS,
+    KEY_PRESS_PAUSE,
+    INPUT_TAP_FRAMES,
+    INPUT_FOCUS_CHECK_INTERVAL,
+    INPUT_ACTIVATION_DELAY,
+)
+from sims_gba_ai.utils.window_utils import window_key
+
+# Duration of one GBA video frame in seconds (the GBA refreshes at ~59.73 Hz).
+GBA_FRAME_DURATION: float = 1 / 59.7275
+
+# Remaining wait (seconds) below which the worker busy-waits instead of
+# sleeping, to keep event timing within a fraction of a frame.
+_SPIN_THRESHOLD: float = 0.002
+
+
+class InputBackend:
+    """Interface for the OS side of input dispatch."""
+
+    # True if keys go to the focused window rather than to a given window, so
+    # inputs for different windows must not interleave.
+    shared_focus = True
+
+    def key_down(self, key: str) -> None:
+        raise NotImplementedError
+
+    def key_up(self, key: str) -> None:
+        raise NotImplementedError
+
+    def is_focused(self, window) -> bool:
+        """Returns True if `window` currently has keyboard focus."""
+        raise NotImplementedError
+
+    def activate(self, window) -> None:
+        """Brings `window` to the foreground (restoring it if minimized)."""
+        raise NotImplementedError
+
+
+class PyDirectInputBackend(InputBackend):
+    """Sends input with `pydirectinput` and manages focus with `pygetwindow` (Windows)."""
+
+    def __init__(self) -> None:
+        # Imported here: both libraries are Windows-only.
+        import pydirectinput
+        import pygetwindow
+        self._pydirectinput = pydirectinput
+        self._gw = pygetwindow
+
+    def key_down(self, key: str) -> None:
+        self._pydirectinput.keyDown(key)
+
+    def key_up(self, key: str) -> None:
+        self._pydirectinput.keyUp(key)
+
+    def is_focused(self, window) -> bool:
+        active_window = self._gw.getActiveWindow()
+        if active_window is None:
+            return False
+        if hasattr(window, '_hWnd') and hasattr(active_window, '_hWnd'):
+            return active_window._hWnd == window._hWnd
+        return active_window.title == window.title
+
+    def activate(self, window) -> None:
+        # Ensure the window is not minimized before attempting to activate.
+        if window.isMinimized:
+            logging.debug("Restoring minimized window: %s", window.title)
+            window.restore()
+        window.activate()
+
+
+class RecordingBackend(InputBackend):
+    """Fake backend that records events instead of sending them.
+
+    Attributes:
+        events: `(monotonic_time, kind, key)` tuples, kind being "down" or "up".
+        activations: Number of times `activate` was called.
+        focused: Simulated focus state; set to False to emulate focus loss.
+    """
+
+    shared_focus = False
+
+    def __init__(self) -> None:
+        self.events: list[tuple[float, str, str]] = []
+        self.activations = 0
+        self.focused = False
+        self._lock = threading.Lock()
+
+    def key_down(self, key: str) -> None:
+        with self._lock:
+            self.events.append((time.monotonic(), "down", key))
+
+    def key_up(self, key: str) -> None:
+        with self._lock:
+            self.events.append((time.monotonic(), "up", key))
+
+    def is_focused(self, window) -> bool:
+        return self.focused
+
+    def activate(self, window) -> None:
+        self.activations += 1
+        self.focused = True
+
+
+class InputDispatcher:
+    """Focus-aware, timed input queue for one emulator window.
+
+    Args:
+        window: The emulator window input is sent to.
+        backend: OS backend. Defaults to the module default backend
+                 (`PyDirectInputBackend` unless changed via `set_default_backend`).
+        key_mappings: GBA button name -> keyboard key.
+        min_gap: Minimum time in seconds between the release of one input
+                 and the next key-down, so the emulator registers both.
+        focus_check_interval: Seconds a positive focus check stays trusted.
+        activation_delay: Seconds to wait after activating the window.
+    """
+
+    def __init__(self, window, backend: Optional[InputBackend] = None,
+                 key_mappings: dict[str, str] = GBA_KEY_MAPPINGS,
+                 min_gap: float = KEY_PRESS_PAUSE,
+                 focus_check_interval: float = INPUT_FOCUS_CHECK_INTERVAL,
+                 activation_delay: float = INPUT_ACTIVATION_DELAY) -> None:
+        self.window = window
+        self.backend = backend or get_default_backend()
+        self.key_mappings = key_mappings
+        self.min_gap = min_gap
+        self.focus_check_interval = focus_check_interval
+        self.activation_delay = activation_delay
+
+        self.activations = 0
+        self.focus_checks = 0
+
+        # (due_time, order, kind, keys, future, is_first_event_of_input, is_last_event_of_input)
+        self._queue: list[tuple[float, int, str, tuple[str, ...], Future, bool, bool]] = []
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        self._next_free = 0.0      # Earliest time the next input may start.
+        self._focus_confirmed_at: Optional[float] = None
+        self._held: set[str] = set()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="InputDispatcher", daemon=True)
+        self._worker.start()
+
+    # --- Focus ---
+
+    def invalidate_focus(self) -> None:
+        """Forgets the cached focus state, forcing a check before the next input."""
+        self._focus_confirmed_at = None
+
+    def ensure_focus(self) -> None:
+        """Activates the window unless focus was confirmed recently."""
+        global _focus_owner
+        now = time.monotonic()
+        if self.backend.shared_focus and _focus_owner is not self:
+            # Another dispatcher's window may have taken focus since our last check.
+            self._focus_confirmed_at = None
+        if (self._focus_confirmed_at is not None
+                and now - self._focus_confirmed_at < self.focus_check_interval):
+            return
+
+        self.focus_checks += 1
+        if not self.backend.is_focused(self.window):
+            logging.debug("Activating window: %s", self.window.title)
+            self.backend.activate(self.window)
+            self.activations += 1
+            time.sleep(self.activation_delay) # Allow the OS to process the focus change.
+            if not self.backend.is_focused(self.window):
+                logging.warning(
+                    f"Window '{self.window.title}' might not be focused after activate(). "
+                    "Input might be misdirected."
+                )
+                self._focus_confirmed_at = None
+                return
+        self._focus_confirmed_at = time.monotonic()
+        _focus_owner = self
+
+    # --- Scheduling ---
+
+    def _keys_for(self, buttons: Sequence[str]) -> tuple[str, ...]:
+        keys = []
+        for button in buttons:
+            if button not in self.key_mappings:
+                raise ValueError(f"Invalid GBA button: '{button}'. Not found in key mappings.")
+            keys.append(self.key_mappings[button])
+        return tuple(keys)
+
+    def _schedule(self, events: list[tuple[float, str, tuple[str, ...]]]) -> Future:
+        """Queues `(offset, kind, keys)` events; offsets are relative to the input start.
+
+        Returns:
+            A future resolved once the last event has been sent.
+        """
+        future: Future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("InputDispatcher is closed.")
+            start = max(time.monotonic(), self._next_free)
+            last = len(events) - 1
+            for index, (offset, kind, keys) in enumerate(events):
+                heapq.heappush(self._queue, (start + offset, next(self._order), kind, keys,
+                                             future, index == 0, index == last))
+            self._next_free = start + events[-1][0] + self.min_gap
+            self._condition.notify()
+        return future
+
+    @staticmethod
+    def _duration(hold: Optional[float], frames: Optional[int]) -> float:
+        if frames is not None:
+            return frames * GBA_FRAME_DURATION
+        if hold:
+            return hold
+        return INPUT_TAP_FRAMES * GBA_FRAME_DURATION
+
+    def press(self, button: str, hold: Optional[float] = None,
+              frames: Optional[int] = None) -> Future:
+        """Schedules a press (key-down, then key-up after the hold duration).
+
+        Args:
+            button: GBA button name.
+            hold: Hold duration in seconds. Defaults to a short tap.
+            frames: Hold duration in GBA frames; takes precedence over `hold`.
+        """
+        return self.chord([button], hold=hold, frames=frames)
+
+    def chord(self, buttons: Sequence[str], hold: Optional[float] = None,
+              frames: Optional[int] = None) -> Future:
+        """Schedules several buttons pressed and released together (e.g. L+R)."""
+        keys = self._keys_for(buttons)
+        duration = self._duration(hold, frames)
+        return self._schedule([(0.0, "down", keys), (duration, "up", keys)])
+
+    def hold(self, button: str) -> Future:
+        """Schedules a key-down without a release. Pair with `release`."""
+        return self._schedule([(0.0, "down", self._keys_for([button]))])
+
+    def release(self, button: str) -> Future:
+        """Schedules the release of a held button."""
+        return self._schedule([(0.0, "up", self._keys_for([button]))])
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until all queued events were sent. Returns False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._queue, timeout)
+
+    def close(self) -> None:
+        """Releases held keys and stops the worker thread after queued events are sent."""
+        self.wait_idle(timeout=5.0)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._worker.join(timeout=2.0)
+        for key in list(self._held):
+            self.backend.key_up(key)
+        self._held.clear()
+
+    # --- Worker ---
+
+    def _send(self, kind: str, keys: tuple[str, ...]) -> None:
+        if kind == "down":
+            self.ensure_focus()
+            for key in keys:
+                self.backend.key_down(key)
+                self._held.add(key)
+        else:
+            for key in keys:
+                self.backend.key_up(key)
+                self._held.discard(key)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while True:
+                    if self._closed and not self._queue:
+                        return
+                    if self._queue:
+                        remaining = self._queue[0][0] - time.monotonic()
+                        if remaining <= _SPIN_THRESHOLD:
+                            break
+                        self._condition.wait(remaining - _SPIN_THRESHOLD)
+                    else:
+                        self._condition.wait()
+                due, _, kind, keys, future, is_first, is_last = self._queue[0]
+
+            if is_first and self.backend.shared_focus:
+                # Keep other windows' inputs out until this one's keys are released.
+                _input_lock.acquire()
+            while time.monotonic() < due:
+                pass  # Spin for the last fraction of a millisecond.
+
+            try:
+                self._send(kind, keys)
+            except Exception as e:
+                # Focus may have been lost (e.g. window closed); re-check next time.
+                self.invalidate_focus()
+                if not future.done():
+                    future.set_exception(e)
+                logging.error("Input dispatch failed for keys %s: %s", keys, e)
+
+            if is_last and self.backend.shared_focus:
+                _input_lock.release()
+            with self._condition:
+                heapq.heappop(self._queue)
+                self._condition.notify_all()
+            if is_last and not future.done():
+                future.set_result(None)
+
+
+_default_backend: Optional[InputBackend] = None
+# Serializes inputs of `shared_focus` backends across dispatchers (windows).
+_input_lock = threading.Lock()
+# The dispatcher whose window was last confirmed focused.
+_focus_owner: Optional[InputDispatcher] = None
+_dispatchers: dict[Hashable, InputDispatcher] = {}
+_dispatchers_lock = threading.Lock()
+
+
+def get_default_backend() -> InputBackend:
+    """Returns the backend used by new dispatchers, creating the real one on first use."""
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = PyDirectInputBackend()
+    return _default_backend
+
+
+def set_default_backend(backend: Optional[InputBackend]) -> None:
+    """Replaces the backend used by new dispatchers (e.g. with a `RecordingBackend`).
+
+    Existing dispatchers are closed so later calls pick up the new backend.
+    """
+    global _default_backend
+    with _dispatchers_lock:
+        for dispatcher in _dispatchers.values():
+            dispatcher.close()
+        _dispatchers.clear()
+        _default_backend = backend
+
+
+def get_dispatcher(window) -> InputDispatcher:
+    """Returns the shared dispatcher for a window, creating it on first use."""
+    key = window_key(window)
+    with _dispatchers_lock:
+        dispatcher = _dispatchers.get(key)
+        if dispatcher is None:
+            dispatcher = InputDispatcher(window)
+            _dispatchers[key] = dispatcher
+        return dispatcher
+
+
+def close_dispatcher(window) -> None:
+    """Closes and forgets the shared dispatcher of a window that is no longer driven.
+
+    A later `get_dispatcher` for the window creates a new one.
+    """
+    global _focus_owner
+    with _dispatchers_lock:
+        dispatcher = _dispatchers.pop(window_key(window), None)
+        if dispatcher is None:
+            return
+        if _focus_owner is dispatcher:
+            _focus_owner = None
+    dispatcher.close()
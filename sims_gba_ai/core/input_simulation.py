@@ -2,30 +2,28 @@
 Input Simulation Module.
 
 Provides functionality to simulate keyboard presses corresponding to GBA buttons,
-targeting a specific emulator window. It uses `pydirectinput` for sending
-low-level input events and `pygetwindow` to manage window focus. Key mappings
-and press timings are configured via `settings.py`.
+targeting a specific emulator window. Presses are sent through the window's
+`InputDispatcher` (see `input_dispatcher.py`), which only re-activates the
+window when it lost focus and schedules key-down/key-up events on a timed
+queue. Key mappings and press timings are configured via `settings.py`.
 """
-import pydirectinput
 import time
-import pygetwindow as gw
 import logging
 from typing import Optional # Added for type hinting
 
-# Removed find_window and EMULATOR_WINDOW_TITLE imports as they are no longer needed here
-# from sims_gba_ai.utils.window_utils import find_window
-# from sims_gba_ai.config.settings import EMULATOR_WINDOW_TITLE
-from sims_gba_ai.config.settings import GBA_KEY_MAPPINGS, KEY_PRESS_PAUSE # Keep needed imports
+from sims_gba_ai.config.settings import GBA_KEY_MAPPINGS # Keep needed imports
+from sims_gba_ai.core import metrics
+from sims_gba_ai.core.input_dispatcher import get_dispatcher
+# Note: pygetwindow is used for the type hint, but not directly imported
+# because it is only available on Windows and macOS.
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-def press_gba_button(emulator_window: Optional[gw.Window], button: str) -> None:
+def press_gba_button(emulator_window: Optional['pygetwindow.Window'], button: str, hold: float = 0.0) -> None:
     """Simulates pressing a GBA button mapped to a keyboard key.
 
-    Focuses the target emulator window and sends a key press using
-    `pydirectinput`. The mapping from GBA button name (e.g., "A", "UP")
-    to the actual keyboard key is defined in `settings.GBA_KEY_MAPPINGS`.
+    Queues a press on the window's `InputDispatcher` and waits until the key
+    has been released. The dispatcher focuses the window only if it lost
+    focus. The mapping from GBA button name (e.g., "A", "Up") to the actual
+    keyboard key is defined in `settings.GBA_KEY_MAPPINGS`.
 
     Args:
         emulator_window: The `pygetwindow` Window object representing the
@@ -33,6 +31,8 @@ def press_gba_button(emulator_window: Optional[gw.Window], button: str) -> None:
                          an error and returns.
         button: The name of the GBA button to press (string). Must be a valid
                 key in the `GBA_KEY_MAPPINGS` dictionary.
+        hold: Seconds to hold the key down before releasing it. 0 sends a
+              normal tap.
 
     Returns:
         None
@@ -42,60 +42,30 @@ def press_gba_button(emulator_window: Optional[gw.Window], button: str) -> None:
         return
 
     if button not in GBA_KEY_MAPPINGS:
-        logging.error(f"Invalid GBA button: '{button}'. Not found in key mappings.")
+        logging.error("Invalid GBA button: '%s'. Not found in key mappings.", button)
         return
 
     key_to_press = GBA_KEY_MAPPINGS[button]
     window_title = emulator_window.title # Store title for logging clarity
 
-    logging.info(f"Attempting to press GBA button '{button}' (key '{key_to_press}') in window '{window_title}'")
+    # Lazy %-style arguments: nothing is formatted unless the level is enabled.
+    logging.debug("Attempting to press GBA button '%s' (key '%s') in window '%s'",
+                  button, key_to_press, window_title)
 
     try:
-        # --- Window Focusing ---
-        # Ensure the window is not minimized before attempting to activate.
-        if emulator_window.isMinimized:
-            logging.debug(f"Restoring minimized window: {window_title}")
-            emulator_window.restore()
-            time.sleep(0.1) # Small delay after restoring
-
-        # Attempt to bring the window to the foreground and give it focus.
-        # activate() can sometimes be unreliable depending on OS and window behavior.
-        logging.debug(f"Activating window: {window_title}")
-        emulator_window.activate()
-        time.sleep(0.1) # Short pause to allow the OS to process the focus change.
-
-        # --- Focus Verification (Optional but Recommended) ---
-        # Check if the intended window is actually the active one.
-        active_window = gw.getActiveWindow()
-        if active_window is None or active_window.title != window_title:
-            # If activation failed, log a warning. Input might go to the wrong window.
-            # More robust solutions might involve platform-specific APIs (like pywinauto on Windows)
-            # or retrying activation. For now, we proceed with a warning.
-            active_title = active_window.title if active_window else "None"
-            logging.warning(
-                f"Window '{window_title}' might not be focused after activate(). "
-                f"Actual active window: '{active_title}'. Input might be misdirected."
-            )
-
-        # --- Key Press Simulation ---
-        logging.debug(f"Sending key press '{key_to_press}' via pydirectinput.")
-        pydirectinput.press(key_to_press)
-        # Pause briefly after the press, as defined in settings.
-        time.sleep(KEY_PRESS_PAUSE)
-        logging.info(f"Successfully sent key press '{key_to_press}' for button '{button}'.")
-
-    except gw.PyGetWindowException as e:
-        # Errors specifically related to pygetwindow operations (e.g., window closed unexpectedly).
-        logging.error(f"PyGetWindow error interacting with '{window_title}': {e}")
+        # Block until the key-up was sent, so callers see the press as done.
+        with metrics.span("input"):
+            get_dispatcher(emulator_window).press(button, hold=hold or None).result()
+        logging.info("Successfully sent key press '%s' for button '%s'.", key_to_press, button)
     except Exception as e:
-        # Catch other potential errors (e.g., from pydirectinput, time.sleep).
-        logging.error(f"Unexpected error during input simulation for window '{window_title}': {e}")
+        # Catch errors from the input backend (e.g., window closed unexpectedly).
+        logging.error("Unexpected error during input simulation for window '%s': %s", window_title, e)
 
 
 # Example usage (for testing purposes)
-# Note: The example usage below needs updating to work with the current
-# function signature, which requires a valid window object.
 if __name__ == '__main__':
+    import pygetwindow as gw
+
     logging.basicConfig(level=logging.DEBUG) # Use DEBUG for detailed test output
     logging.info("--- Input Simulation Test ---")
     logging.info("Ensure the target emulator window (e.g., mGBA) is open.")
@@ -116,7 +86,7 @@ if __name__ == '__main__':
 
     # --- Run tests only if window was found ---
     if target_window:
-        test_buttons = ["A", "B", "UP", "DOWN", "LEFT", "RIGHT", "START", "SELECT", "L", "R", "InvalidButton"]
+        test_buttons = ["A", "B", "Up", "Down", "Left", "Right", "Start", "Select", "L", "R", "InvalidButton"]
 
         for btn in test_buttons:
             logging.info(f"--- Testing button: '{btn}' ---")
@@ -125,4 +95,4 @@ if __name__ == '__main__':
 
         logging.info("--- Input simulation test finished ---")
     else:
-        logging.warning("Skipping button press tests because the target window was not found.")
\ No newline at end of file
+        logging.warning("Skipping button press tests because the target window was not found.")
@@ -0,0 +1,408 @@
+"""
+LLM Client Module.
+
+Provides the HTTP layer shared by all LLM providers. Each provider gets one
+`LLMClient` holding a persistent `requests.Session` with a keep-alive
+connection pool, so decisions no longer pay TCP (and, for OpenRouter, TLS)
+setup on every request. Requests use separate connect and read timeouts and
+are retried with jittered exponential backoff on connection errors, 429 and
+5xx responses, honouring the server's `Retry-After` header. Per-provider
+latency statistics are kept for monitoring and tuning.
+
+`stream_chat_completion` requests a server-sent events (SSE) stream instead
+and yields the content deltas as they arrive, so callers can act on the first
+tokens and close the stream early.
+
+When several agents share one server (see `orchestrator.py`), each client's
+`RequestLimiter` caps the requests in flight (`LLM_MAX_CONCURRENT_REQUESTS`)
+and serves waiting callers first come, first served.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from sims_gba_ai.config import settings
+from sims_gba_ai.core import metrics
+
+# HTTP status codes that are worth retrying.
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+class LatencyStats:
+    """Rolling latency statistics for one provider.
+
+    Args:
+        window: Number of most recent request latencies kept for percentiles.
+    """
+
+    def __init__(self, window: int = 500) -> None:
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+
+    def record(self, latency: float) -> None:
+        """Records the latency (seconds) of a successful request."""
+        with self._lock:
+            self.requests += 1
+            self._latencies.append(latency)
+
+    def record_failure(self) -> None:
+        """Records a request that failed after all retries."""
+        with self._lock:
+            self.requests += 1
+            self.failures += 1
+
+    def record_retry(self) -> None:
+        """Records one retried attempt."""
+        with self._lock:
+            self.retries += 1
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Returns the p-th percentile (0-100) of recent latencies, or None if empty."""
+        with self._lock:
+            if not self._latencies:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self) -> dict:
+        """Returns a snapshot of counters and latency percentiles (seconds)."""
+        with self._lock:
+            recent = list(self._latencies)
+            counters = {"requests": self.requests, "failures": self.failures, "retries": self.retries}
+        if recent:
+            recent.sort()
+            counters.update({
+                "mean": sum(recent) / len(recent),
+                "p50": recent[len(recent) // 2],
+                "p95": recent[min(len(recent) - 1, int(len(recent) * 0.95))],
+                "max": recent[-1],
+            })
+        return counters
+
+
+class RequestLimiter:
+    """First-come, first-served limit on concurrent requests.
+
+    Args:
+        max_concurrent: Requests allowed in flight at once; 0 for no limit.
+    """
+
+    def __init__(self, max_concurrent: int = 0) -> None:
+        self.max_concurrent = max_concurrent
+        self._active = 0
+        self._waiters: deque[threading.Event] = deque()
+        self._lock = threading.Lock()
+        self.queued = 0
+
+    def acquire(self) -> float:
+        """Blocks until a slot is free. Returns the seconds spent waiting."""
+        if not self.max_concurrent:
+            return 0.0
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                return 0.0
+            ticket = threading.Event()
+            self._waiters.append(ticket)
+            self.queued += 1
+        start = time.perf_counter()
+        ticket.wait()  # `release` hands its slot straight to the oldest waiter.
+        waited = time.perf_counter() - start
+        metrics.observe(metrics.STAGE_METRIC, waited, stage="llm_queue")
+        return waited
+
+    def release(self) -> None:
+        """Frees a slot taken by `acquire`."""
+        if not self.max_concurrent:
+            return
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft().set()
+            else:
+                self._active -= 1
+
+    @property
+    def waiting(self) -> int:
+        """Number of callers waiting for a slot."""
+        with self._lock:
+            return len(self._waiters)
+
+
+class ChatStream:
+    """Message content deltas of a streaming chat completion.
+
+    Iterate over it once. `close()` (or leaving a for-loop early and closing
+    it) drops the connection, so the server stops generating tokens nobody
+    will read, and frees the client's request slot.
+    """
+
+    def __init__(self, client: 'LLMClient', response: requests.Response, start: float) -> None:
+        self._client = client
+        self._response = response
+        self._start = start
+        self._failed = False
+        self._closed = False
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            for line in self._response.iter_lines():
+                # SSE: "data: <json>" lines; comments (":") and other fields are ignored.
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                chunk = json.loads(data)
+                if "error" in chunk:
+                    raise requests.exceptions.HTTPError(
+                        f"Stream error from {self._client.name}: {chunk['error']}")
+                choices = chunk.get("choices") or [{}]
+                content = (choices[0].get("delta") or {}).get("content")
+                if content:
+                    yield content
+        except Exception:
+            self._failed = True
+            self._client._record_failure()
+            raise
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._response.close()
+        self._client.limiter.release()
+        if not self._failed:
+            self._client._record_success(self._start)
+
+
+def _retry_after_seconds(response: requests.Response) -> Optional[float]:
+    """Parses a `Retry-After` header (seconds or HTTP date). Returns None if absent or invalid."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMClient:
+    """Pooled, retrying HTTP client for one OpenAI-compatible provider.
+
+    Args:
+        name: Provider name used in logs and statistics.
+        base_url: API base URL, e.g. "http://localhost:1234/v1".
+        headers: Headers sent with every request (e.g. authorization).
+        connect_timeout: Seconds to wait for a connection to be established.
+        read_timeout: Seconds to wait between bytes of the response.
+        max_retries: Retries after the first attempt for retryable failures.
+        backoff_base: Base delay (seconds) of the exponential backoff.
+        backoff_max: Upper bound (seconds) for a single backoff delay,
+                     including delays requested through `Retry-After`.
+        pool_size: Maximum number of pooled keep-alive connections.
+        max_concurrent: Requests allowed in flight at once (0 for no limit);
+                        further callers queue in `limiter`.
+    """
+
+    def __init__(self, name: str, base_url: str, headers: Optional[dict[str, str]] = None,
+                 connect_timeout: float = settings.LLM_CONNECT_TIMEOUT,
+                 read_timeout: float = settings.LLM_READ_TIMEOUT,
+                 max_retries: int = settings.LLM_MAX_RETRIES,
+                 backoff_base: float = settings.LLM_BACKOFF_BASE,
+                 backoff_max: float = settings.LLM_BACKOFF_MAX,
+                 pool_size: int = settings.LLM_POOL_SIZE,
+                 max_concurrent: int = settings.LLM_MAX_CONCURRENT_REQUESTS) -> None:
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats = LatencyStats()
+        self.limiter = RequestLimiter(max_concurrent)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+    def _backoff_delay(self, attempt: int, response: Optional[requests.Response]) -> float:
+        """Delay before retry `attempt` (0-based): Retry-After if given, else full-jitter backoff."""
+        if response is not None:
+            retry_after = _retry_after_seconds(response)
+            if retry_after is not None:
+                return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _send(self, path: str, payload: dict, stream: bool = False,
+              read_timeout: Optional[float] = None) -> requests.Response:
+        """POSTs a JSON payload with retries and returns the successful response.
+
+        With `stream=True` only the headers have been read when this returns.
+        `read_timeout` overrides the client's read timeout for this request.
+        The returned response holds a `limiter` slot; the caller releases it.
+
+        Raises:
+            requests.exceptions.RequestException: If the request still fails
+                after all retries, or fails with a non-retryable status.
+        """
+        url = f"{self.base_url}{path}"
+        timeout = self.timeout if read_timeout is None else (self.timeout[0], read_timeout)
+        for attempt in range(self.max_retries + 1):
+            response = None
+            self.limiter.acquire()
+            try:
+                response = self.session.post(url, json=payload, timeout=timeout, stream=stream)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    if not response.ok:
+                        # Return the pooled connection before raising (a streamed body is never read).
+                        response.close()
+                        response.raise_for_status()
+                    return response
+                error: Exception = requests.exceptions.HTTPError(
+                    f"{response.status_code} from {self.name}", response=response)
+                response.close()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            except requests.exceptions.RequestException:
+                self.limiter.release()
+                self._record_failure()
+                raise
+            except BaseException:
+                self.limiter.release()
+                raise
+            self.limiter.release() # Don't hold the slot during the backoff.
+
+            if attempt == self.max_retries:
+                self._record_failure()
+                raise error
+
+            delay = self._backoff_delay(attempt, response)
+            self.stats.record_retry()
+            metrics.inc("sims_llm_retries_total", provider=self.name)
+            logging.warning("%s request failed (%s); retry %d/%d in %.2fs",
+                            self.name, error, attempt + 1, self.max_retries, delay)
+            time.sleep(delay)
+
+    def _record_success(self, start: float) -> None:
+        elapsed = time.perf_counter() - start
+        self.stats.record(elapsed)
+        metrics.observe(metrics.STAGE_METRIC, elapsed, stage="llm_request")
+
+    def _record_failure(self) -> None:
+        self.stats.record_failure()
+        metrics.inc("sims_llm_failures_total", provider=self.name)
+
+    def post_json(self, path: str, payload: dict, read_timeout: Optional[float] = None) -> dict:
+        """POSTs a JSON payload and returns the decoded JSON response.
+
+        Raises:
+            requests.exceptions.RequestException: If the request still fails
+                after all retries, or fails with a non-retryable status.
+        """
+        start = time.perf_counter()
+        response = self._send(path, payload, read_timeout=read_timeout)
+        try:
+            result = response.json()
+        except ValueError:
+            self._record_failure()
+            raise
+        finally:
+            self.limiter.release()
+        self._record_success(start)
+        return result
+
+    def chat_completion(self, payload: dict, read_timeout: Optional[float] = None) -> dict:
+        """Sends an OpenAI-style `/chat/completions` request."""
+        return self.post_json("/chat/completions", payload, read_timeout)
+
+    def stream_chat_completion(self, payload: dict, read_timeout: Optional[float] = None) -> ChatStream:
+        """Sends a streaming `/chat/completions` request.
+
+        The request (including retries) is made before this returns; iterate
+        the returned `ChatStream` for the content deltas and close it when
+        done.
+
+        Raises:
+            requests.exceptions.RequestException: If the request fails; while
+                iterating, if the stream breaks off or reports an error.
+        """
+        start = time.perf_counter()
+        response = self._send("/chat/completions", {**payload, "stream": True}, stream=True,
+                              read_timeout=read_timeout)
+        return ChatStream(self, response, start)
+
+    def warm_up(self) -> None:
+        """Opens a pooled connection ahead of the first request (`GET /models`).
+
+        Errors are ignored; the first real request connects (and reports
+        errors) as usual.
+        """
+        try:
+            self.session.get(f"{self.base_url}/models", timeout=self.timeout).close()
+        except requests.exceptions.RequestException as e:
+            logging.debug("Warm-up request to '%s' failed: %s", self.name, e)
+
+    def close(self) -> None:
+        """Closes the pooled connections."""
+        self.session.close()
+
+
+_clients: dict[str, LLMClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(provider: str = settings.LLM_PROVIDER, base_url: Optional[str] = None) -> LLMClient:
+    """Returns the shared client for a provider, creating it on first use.
+
+    Args:
+        provider: "lmstudio" or "openrouter".
+        base_url: API base URL overriding the provider's configured one, e.g.
+                  a second LM Studio server. Gets a client of its own.
+
+    Raises:
+        ValueError: If the provider is unknown.
+    """
+    key = provider if base_url is None else f"{provider}@{base_url}"
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            if provider == "lmstudio":
+                # No specific headers usually needed for local lmstudio
+                client = LLMClient(key, base_url or settings.LMSTUDIO_API_BASE)
+            elif provider == "openrouter":
+                client = LLMClient(key, base_url or settings.OPENROUTER_API_BASE, headers={
+                    "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
+                    "Content-Type": "application/json",
+                })
+            else:
+                raise ValueError(f"Invalid LLM provider: {provider}")
+            _clients[key] = client
+        return client
+
+
+def provider_stats() -> dict[str, dict]:
+    """Returns latency statistics for every provider used so far."""
+    with _clients_lock:
+        return {name: {**client.stats.summary(), "queued": client.limiter.queued}
+                for name, client in _clients.items()}
@@ -0,0 +1,320 @@
+"""
+LLM Dispatcher Module.
+
+Races one request across several LLM backends (`LLM_BACKENDS`) to cut tail
+latency without always paying for two requests:
+
+* The request goes to the first healthy backend. If it has not answered after
+  the hedge delay (a percentile of that backend's recent latencies), the same
+  request is also sent to the next backend. If a backend fails or returns an
+  invalid answer and no other request is in flight, the next backend is
+  tried at once.
+* The first valid answer wins. The other attempts are told to stop: streamed
+  requests close their connection, non-streamed ones finish in the background
+  and their answer is dropped.
+* Each backend has a circuit breaker. After `LLM_BREAKER_FAILURES`
+  consecutive failures it is skipped for `LLM_BREAKER_COOLDOWN` seconds, then
+  a single probe request decides whether it is used again.
+* Each backend's read timeout adapts to its own latency (a multiple of its
+  p99), so a stalled server is given up on long before `LLM_READ_TIMEOUT`.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from sims_gba_ai.config import settings
+from sims_gba_ai.core import metrics
+from sims_gba_ai.core.llm_client import LLMClient, LatencyStats, get_client
+
+# Runs one request on one backend: (client, payload, read_timeout, cancel) -> answer.
+# Implementations should stop early once `cancel` is set, where they can.
+Attempt = Callable[[LLMClient, dict, float, threading.Event], Any]
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one backend.
+
+    Args:
+        failure_threshold: Consecutive failures that open the circuit.
+        cooldown: Seconds the circuit stays open before a probe is allowed.
+    """
+
+    def __init__(self, failure_threshold: int = settings.LLM_BREAKER_FAILURES,
+                 cooldown: float = settings.LLM_BREAKER_COOLDOWN) -> None:
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """"closed" (healthy), "open" (skipped) or "half-open" (probe allowed)."""
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return "open"
+            return "half-open"
+
+    def allow(self) -> bool:
+        """Returns True if a request may be sent; claims the probe when half-open."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> bool:
+        """Records a failure. Returns True if this opened the circuit."""
+        with self._lock:
+            self.failures += 1
+            was_open = self.opened_at is not None
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+            return not was_open and self.opened_at is not None
+
+    def release(self) -> None:
+        """Gives up a claimed probe without a verdict (e.g. the attempt was cancelled)."""
+        with self._lock:
+            self._probing = False
+
+
+@dataclass
+class Backend:
+    """One LLM backend of the dispatcher.
+
+    Attributes:
+        name: Name used in logs and metrics.
+        provider: "lmstudio" or "openrouter".
+        model: Model sent in the payload, or None to keep the payload's model.
+        base_url: API base URL overriding the provider's, or None.
+    """
+    name: str
+    provider: str
+    model: Optional[str] = None
+    base_url: Optional[str] = None
+
+    def __post_init__(self) -> None:
+        self.breaker = CircuitBreaker()
+        # Latencies of valid answers, used for the hedge delay and timeout.
+        self.latency = LatencyStats(window=200)
+
+    @property
+    def client(self) -> LLMClient:
+        return get_client(self.provider, self.base_url)
+
+    def payload_for(self, payload: dict) -> dict:
+        return {**payload, "model": self.model} if self.model else payload
+
+    def read_timeout(self) -> float:
+        """Adaptive read timeout: a multiple of the p99 latency, within limits."""
+        if self.latency.requests < settings.LLM_HEDGE_MIN_SAMPLES:
+            return settings.LLM_READ_TIMEOUT
+        p99 = self.latency.percentile(99)
+        return min(settings.LLM_READ_TIMEOUT, max(settings.LLM_TIMEOUT_MIN, settings.LLM_TIMEOUT_FACTOR * p99))
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for this backend before hedging to the next one."""
+        if self.latency.requests < settings.LLM_HEDGE_MIN_SAMPLES:
+            return settings.LLM_HEDGE_INITIAL_DELAY
+        return max(settings.LLM_HEDGE_MIN_DELAY, self.latency.percentile(settings.LLM_HEDGE_PERCENTILE))
+
+
+@dataclass
+class DispatchResult:
+    """Outcome of `LLMDispatcher.dispatch`.
+
+    Attributes:
+        answer: The winning answer, or the last invalid answer if no backend
+                gave a valid one.
+        valid: True if `answer` passed validation.
+        backend: Name of the backend that produced `answer`.
+        attempts: Number of backends the request was sent to.
+        hedged: True if a hedged request was sent because of the delay.
+    """
+    answer: Any
+    valid: bool
+    backend: Optional[str]
+    attempts: int
+    hedged: bool
+
+
+class LLMDispatcher:
+    """Sends requests to several backends with hedging and circuit breakers.
+
+    Args:
+        backends: Backends in order of preference.
+    """
+
+    def __init__(self, backends: list[Backend]) -> None:
+        if not backends:
+            raise ValueError("LLMDispatcher needs at least one backend")
+        self.backends = backends
+
+    def _candidates(self) -> list[Backend]:
+        """Backends that may be used now, in order. Falls back to all if every circuit is open."""
+        allowed = [backend for backend in self.backends if backend.breaker.allow()]
+        return allowed or list(self.backends)
+
+    def _run(self, future: Future, started: threading.Event, backend: Backend, attempt: Attempt,
+             payload: dict, cancel: threading.Event) -> None:
+        """Runs one attempt and sets `future` to `(answer, latency)` or its error."""
+        future.set_running_or_notify_cancel()
+        started.set()
+        start = time.perf_counter()
+        try:
+            answer = attempt(backend.client, backend.payload_for(payload), backend.read_timeout(), cancel)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result((answer, time.perf_counter() - start))
+
+    def _launch(self, backend: Backend, attempt: Attempt, payload: dict,
+                cancel: threading.Event) -> tuple[Future, threading.Event]:
+        """Starts an attempt on its own thread. Returns its future and an event set once it runs.
+
+        A thread per attempt rather than a shared pool: the dispatcher is shared
+        by every agent, and cancelled non-streaming losers keep running, so a
+        bounded pool would queue attempts behind other agents' requests.
+        """
+        future: Future = Future()
+        started = threading.Event()
+        threading.Thread(target=self._run, args=(future, started, backend, attempt, payload, cancel),
+                         name=f"LLMDispatch-{backend.name}", daemon=True).start()
+        return future, started
+
+    def dispatch(self, payload: dict, attempt: Attempt, valid: Callable[[Any], bool]) -> DispatchResult:
+        """Runs `attempt` on the backends until one returns a valid answer.
+
+        Args:
+            payload: The chat payload; each backend may replace its model.
+            attempt: Sends the request on one backend and returns its answer.
+            valid: Returns True for an acceptable answer.
+
+        Raises:
+            Exception: The last backend error, if every attempt failed.
+        """
+        queue = self._candidates()
+        cancel = threading.Event()
+        running: dict[Future, Backend] = {}
+        attempts = 0
+        hedged = False
+        last_answer: Any = None
+        last_backend: Optional[str] = None
+        last_error: Optional[BaseException] = None
+
+        def launch() -> tuple[Backend, threading.Event]:
+            nonlocal attempts, hedge_at
+            backend = queue.pop(0)
+            attempts += 1
+            future, started = self._launch(backend, attempt, payload, cancel)
+            running[future] = backend
+            hedge_at = None
+            return backend, started
+
+        hedge_at: Optional[float] = None
+        newest, newest_started = launch()
+        try:
+            while running:
+                timeout = None
+                if queue:
+                    if hedge_at is None:
+                        # The hedge delay counts from when the newest attempt runs, not when it was launched.
+                        newest_started.wait()
+                        hedge_at = time.monotonic() + newest.hedge_delay()
+                    timeout = max(0.0, hedge_at - time.monotonic())
+                done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    # The newest request is slow: hedge to the next backend.
+                    hedged = True
+                    metrics.inc("sims_llm_hedged_requests_total", backend=queue[0].name)
+                    logging.info("LLM backend '%s' slower than %.2fs; hedging to '%s'.",
+                                 newest.name, newest.hedge_delay(), queue[0].name)
+                    newest, newest_started = launch()
+                    continue
+
+                for future in done:
+                    backend = running.pop(future)
+                    try:
+                        answer, latency = future.result()
+                    except Exception as e:
+                        last_error = e
+                        if backend.breaker.record_failure():
+                            metrics.inc("sims_llm_circuit_opened_total", backend=backend.name)
+                            logging.warning("LLM backend '%s' failed %d times in a row; skipping it for %.0fs.",
+                                            backend.name, backend.breaker.failures, backend.breaker.cooldown)
+                        continue
+                    backend.breaker.record_success()
+                    if valid(answer):
+                        backend.latency.record(latency)
+                        metrics.inc("sims_llm_backend_wins_total", backend=backend.name)
+                        return DispatchResult(answer, True, backend.name, attempts, hedged)
+                    last_answer, last_backend = answer, backend.name
+
+                # Failed or invalid: move on to the next backend immediately.
+                if queue and not running:
+                    newest, newest_started = launch()
+        finally:
+            cancel.set()
+            # Unfinished and unsent attempts give back a half-open probe they claimed.
+            for backend in [*running.values(), *queue]:
+                backend.breaker.release()
+
+        if last_backend is None and last_error is not None:
+            raise last_error
+        return DispatchResult(last_answer, False, last_backend, attempts, hedged)
+
+    def stats(self) -> dict[str, dict]:
+        """Returns per-backend health and latency statistics."""
+        return {
+            backend.name: {
+                "state": backend.breaker.state,
+                "consecutive_failures": backend.breaker.failures,
+                "read_timeout": backend.read_timeout(),
+                "hedge_delay": backend.hedge_delay(),
+                **backend.latency.summary(),
+            }
+            for backend in self.backends
+        }
+
+
+def backends_from_settings(config: Optional[list[dict[str, str]]] = None) -> list[Backend]:
+    """Builds `Backend`s from the `LLM_BACKENDS` setting format."""
+    config = settings.LLM_BACKENDS if config is None else config
+    backends = []
+    for index, entry in enumerate(config):
+        provider = entry["provider"]
+        name = entry.get("name") or (f"{provider}:{entry['model']}" if entry.get("model") else provider)
+        if any(backend.name == name for backend in backends):
+            name = f"{name}#{index}"
+        backends.append(Backend(name, provider, entry.get("model"), entry.get("base_url")))
+    return backends
+
+
+_dispatcher: Optional[LLMDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> Optional[LLMDispatcher]:
+    """Returns the shared dispatcher, or None if `LLM_BACKENDS` is empty."""
+    global _dispatcher
+    if not settings.LLM_BACKENDS:
+        return None
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = LLMDispatcher(backends_from_settings())
+        return _dispatcher
@@ -1,11 +1,124 @@
 import requests
 import base64
+import contextlib
+import functools
 import io
-import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
 from PIL import Image
 
 # Import settings from the config file
 from sims_gba_ai.config import settings
+from sims_gba_ai.core import metrics
+from sims_gba_ai.core.action_plan import PlanStep, parse_plan, describe_plan
+from sims_gba_ai.core.button_matcher import ButtonMatcher
+from sims_gba_ai.core.frame_history import StuckContext
+from sims_gba_ai.core.image_encoding import EncodedImage, encode_image
+from sims_gba_ai.core.llm_client import LatencyStats, LLMClient, get_client
+from sims_gba_ai.core.llm_dispatcher import get_dispatcher
+
+@dataclass
+class LLMExchange:
+    """The prompt, raw response text and latency (seconds) of one LLM request.
+
+    Streamed requests also record the time to the first content token and
+    the time until a button was recognized (None if none was), measured from
+    the start of the request that produced the answer. `backend` names the
+    winning backend when requests are raced across `LLM_BACKENDS`. `path` is
+    "vision" for requests with the screenshot and "text" for text-first
+    requests built from OCR text.
+    """
+    prompt: str
+    response_text: str | None
+    latency: float
+    first_token_latency: float | None = None
+    decision_latency: float | None = None
+    backend: str | None = None
+    path: str = "vision"
+
+    def stage_latencies(self) -> dict[str, float]:
+        """Returns the latencies in the `latencies` format of the session recorder."""
+        if self.path == "text":
+            return {"llm_text": self.latency}
+        latencies = {"llm": self.latency}
+        if self.first_token_latency is not None:
+            latencies["llm_ttft"] = self.first_token_latency
+        if self.decision_latency is not None:
+            latencies["llm_decision"] = self.decision_latency
+        return latencies
+
+# Last exchange per thread, so callers (e.g. the session recorder) can log it.
+_exchange_state = threading.local()
+
+# Latencies and token counts (from the responses' `usage`) per request path.
+_path_stats: dict[str, LatencyStats] = {"text": LatencyStats(), "vision": LatencyStats()}
+_path_tokens: dict[str, dict[str, int]] = {"text": {"prompt": 0, "completion": 0},
+                                          "vision": {"prompt": 0, "completion": 0}}
+_path_tokens_lock = threading.Lock()
+
+# Event that abandons the calling thread's streamed requests once set (see `cancellable`).
+_cancel_state = threading.local()
+
+@contextlib.contextmanager
+def cancellable(event: threading.Event):
+    """
+    Lets `event` cancel the LLM requests made on the calling thread inside the
+    block, e.g. a speculative request whose frame turned out to be outdated.
+    Streamed requests stop reading as soon as the event is set; non-streaming
+    requests cannot be interrupted and run to completion.
+    """
+    previous = getattr(_cancel_state, "event", None)
+    _cancel_state.event = event
+    try:
+        yield event
+    finally:
+        _cancel_state.event = previous
+
+def get_last_exchange() -> LLMExchange | None:
+    """Returns the most recent LLM exchange made on the calling thread, or None."""
+    return getattr(_exchange_state, "exchange", None)
+
+def _record_exchange(exchange: LLMExchange) -> None:
+    """Makes `exchange` the calling thread's last exchange and counts it in its path's statistics."""
+    _exchange_state.exchange = exchange
+    if exchange.response_text is None:
+        _path_stats[exchange.path].record_failure()
+    else:
+        _path_stats[exchange.path].record(exchange.latency)
+
+def _payload_path(payload: dict) -> str:
+    """Returns "vision" if the payload carries an image, else "text"."""
+    for message in payload.get("messages", []):
+        content = message.get("content")
+        if not isinstance(content, str) and any(item.get("type") == "image_url" for item in content or []):
+            return "vision"
+    return "text"
+
+def _count_usage(payload: dict, response_json: dict) -> None:
+    """Adds the token counts a response reports in `usage` to its path's totals."""
+    usage = response_json.get("usage") or {}
+    path = _payload_path(payload)
+    for kind in ("prompt", "completion"):
+        count = usage.get(f"{kind}_tokens")
+        if count:
+            with _path_tokens_lock:
+                _path_tokens[path][kind] += count
+            metrics.inc("sims_llm_tokens_total", count, path=path, kind=kind)
+
+def path_stats() -> dict[str, dict]:
+    """Returns latency statistics and token totals of the text-first and vision request paths.
+
+    Tokens are counted as reported by the server; streamed answers report none.
+    """
+    with _path_tokens_lock:
+        tokens = {path: dict(counts) for path, counts in _path_tokens.items()}
+    return {
+        path: {**stats.summary(), "prompt_tokens": tokens[path]["prompt"],
+               "completion_tokens": tokens[path]["completion"]}
+        for path, stats in _path_stats.items()
+    }
 
 def image_to_base64(image: Image.Image) -> str:
     """Converts a PIL Image object to a base64 encoded string."""
@@ -14,106 +127,411 @@ def image_to_base64(image: Image.Image) -> str:
     img_str = base64.b64encode(buffered.getvalue()).decode('utf-8')
     return img_str
 
-def get_llm_suggestion(image: Image.Image) -> str | None:
+def _build_vision_payload(image: Image.Image, prompt: str, max_tokens: int,
+                          encoded: EncodedImage | None = None) -> dict | None:
+    """
+    Encodes the image (unless `encoded` already holds it) and builds an
+    OpenAI-compatible chat payload for the configured provider. Returns None
+    if the provider is invalid.
+    """
+    # Check the provider first: an invalid one should not cost an encode.
+    if settings.LLM_PROVIDER == "lmstudio":
+        model = "loaded-model" # lmstudio uses the model loaded in the UI
+    elif settings.LLM_PROVIDER == "openrouter":
+        model = settings.LLM_MODEL
+    else:
+        print(f"Error: Invalid LLM_PROVIDER configured: {settings.LLM_PROVIDER}")
+        return None
+
+    encoded_image = encoded or encode_image(image)
+    logging.debug(
+        "LLM image payload: %dx%d %s, %d bytes base64, encoded in %.1f ms",
+        encoded_image.size[0], encoded_image.size[1], encoded_image.mime_type,
+        encoded_image.payload_bytes, encoded_image.encode_ms,
+    )
+
+    # Both providers use the OpenAI compatible API structure
+    return {
+        "model": model,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": encoded_image.data_url
+                        }
+                    }
+                ]
+            }
+        ],
+        "max_tokens": max_tokens # Limit response length
+    }
+
+def _request_completion_text(payload: dict, prompt: str, valid=None) -> str | None:
+    """
+    Sends a chat payload to the configured provider and returns the stripped
+    message content, or None if the request fails or the response is malformed.
+    With `LLM_BACKENDS` configured the request is raced across the backends
+    and `valid(content)` decides which answers count. The exchange is
+    recorded for `get_last_exchange`.
+    """
+    start = time.perf_counter()
+    content = backend = None
+    try:
+        content, backend = _send_completion(payload, valid)
+        return content
+    finally:
+        _record_exchange(LLMExchange(prompt, content, time.perf_counter() - start, backend=backend))
+
+def _describe_payload(payload: dict) -> str:
+    """Summarizes a chat payload for debug logs without the base64 image data."""
+    parts = []
+    for message in payload.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            parts.append(f"{message.get('role')}: {content!r}")
+            continue
+        for item in content or []:
+            if item.get("type") == "text":
+                parts.append(f"{message.get('role')}: {item['text']!r}")
+            elif item.get("type") == "image_url":
+                parts.append(f"<image {len(item['image_url']['url'])} chars>")
+    return f"model={payload.get('model')} max_tokens={payload.get('max_tokens')} " + " | ".join(parts)
+
+def _completion_content(client: LLMClient, payload: dict, read_timeout: float | None = None,
+                        cancel: threading.Event | None = None) -> str:
+    """
+    Sends a non-streaming request on `client` and returns the stripped message
+    content. `cancel` is accepted for the dispatcher but cannot interrupt a
+    request that is already waiting for its response.
+
+    Raises:
+        requests.exceptions.RequestException: If the request fails.
+        ValueError: If the response has no message content.
+    """
+    # Pooled keep-alive client with timeouts and retry/backoff on 429/5xx.
+    response_json = client.chat_completion(payload, read_timeout)
+    _count_usage(payload, response_json)
+
+    # Extract content - structure might vary slightly, adjust if needed
+    if 'choices' in response_json and len(response_json['choices']) > 0:
+        message = response_json['choices'][0].get('message', {})
+        return (message.get('content') or '').strip()
+    metrics.inc("sims_llm_invalid_responses_total", kind="format")
+    raise ValueError(f"Unexpected response format from LLM: {response_json}")
+
+def _send_completion(payload: dict, valid=None) -> tuple[str | None, str | None]:
+    """Performs the request for `_request_completion_text`. Returns `(content, backend)`."""
+    try:
+        # Never dump the whole payload: it holds the base64 image. The summary
+        # is only built when debug logging is enabled.
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("LLM request: %s", _describe_payload(payload))
+        dispatcher = get_dispatcher()
+        if dispatcher is None:
+            return _completion_content(get_client(settings.LLM_PROVIDER), payload), None
+        result = dispatcher.dispatch(payload, _completion_content, valid or bool)
+        return result.answer, result.backend
+
+    except requests.exceptions.RequestException as e:
+        print(f"Error sending request to LLM API: {e}")
+        return None, None
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None, None
+    except Exception as e:
+        print(f"An unexpected error occurred during LLM interaction: {e}")
+        return None, None
+
+@dataclass
+class _StreamedSuggestion:
+    """Result of one streamed suggestion request; latencies are from its start.
+
+    `cancelled` is True if the caller abandoned the request (see
+    `cancellable`) before a button was recognized: `text` is then a partial
+    answer, not a bad one.
+    """
+    button: str | None
+    text: str
+    first_token: float | None
+    decided: float | None
+    cancelled: bool = False
+
+def _stream_attempt(client: LLMClient, payload: dict, read_timeout: float | None = None,
+                    cancel: threading.Event | None = None,
+                    abandon: threading.Event | None = None) -> _StreamedSuggestion:
+    """
+    Streams a suggestion from `client` and stops reading at the first
+    recognized button, or as soon as `cancel` (set by the dispatcher) or
+    `abandon` (set by the caller, see `cancellable`) is set.
+
+    Raises:
+        requests.exceptions.RequestException: If the request or stream fails.
+    """
+    start = time.perf_counter()
+    matcher = ButtonMatcher(settings.VALID_GBA_BUTTONS)
+    first_token = decided = None
+    stream = client.stream_chat_completion(payload, read_timeout)
+    try:
+        for delta in stream:
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            if matcher.feed(delta) or any(event is not None and event.is_set() for event in (cancel, abandon)):
+                break
+        else:
+            matcher.finish()
+    finally:
+        stream.close() # Stops the server generating the rest of the answer.
+    if matcher.button:
+        decided = time.perf_counter() - start
+    cancelled = matcher.button is None and abandon is not None and abandon.is_set()
+    return _StreamedSuggestion(matcher.button, matcher.text.strip(), first_token, decided, cancelled)
+
+def _stream_button(payload: dict, prompt: str) -> _StreamedSuggestion | None:
+    """
+    Streams a suggestion and stops reading at the first recognized button.
+
+    Returns:
+        The streamed suggestion (its `button` is None if the response named
+        no valid button), or None if the request failed. Cancelled requests
+        are not recorded as an exchange.
+    """
+    start = time.perf_counter()
+    result = backend = None
+    try:
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("LLM streaming request: %s", _describe_payload(payload))
+        # Attempts may run on dispatcher threads, so the caller's cancel event is passed along.
+        abandon = getattr(_cancel_state, "event", None)
+        attempt = functools.partial(_stream_attempt, abandon=abandon)
+        dispatcher = get_dispatcher()
+        if dispatcher is None:
+            result = attempt(get_client(settings.LLM_PROVIDER), payload)
+        else:
+            # An abandoned answer is accepted as is, so no other backend is tried for it.
+            dispatched = dispatcher.dispatch(
+                payload, attempt, lambda answer: answer.button is not None or answer.cancelled)
+            result, backend = dispatched.answer, dispatched.backend
+        if result.cancelled:
+            return result
+        if result.first_token is not None:
+            metrics.observe(metrics.STAGE_METRIC, result.first_token, stage="llm_first_token")
+        if result.decided is not None:
+            metrics.observe(metrics.STAGE_METRIC, result.decided, stage="llm_decision")
+        return result
+    except requests.exceptions.RequestException as e:
+        print(f"Error sending request to LLM API: {e}")
+        return None
+    except Exception as e:
+        print(f"An unexpected error occurred during LLM interaction: {e}")
+        return None
+    finally:
+        if not (result and result.cancelled):
+            _record_exchange(LLMExchange(
+            prompt, result.text if result else None, time.perf_counter() - start,
+            result.first_token if result else None, result.decided if result else None, backend))
+
+def _clean_button(text: str) -> str:
+    """Strips quotes and whitespace around a single-button answer."""
+    return text.replace('"', '').replace("'", "").strip()
+
+def get_llm_suggestion(image: Image.Image, encoded: EncodedImage | None = None,
+                       stuck: StuckContext | None = None) -> str | None:
     """
     Sends the captured screen image to the configured LLM API
     and returns a single suggested GBA button press based on the response.
 
+    With `LLM_STREAMING` enabled the response is streamed and the request is
+    closed as soon as a button is recognized (case-insensitively) in it.
+
     Args:
         image: A PIL.Image object of the screen capture.
+        encoded: The image already encoded (e.g. by a frame worker), or None.
+        stuck: If the agent is stuck, the recent frames and inputs; the
+               request then sends their montage instead of `image`.
 
     Returns:
         A string representing a valid GBA button ("Up", "Down", "Left", "Right", "A", "B")
         if the LLM provides a valid suggestion, otherwise None.
     """
-    base64_image = image_to_base64(image)
     prompt = f"Look at this screenshot from The Sims 2 GBA. Based *only* on what you see, suggest *one single button* to press next from this list: {', '.join(settings.VALID_GBA_BUTTONS)}."
+    if stuck is not None:
+        prompt, encoded = stuck.build(prompt)
 
-    headers = {}
-    payload = {}
-    api_url = ""
+    max_tokens = settings.LLM_STREAM_MAX_TOKENS if settings.LLM_STREAMING else 10
+    payload = _build_vision_payload(image, prompt, max_tokens=max_tokens, encoded=encoded)
+    if payload is None:
+        return None
 
-    if settings.LLM_PROVIDER == "lmstudio":
-        api_url = f"{settings.LMSTUDIO_API_BASE}/chat/completions"
-        # lmstudio uses OpenAI compatible API structure
-        payload = {
-            "model": "loaded-model", # lmstudio uses the model loaded in the UI
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/png;base64,{base64_image}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            "max_tokens": 10 # Limit response length
-        }
-        # No specific headers usually needed for local lmstudio
+    if settings.LLM_STREAMING:
+        result = _stream_button(payload, prompt)
+        if result is None or result.cancelled:
+            return None
+        if result.button:
+            exchange = get_last_exchange()
+            logging.info("LLM Suggestion: %s%s (first token after %.0f ms, decided after %.0f ms)",
+                         result.button, f" via {exchange.backend}" if exchange.backend else "",
+                         exchange.first_token_latency * 1000, exchange.decision_latency * 1000)
+            return result.button
+        metrics.inc("sims_llm_invalid_responses_total", kind="button")
+        logging.warning("LLM Response ('%s') does not name a valid button.", result.text)
+        return None
 
-    elif settings.LLM_PROVIDER == "openrouter":
-        api_url = f"{settings.OPENROUTER_API_BASE}/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "model": settings.LLM_MODEL,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/png;base64,{base64_image}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            "max_tokens": 10 # Limit response length
-        }
+    suggestion_text = _request_completion_text(
+        payload, prompt, valid=lambda text: _clean_button(text) in settings.VALID_GBA_BUTTONS)
+    if suggestion_text is None:
+        return None
+
+    # Clean up potential extra formatting
+    suggestion_text = _clean_button(suggestion_text)
+
+    # Validate against the allowed buttons
+    if suggestion_text in settings.VALID_GBA_BUTTONS:
+        logging.info("LLM Suggestion: %s", suggestion_text)
+        return suggestion_text
     else:
-        print(f"Error: Invalid LLM_PROVIDER configured: {settings.LLM_PROVIDER}")
+        metrics.inc("sims_llm_invalid_responses_total", kind="button")
+        logging.warning("LLM Response ('%s') not a valid button.", suggestion_text)
         return None
 
+def get_llm_plan(image: Image.Image, encoded: EncodedImage | None = None,
+                 stuck: StuckContext | None = None) -> list[PlanStep] | None:
+    """
+    Asks the LLM for a short sequence of button presses for the current screen.
+
+    The model answers with a JSON list of steps; each step names a button and
+    may give a repeat count or a hold duration. The plan is validated with
+    `parse_plan` before it is returned.
+
+    Args:
+        image: A PIL.Image object of the screen capture.
+        encoded: The image already encoded (e.g. by a frame worker), or None.
+        stuck: If the agent is stuck, the recent frames and inputs; the
+               request then sends their montage instead of `image`.
+
+    Returns:
+        A list of `PlanStep` objects, or None if the response holds no valid plan.
+    """
+    prompt = (
+        "Look at this screenshot from The Sims 2 GBA. Based *only* on what you see, plan the next "
+        f"few button presses (at most {settings.PLAN_MAX_STEPS} steps). Valid buttons: "
+        f"{', '.join(settings.VALID_GBA_BUTTONS)}. Answer with a JSON list only, for example "
+        '[{"button": "Right", "repeat": 3}, {"button": "A"}]. '
+        f'Use "repeat" (1-{settings.PLAN_MAX_REPEAT}) to press a button several times and '
+        f'"hold" (seconds, up to {settings.PLAN_MAX_HOLD}) to hold it down.'
+    )
+    if stuck is not None:
+        prompt, encoded = stuck.build(prompt)
+
+    payload = _build_vision_payload(image, prompt, max_tokens=settings.PLAN_MAX_TOKENS, encoded=encoded)
+    if payload is None:
+        return None
+
+    plan_text = _request_completion_text(payload, prompt, valid=lambda text: parse_plan(text) is not None)
+    if plan_text is None:
+        return None
+
+    plan = parse_plan(plan_text)
+    if plan is None:
+        metrics.inc("sims_llm_invalid_responses_total", kind="plan")
+        logging.warning("LLM Response ('%s') is not a valid plan.", plan_text)
+        return None
+    logging.info("LLM Plan: %s", describe_plan(plan))
+    return plan
+
+def _build_text_payload(prompt: str, max_tokens: int) -> dict:
+    """Builds a text-only chat payload for the text-first model."""
+    provider = settings.TEXT_LLM_PROVIDER or settings.LLM_PROVIDER
+    model = settings.TEXT_LLM_MODEL or ("loaded-model" if provider == "lmstudio" else settings.LLM_MODEL)
+    return {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": max_tokens,
+    }
+
+def _request_text_completion(payload: dict, prompt: str) -> str | None:
+    """
+    Sends a text-first request to the text model and returns the stripped
+    message content, or None if the request fails. The request goes to one
+    client, not the `LLM_BACKENDS` race, which is set up for vision models.
+    """
+    start = time.perf_counter()
+    content = None
     try:
-        print(f"LLM Input Payload: {json.dumps(payload, indent=2)}") # DEBUG
-        response = requests.post(api_url, headers=headers, json=payload, timeout=30) # Added timeout
-        response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
-
-        response_json = response.json()
-
-        # Extract content - structure might vary slightly, adjust if needed
-        if 'choices' in response_json and len(response_json['choices']) > 0:
-            message = response_json['choices'][0].get('message', {})
-            suggestion_text = message.get('content', '').strip()
-
-            # Clean up potential extra formatting
-            suggestion_text = suggestion_text.replace('"', '').replace("'", "").strip()
-
-            # Validate against the allowed buttons
-            if suggestion_text in settings.VALID_GBA_BUTTONS:
-                print(f"LLM Output Suggestion: {suggestion_text}") # DEBUG
-                print(f"LLM Suggestion: {suggestion_text}") # Original print
-                return suggestion_text
-            else:
-                print(f"LLM Response ('{suggestion_text}') not a valid button.")
-                return None
-        else:
-            print(f"Error: Unexpected response format from LLM: {response_json}")
-            return None
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("Text LLM request: %s", _describe_payload(payload))
+        client = get_client(settings.TEXT_LLM_PROVIDER or settings.LLM_PROVIDER, settings.TEXT_LLM_BASE_URL)
+        content = _completion_content(client, payload)
+        return content
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logging.warning("Error sending text-first request to LLM API: %s", e)
+        return None
+    finally:
+        _record_exchange(LLMExchange(prompt, content, time.perf_counter() - start, path="text"))
 
-    except requests.exceptions.RequestException as e:
-        print(f"Error sending request to LLM API: {e}")
+def _text_context(screen_text: str, state: str) -> str:
+    """The part of a text-first prompt that describes the screen."""
+    return (
+        "You are playing The Sims 2 on the Game Boy Advance. You cannot see the screen; "
+        f"this is what is known about it.\n{state}\nText on screen (region: text):\n{screen_text}\n"
+    )
+
+def get_text_suggestion(screen_text: str, state: str) -> str | None:
+    """
+    Asks the text model for a single button, from the screen's OCR text
+    instead of a screenshot.
+
+    Args:
+        screen_text: OCR text of the screen, one "region: text" line per region.
+        state: A short summary of the game state (see `DecisionMaker`).
+
+    Returns:
+        A valid GBA button, or None if the request failed or the answer names
+        no button (the caller then asks the vision model).
+    """
+    prompt = (
+        _text_context(screen_text, state)
+        + f"Suggest *one single button* to press next from this list: {', '.join(settings.VALID_GBA_BUTTONS)}. "
+        "Answer with the button name only."
+    )
+    answer = _request_text_completion(_build_text_payload(prompt, settings.TEXT_LLM_MAX_TOKENS), prompt)
+    if answer is None:
         return None
-    except Exception as e:
-        print(f"An unexpected error occurred during LLM interaction: {e}")
-        return None
\ No newline at end of file
+    matcher = ButtonMatcher(settings.VALID_GBA_BUTTONS)
+    matcher.feed(answer)
+    matcher.finish()
+    if matcher.button is None:
+        metrics.inc("sims_llm_invalid_responses_total", kind="text_button")
+        logging.warning("Text LLM Response ('%s') does not name a valid button.", answer)
+        return None
+    logging.info("Text LLM Suggestion: %s (%.0f ms)", matcher.button, get_last_exchange().latency * 1000)
+    return matcher.button
+
+def get_text_plan(screen_text: str, state: str) -> list[PlanStep] | None:
+    """
+    Asks the text model for a short button plan, from the screen's OCR text
+    instead of a screenshot.
+
+    Returns:
+        A list of `PlanStep` objects, or None if the request failed or the
+        answer holds no valid plan.
+    """
+    prompt = (
+        _text_context(screen_text, state)
+        + f"Plan the next few button presses (at most {settings.PLAN_MAX_STEPS} steps). Valid buttons: "
+        f"{', '.join(settings.VALID_GBA_BUTTONS)}. Answer with a JSON list only, for example "
+        '[{"button": "Right", "repeat": 3}, {"button": "A"}].'
+    )
+    plan_text = _request_text_completion(_build_text_payload(prompt, settings.PLAN_MAX_TOKENS), prompt)
+    if plan_text is None:
+        return None
+    plan = parse_plan(plan_text)
+    if plan is None:
+        metrics.inc("sims_llm_invalid_responses_total", kind="text_plan")
+        logging.warning("Text LLM Response ('%s') is not a valid plan.", plan_text)
+        return None
+    logging.info("Text LLM Plan: %s", describe_plan(plan))
+    return plan
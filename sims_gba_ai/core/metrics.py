@@ -0,0 +1,368 @@
+"""
+Metrics Module.
+
+A small, dependency-free instrumentation layer for the agent's hot path:
+
+* `span(stage)` times a block (capture, OCR, encoding, LLM request, input,
+  waits) and records it in the `sims_stage_seconds` histogram.
+* `inc(name, **labels)` increments a counter (cache hits, retries, invalid
+  LLM responses, ...).
+* `observe(name, value, **labels)` adds a sample to a histogram.
+
+Everything is kept in a `MetricsRegistry`, which renders the Prometheus text
+exposition format (served by `MetricsServer` at `/metrics`) or a JSON
+snapshot with p50/p95/p99 per histogram (written periodically by
+`MetricsDumper`). Recording is a dictionary lookup and a few additions under a
+lock, so it is cheap enough to call on every frame.
+"""
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from sims_gba_ai.config.settings import METRICS_ENABLED, METRICS_DUMP_INTERVAL
+
+# Histogram recording the duration of every `span`, labelled by stage.
+STAGE_METRIC = "sims_stage_seconds"
+
+# Default histogram bucket upper bounds in seconds (Prometheus convention).
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+def _label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join(f'{name}="{value}"' for name, value in pairs)
+    return "{" + body + "}"
+
+
+def _quantile(ordered: list[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Histogram:
+    """Cumulative bucket counts plus a window of recent samples for quantiles.
+
+    Args:
+        buckets: Ascending bucket upper bounds; +Inf is implicit.
+        window: Number of recent samples kept for p50/p95/p99.
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count", "recent")
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS, window: int = 1024) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent: deque[float] = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def summary(self) -> dict:
+        ordered = sorted(self.recent)
+        result = {"count": self.count, "sum": self.sum,
+                  "mean": self.sum / self.count if self.count else 0.0}
+        if ordered:
+            result.update(p50=_quantile(ordered, 0.5), p95=_quantile(ordered, 0.95),
+                          p99=_quantile(ordered, 0.99), max=ordered[-1])
+        return result
+
+
+class Span:
+    """Times a block and records the duration in the stage histogram.
+
+    Attributes:
+        duration: Elapsed seconds, available after the block exits.
+    """
+
+    __slots__ = ("registry", "stage", "start", "duration")
+
+    def __init__(self, registry: 'MetricsRegistry', stage: str) -> None:
+        self.registry = registry
+        self.stage = stage
+        self.start = 0.0
+        self.duration = 0.0
+
+    def __enter__(self) -> 'Span':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.duration = time.perf_counter() - self.start
+        self.registry.observe(STAGE_METRIC, self.duration, stage=self.stage)
+
+
+class MetricsRegistry:
+    """Thread-safe store of counters and histograms.
+
+    Args:
+        enabled: If False, recording calls return immediately (spans still
+                 measure their duration).
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self._counters: dict[str, dict[LabelKey, float]] = {}
+        self._histograms: dict[str, dict[LabelKey, Histogram]] = {}
+        self._help: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def describe(self, name: str, help_text: str) -> None:
+        """Sets the HELP text shown for a metric in the text format."""
+        self._help[name] = help_text
+
+    def inc(self, name: str, amount: float = 1.0, **labels) -> None:
+        """Increments a counter."""
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Adds a sample to a histogram."""
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def span(self, stage: str) -> Span:
+        """Returns a context manager timing one `stage`."""
+        return Span(self, stage)
+
+    def timed(self, stage: str) -> Callable:
+        """Decorator timing every call of a function as `stage`."""
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def counter_value(self, name: str, **labels) -> float:
+        """Returns the current value of a counter series (0 if unset)."""
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0.0)
+
+    def reset(self) -> None:
+        """Drops all recorded values."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> dict:
+        """Returns all metrics as a JSON-serializable dict."""
+        with self._lock:
+            return {
+                "timestamp": time.time(),
+                "uptime": time.time() - self.started,
+                "counters": {
+                    name: {_format_labels(key) or "total": value for key, value in series.items()}
+                    for name, series in self._counters.items()
+                },
+                "histograms": {
+                    name: {_format_labels(key) or "all": histogram.summary()
+                           for key, histogram in series.items()}
+                    for name, series in self._histograms.items()
+                },
+            }
+
+    def render_prometheus(self) -> str:
+        """Returns all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves a registry over HTTP: `/metrics` (Prometheus text) and `/metrics.json`.
+
+    Args:
+        registry: The registry to expose.
+        port: Port to listen on; 0 picks a free port.
+        host: Interface to bind. Defaults to localhost only.
+    """
+
+    def __init__(self, registry: MetricsRegistry, port: int, host: str = "127.0.0.1") -> None:
+        # http.server pulls in the email package; only load it when serving.
+        from http.server import ThreadingHTTPServer
+        self.registry = registry
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True)
+        self._thread.start()
+        logging.info("Serving metrics at %s", self.url)
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _make_handler(self) -> type:
+        from http.server import BaseHTTPRequestHandler
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                path = self.path.split("?", 1)[0].rstrip("/")
+                if path == "/metrics":
+                    body = registry.render_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body = json.dumps(registry.snapshot()).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass  # Scrapes would otherwise flood the console.
+
+        return Handler
+
+
+class MetricsDumper:
+    """Writes registry snapshots to a JSON file periodically (atomically replaced).
+
+    Args:
+        registry: The registry to dump.
+        path: Target JSON file.
+        interval: Seconds between dumps.
+    """
+
+    def __init__(self, registry: MetricsRegistry, path: str,
+                 interval: float = METRICS_DUMP_INTERVAL) -> None:
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def dump(self) -> None:
+        """Writes one snapshot now."""
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.registry.snapshot(), f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning("Could not write metrics to '%s': %s", self.path, e)
+
+    def start(self) -> None:
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="MetricsDumper", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the dump thread and writes a final snapshot."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.dump()
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.dump()
+
+
+REGISTRY = MetricsRegistry(enabled=METRICS_ENABLED)
+REGISTRY.describe(STAGE_METRIC, "Duration of agent hot-path stages in seconds "
+                                "(llm_first_token and llm_decision are measured from the start of a streamed request).")
+REGISTRY.describe("sims_decision_cache_lookups_total", "Decision cache lookups by result.")
+REGISTRY.describe("sims_llm_retries_total", "LLM HTTP requests retried after 429/5xx or connection errors.")
+REGISTRY.describe("sims_llm_failures_total", "LLM HTTP requests that failed after all retries.")
+REGISTRY.describe("sims_llm_invalid_responses_total", "LLM responses without a valid button or plan.")
+REGISTRY.describe("sims_capture_grab_failures_total", "Failed capture engine grabs.")
+REGISTRY.describe("sims_llm_hedged_requests_total", "Hedged LLM requests sent to a backend because an earlier one was slow.")
+REGISTRY.describe("sims_llm_backend_wins_total", "Valid LLM answers by the backend that answered first.")
+REGISTRY.describe("sims_llm_circuit_opened_total", "LLM backends skipped after repeated failures.")
+REGISTRY.describe("sims_frame_overruns_total", "Frame worker reads that failed because the shared frame was overwritten.")
+REGISTRY.describe("sims_frame_worker_fallbacks_total", "Frame analyses redone in the agent process after a worker task failed.")
+REGISTRY.describe("sims_llm_tokens_total", "LLM tokens reported by the server, by request path (text or vision) and kind.")
+REGISTRY.describe("sims_text_first_total", "Text-first decisions by result: answered, or why the vision model was asked.")
+REGISTRY.describe("sims_speculations_total", "Speculative LLM requests by outcome: hit, miss, unused, failed or skipped.")
+REGISTRY.describe("sims_stuck_detections_total", "Decisions made while the agent was stuck, by pattern: no_progress or cycle.")
+REGISTRY.describe("sims_stuck_request_tokens_total", "Estimated tokens (montage plus prompt) of requests made while stuck.")
+REGISTRY.describe("sims_window_geometry_refreshes_total", "Emulator window geometry refreshes by reason.")
+REGISTRY.describe("sims_window_refinds_total", "Emulator windows found again by title after they disappeared.")
+
+
+def span(stage: str) -> Span:
+    """Times a block as `stage` in the default registry."""
+    return Span(REGISTRY, stage)
+
+
+def inc(name: str, amount: float = 1.0, **labels) -> None:
+    """Increments a counter in the default registry."""
+    REGISTRY.inc(name, amount, **labels)
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Adds a histogram sample to the default registry."""
+    REGISTRY.observe(name, value, **labels)
+
+
+def timed(stage: str) -> Callable:
+    """Decorator timing a function as `stage` in the default registry."""
+    return REGISTRY.timed(stage)
@@ -4,60 +4,345 @@ Optical Character Recognition (OCR) Module.
 This module provides functionality to extract text from images using the
 Tesseract OCR engine via the pytesseract library. It reads the Tesseract
 executable path from the application settings.
+
+Rather than running Tesseract on the whole window at full resolution, the
+`OCRService` reads only the configured regions of interest (`OCR_REGIONS`,
+e.g. the dialog box and need meters). Each region is cut at native GBA
+resolution, binarized (GBA fonts use a couple of palette colours, so a global
+threshold separates them cleanly), upscaled with nearest-neighbour sampling
+and recognized with a region-specific page segmentation mode and character
+whitelist. Results are cached per region, keyed by a hash of the region's
+pixels, so an unchanged dialog box costs a crop and a hash. Uniform regions
+(e.g. no dialog on screen) are skipped without calling Tesseract.
+
+Recognition itself runs on a warm backend from `ocr_backend.py` (in-process
+`tesserocr` engines or a persistent worker-process pool), so Tesseract is not
+started again for every region. OpenCV, `pytesseract` and the backend are
+loaded on first use, so importing this module is cheap.
 """
-import pytesseract
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
 from PIL import Image
 import logging
-from sims_gba_ai.config.settings import TESSERACT_CMD_PATH # Import the setting
+from sims_gba_ai.config.settings import ( # Import the settings
+    OCR_REGIONS, OCR_UPSCALE, OCR_CACHE_SIZE,
+)
+from sims_gba_ai.core import metrics
+from sims_gba_ai.core.frame_transport import FrameView
+from sims_gba_ai.core.ocr_backend import OCRBackend, OCRTask, create_backend, tesserocr_available
+from sims_gba_ai.utils.image_utils import Frame, to_native
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# White border (in upscaled pixels) added around a region; Tesseract
+# recognizes glyphs touching the image edge poorly.
+_BORDER = 8
 
-# Set Tesseract command path from settings if provided
-if TESSERACT_CMD_PATH:
-    pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD_PATH
-    logging.info(f"Using Tesseract executable at: {TESSERACT_CMD_PATH}")
-# Removed old example line
 
-def extract_text_from_image(image: Image.Image) -> str:
+@dataclass(frozen=True)
+class OCRRegion:
+    """A screen region OCR runs on.
+
+    Attributes:
+        name: Region name, e.g. "dialog".
+        box: `(x, y, width, height)` at native resolution. None for the whole frame.
+        psm: Tesseract page segmentation mode.
+        whitelist: Characters Tesseract may output, or None for any.
+    """
+    name: str
+    box: Optional[tuple[int, int, int, int]] = None
+    psm: int = 6
+    whitelist: Optional[str] = None
+
+
+@dataclass
+class OCRResult:
+    """Recognized text of one region.
+
+    Attributes:
+        text: The recognized text (stripped).
+        confidence: Mean Tesseract word confidence (0-100); 100 for skipped
+                    blank regions, 0 if nothing was recognized.
+        cached: True if the result came from the region cache.
     """
-    Extracts text from a given PIL Image object using pytesseract.
+    text: str
+    confidence: float
+    cached: bool = False
+
+
+def regions_from_settings(config: dict[str, dict] = OCR_REGIONS) -> list[OCRRegion]:
+    """Builds `OCRRegion`s from the `OCR_REGIONS` setting format."""
+    return [
+        OCRRegion(name, tuple(entry["box"]) if entry.get("box") else None,
+                  entry.get("psm", 6), entry.get("whitelist"))
+        for name, entry in config.items()
+    ]
+
+
+def preprocess_region(native: np.ndarray, upscale: int = OCR_UPSCALE) -> Optional[np.ndarray]:
+    """Binarizes and upscales a native-resolution RGB crop for Tesseract.
+
+    Returns:
+        A uint8 image with dark text on a white background, or None if the
+        crop has a single grey level (nothing to read).
+    """
+    import cv2
+    gray = cv2.cvtColor(np.ascontiguousarray(native), cv2.COLOR_RGB2GRAY)
+    if gray.min() == gray.max():
+        return None
+    # Otsu picks the threshold between the font and background palette colours.
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    if np.count_nonzero(binary) < binary.size // 2:
+        # Mostly dark: light text on a dark background. Tesseract wants dark on light.
+        binary = cv2.bitwise_not(binary)
+    binary = cv2.resize(binary, None, fx=upscale, fy=upscale, interpolation=cv2.INTER_NEAREST)
+    return cv2.copyMakeBorder(binary, _BORDER, _BORDER, _BORDER, _BORDER,
+                              cv2.BORDER_CONSTANT, value=255)
+
+
+def _completed(result: OCRResult) -> Future:
+    future: Future = Future()
+    future.set_result(result)
+    return future
+
+
+class OCRService:
+    """Region-of-interest OCR with preprocessing and a per-region result cache.
+
+    Recognition runs on an `OCRBackend` (see `ocr_backend.py`), so the
+    regions of a frame, or of several frames, are recognized concurrently
+    by warm Tesseract engines.
 
     Args:
-        image: A PIL Image object.
+        regions: Regions to read. Defaults to `OCR_REGIONS`, or the whole frame
+                 if that setting is empty.
+        upscale: Upscaling factor applied after binarization.
+        cache_size: Results kept per region.
+        backend: OCR backend. Defaults to `create_backend()` on first use.
+    """
+
+    def __init__(self, regions: Optional[list[OCRRegion]] = None,
+                 upscale: int = OCR_UPSCALE, cache_size: int = OCR_CACHE_SIZE,
+                 backend: Optional[OCRBackend] = None) -> None:
+        if regions is None:
+            regions = regions_from_settings() or [OCRRegion("screen")]
+        self.regions = regions
+        self.upscale = upscale
+        self.cache_size = cache_size
+        self._backend = backend
+        self._caches: dict[str, OrderedDict[bytes, OCRResult]] = {region.name: OrderedDict() for region in regions}
+        # In-flight recognitions, so identical regions in one batch are read once.
+        self._pending: dict[tuple[str, bytes], Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    @property
+    def backend(self) -> OCRBackend:
+        with self._lock:
+            if self._backend is None:
+                self._backend = create_backend()
+            return self._backend
+
+    def _crop(self, native: np.ndarray, region: OCRRegion) -> np.ndarray:
+        if region.box is None:
+            return native
+        x, y, width, height = region.box
+        return native[y:y + height, x:x + width]
+
+    def _store(self, region: OCRRegion, key: bytes, result: OCRResult) -> None:
+        cache = self._caches[region.name]
+        with self._lock:
+            cache[key] = result
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+
+    def submit_region(self, native: np.ndarray, region: OCRRegion) -> Future:
+        """Queues one region of a native-resolution RGB frame.
+
+        Returns:
+            A future resolving to an `OCRResult`. Cached and blank regions
+            return an already completed future.
+        """
+        crop = self._crop(native, region)
+        key = hashlib.blake2b(np.ascontiguousarray(crop).data, digest_size=16).digest()
+        cache = self._caches[region.name]
+        with self._lock:
+            cached = cache.get(key)
+            if cached is not None:
+                cache.move_to_end(key)
+                self.hits += 1
+                return _completed(OCRResult(cached.text, cached.confidence, cached=True))
+            pending = self._pending.get((region.name, key))
+            if pending is not None:
+                self.hits += 1
+                return pending
+
+        prepared = preprocess_region(crop, self.upscale)
+        if prepared is None:
+            result = OCRResult("", 100.0)
+            with self._lock:
+                self.skipped += 1
+            self._store(region, key, result)
+            return _completed(result)
+
+        future: Future = Future()
+        with self._lock:
+            self.misses += 1
+            self._pending[(region.name, key)] = future
+        recognized = self.backend.submit(OCRTask(prepared, region.psm, region.whitelist))
+
+        def _done(done: Future) -> None:
+            try:
+                text = done.result()
+            except Exception as e:
+                with self._lock:
+                    self._pending.pop((region.name, key), None)
+                future.set_exception(e)
+                return
+            result = OCRResult(text.text, text.confidence)
+            self._store(region, key, result)
+            with self._lock:
+                self._pending.pop((region.name, key), None)
+            future.set_result(result)
+
+        recognized.add_done_callback(_done)
+        return future
+
+    def submit(self, frame: Frame) -> dict[str, Future]:
+        """Queues every configured region of a frame; returns region name -> future."""
+        native = to_native(frame)
+        return {region.name: self.submit_region(native, region) for region in self.regions}
+
+    def read(self, frame: Frame) -> dict[str, OCRResult]:
+        """Reads every configured region of a frame.
+
+        Raises:
+            pytesseract.TesseractNotFoundError: If the `tesseract` command is
+                used and is not installed.
+        """
+        with metrics.span("ocr"):
+            return {name: future.result() for name, future in self.submit(frame).items()}
+
+    def read_batch(self, frames: list[Frame]) -> list[dict[str, OCRResult]]:
+        """Reads several frames, queueing all their regions before waiting on any."""
+        with metrics.span("ocr"):
+            pending = [self.submit(frame) for frame in frames]
+            return [{name: future.result() for name, future in futures.items()} for futures in pending]
+
+    def stats(self) -> dict:
+        """Returns cache counters."""
+        with self._lock:
+            lookups = self.hits + self.misses + self.skipped
+            return {
+                "backend": self._backend.name if self._backend else None,
+                "lookups": lookups,
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped_blank": self.skipped,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self) -> None:
+        """Shuts the backend down."""
+        with self._lock:
+            backend, self._backend = self._backend, None
+        if backend:
+            backend.close()
+
+
+_default_service: Optional[OCRService] = None
+_default_service_lock = threading.Lock()
+
+
+def get_ocr_service() -> OCRService:
+    """Returns the shared `OCRService` built from `settings.py`."""
+    global _default_service
+    with _default_service_lock:
+        if _default_service is None:
+            _default_service = OCRService()
+        return _default_service
+
+
+# OCR service of a frame worker process (see `read_regions_task`).
+_worker_service: Optional[OCRService] = None
+
+
+def read_regions_task(view: FrameView) -> dict[str, OCRResult]:
+    """Frame worker task: reads the OCR regions of a shared frame.
+
+    The worker is already a separate process, so it recognizes in-process
+    (`tesserocr` if installed, else `pytesseract`) rather than starting a
+    process pool of its own.
+    """
+    global _worker_service
+    native = to_native(view.array)
+    if np.may_share_memory(native, view.array):
+        native = native.copy()
+    view.release()
+    if _worker_service is None:
+        backend = create_backend("tesserocr" if tesserocr_available() else "inline", workers=1)
+        _worker_service = OCRService(backend=backend)
+    return _worker_service.read(native)
+
+
+def format_ocr_results(results: dict[str, OCRResult]) -> str:
+    """Joins region results into one "name: text" line per non-empty region."""
+    return "\n".join(f"{name}: {result.text}" for name, result in results.items() if result.text)
+
+
+def read_regions(image: Frame) -> dict[str, OCRResult]:
+    """
+    Reads the configured OCR regions of a frame with the shared `OCRService`.
+
+    Args:
+        image: A PIL Image or RGB NumPy array of the emulator screen.
 
     Returns:
-        The extracted text as a string, or an empty string if OCR fails.
+        Region name -> `OCRResult`. Empty if OCR fails (other than Tesseract
+        missing, which is raised).
     """
     try:
-        # Ensure image is in a format Tesseract can handle well, like RGB
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-
-        text = pytesseract.image_to_string(image)
-        logging.info("OCR successful.")
-        # Optional: Clean up common OCR noise if needed
-        # text = text.strip().replace('\n', ' ')
-        return text
-    except pytesseract.TesseractNotFoundError:
+        import pytesseract
+        tesseract_missing: tuple[type[Exception], ...] = (pytesseract.TesseractNotFoundError,)
+    except ImportError:
+        tesseract_missing = ()  # Only `tesserocr` is installed: nothing to re-raise.
+    try:
+        return get_ocr_service().read(image)
+    except tesseract_missing:
         logging.error("Tesseract is not installed or not in your PATH. Please install Tesseract.")
-        # Depending on requirements, you might want to raise the error or handle it differently
         raise
     except Exception as e:
-        logging.error(f"An error occurred during OCR: {e}")
-        return "" # Return empty string on other errors
-
-# Example usage (if you want to test this file directly)
-# if __name__ == '__main__':
-#     try:
-#         img_path = 'path/to/your/test_image.png' # Replace with a valid image path
-#         img = Image.open(img_path)
-#         extracted_text = extract_text_from_image(img)
-#         print("Extracted Text:")
-#         print(extracted_text)
-#     except FileNotFoundError:
-#         print(f"Error: Test image not found at {img_path}")
-#     except pytesseract.TesseractNotFoundError:
-#         print("Error: Tesseract not found. Please ensure it's installed and in PATH.")
-#     except Exception as e:
-#         print(f"An unexpected error occurred: {e}")
\ No newline at end of file
+        logging.error("An error occurred during OCR: %s", e)
+        return {}
+
+def extract_text_from_image(image: Image.Image) -> str:
+    """
+    Extracts text from the configured regions of a PIL Image using pytesseract.
+
+    Args:
+        image: A PIL Image object.
+
+    Returns:
+        One "region: text" line per region with text, or an empty string if
+        OCR fails or nothing was recognized.
+    """
+    # Ensure image is in a format Tesseract can handle well, like RGB
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    text = format_ocr_results(read_regions(image))
+    logging.debug("OCR successful.")
+    return text
+
+if __name__ == '__main__':
+    import sys
+
+    # Usage: python -m sims_gba_ai.core.ocr path/to/screenshot.png
+    img = Image.open(sys.argv[1])
+    for region_name, region_result in read_regions(img).items():
+        print(f"{region_name} ({region_result.confidence:.0f}%): {region_result.text!r}")
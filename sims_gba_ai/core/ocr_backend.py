@@ -0,0 +1,288 @@
+"""
+OCR Backend Module.
+
+Runs Tesseract for the `OCRService` without paying process start-up on every
+call. `pytesseract` launches a fresh `tesseract` process and writes temporary
+files for each image; the backends here keep the engine warm instead:
+
+* `TesserocrBackend` - in-process `tesserocr` bindings. Each worker thread
+  owns one initialized `PyTessBaseAPI`, and recognition releases the GIL, so
+  regions are read in parallel with no process or file overhead.
+* `ProcessPoolBackend` - long-lived worker processes that receive images
+  through preallocated `multiprocessing.shared_memory` slots (no pickling of
+  pixel data). Workers use `tesserocr` when it is installed and fall back to
+  `pytesseract` otherwise, which still moves the OCR work off the agent
+  process and runs regions concurrently.
+* `InlineBackend` - calls `pytesseract` in the caller's thread (the original
+  behaviour), for debugging.
+
+All backends return `concurrent.futures.Future`s and accept batches.
+"""
+import atexit
+import logging
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+import numpy as np
+
+from sims_gba_ai.config.settings import (
+    TESSERACT_CMD_PATH, OCR_BACKEND, OCR_WORKERS, OCR_SHM_SLOT_BYTES,
+)
+
+# Tesseract language used by every backend.
+_LANGUAGE = "eng"
+
+
+@dataclass
+class OCRTask:
+    """One preprocessed image to recognize.
+
+    Attributes:
+        image: 2-D uint8 image (dark text on a light background).
+        psm: Tesseract page segmentation mode.
+        whitelist: Characters Tesseract may output, or None for any.
+    """
+    image: np.ndarray
+    psm: int = 6
+    whitelist: Optional[str] = None
+
+
+@dataclass
+class RecognizedText:
+    """Text and mean word confidence (0-100) returned by a backend."""
+    text: str
+    confidence: float
+
+
+def tesserocr_available() -> bool:
+    """Returns True if the `tesserocr` bindings can be imported."""
+    try:
+        import tesserocr  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# --- Recognition primitives (used in-process and inside worker processes) ---
+
+def _recognize_pytesseract(image: np.ndarray, psm: int, whitelist: Optional[str]) -> RecognizedText:
+    """Recognizes an image with the `tesseract` command line (one process per call)."""
+    import pytesseract
+    if TESSERACT_CMD_PATH:
+        pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD_PATH
+
+    config = f"--psm {psm}"
+    if whitelist:
+        config += f" -c tessedit_char_whitelist={whitelist}"
+    data = pytesseract.image_to_data(image, lang=_LANGUAGE, config=config,
+                                     output_type=pytesseract.Output.DICT)
+    lines: dict[tuple, list[str]] = {}
+    confidences = []
+    for index, word in enumerate(data["text"]):
+        word = word.strip()
+        confidence = float(data["conf"][index])
+        if not word or confidence < 0:
+            continue
+        key = (data["block_num"][index], data["par_num"][index], data["line_num"][index])
+        lines.setdefault(key, []).append(word)
+        confidences.append(confidence)
+    text = "\n".join(" ".join(words) for words in lines.values())
+    return RecognizedText(text, sum(confidences) / len(confidences) if confidences else 0.0)
+
+
+def _new_tesserocr_api():
+    import tesserocr
+    return tesserocr.PyTessBaseAPI(lang=_LANGUAGE)
+
+
+def _recognize_tesserocr(api, image: np.ndarray, psm: int, whitelist: Optional[str]) -> RecognizedText:
+    """Recognizes an image with an initialized, reused `PyTessBaseAPI`."""
+    from PIL import Image
+    api.SetPageSegMode(psm)
+    api.SetVariable("tessedit_char_whitelist", whitelist or "")
+    api.SetImage(Image.fromarray(image))
+    text = "\n".join(line.strip() for line in api.GetUTF8Text().splitlines() if line.strip())
+    confidence = float(api.MeanTextConf()) if text else 0.0
+    return RecognizedText(text, max(0.0, confidence))
+
+
+class OCRBackend:
+    """Interface shared by the OCR backends."""
+
+    name = "base"
+
+    def submit(self, task: OCRTask) -> Future:
+        """Queues one task. The future resolves to a `RecognizedText`."""
+        raise NotImplementedError
+
+    def submit_batch(self, tasks: Sequence[OCRTask]) -> list[Future]:
+        """Queues several tasks at once (e.g. all regions of a frame)."""
+        return [self.submit(task) for task in tasks]
+
+    def close(self) -> None:
+        pass
+
+
+class InlineBackend(OCRBackend):
+    """Runs `pytesseract` synchronously in the calling thread."""
+
+    name = "inline"
+
+    def submit(self, task: OCRTask) -> Future:
+        future: Future = Future()
+        try:
+            future.set_result(_recognize_pytesseract(task.image, task.psm, task.whitelist))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class TesserocrBackend(OCRBackend):
+    """Thread pool where every worker keeps its own warm `PyTessBaseAPI`.
+
+    Args:
+        workers: Number of worker threads (and Tesseract engines).
+    """
+
+    name = "tesserocr"
+
+    def __init__(self, workers: int = OCR_WORKERS) -> None:
+        self._local = threading.local()
+        self._apis = []
+        self._apis_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="OCR")
+
+    def _api(self):
+        api = getattr(self._local, "api", None)
+        if api is None:
+            api = self._local.api = _new_tesserocr_api()
+            with self._apis_lock:
+                self._apis.append(api)
+        return api
+
+    def _run(self, task: OCRTask) -> RecognizedText:
+        return _recognize_tesserocr(self._api(), task.image, task.psm, task.whitelist)
+
+    def submit(self, task: OCRTask) -> Future:
+        return self._executor.submit(self._run, task)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        with self._apis_lock:
+            for api in self._apis:
+                api.End()
+            self._apis.clear()
+
+
+# --- Process pool with shared-memory frame transfer ---
+
+# Per-worker-process state, set up by `_init_worker`.
+_worker_slots: dict[str, 'shared_memory.SharedMemory'] = {}
+_worker_api = None
+
+
+def _init_worker(slot_names: list[str]) -> None:
+    """Attaches a worker process to the shared slots and warms up Tesseract."""
+    global _worker_api
+    for name in slot_names:
+        from multiprocessing import shared_memory
+        _worker_slots[name] = shared_memory.SharedMemory(name=name)
+    if tesserocr_available():
+        _worker_api = _new_tesserocr_api()
+
+
+def _worker_recognize(slot_name: Optional[str], shape: tuple[int, int], image: Optional[np.ndarray],
+                      psm: int, whitelist: Optional[str]) -> RecognizedText:
+    """Recognizes an image held in a shared slot (or passed directly if it did not fit)."""
+    if slot_name is not None:
+        buffer = _worker_slots[slot_name].buf
+        image = np.ndarray(shape, dtype=np.uint8, buffer=buffer)
+    if _worker_api is not None:
+        return _recognize_tesserocr(_worker_api, image, psm, whitelist)
+    return _recognize_pytesseract(image, psm, whitelist)
+
+
+class ProcessPoolBackend(OCRBackend):
+    """Long-lived OCR worker processes fed through shared-memory slots.
+
+    Args:
+        workers: Number of worker processes.
+        slot_bytes: Size of each shared slot. Images larger than a slot are
+                    pickled to the worker instead.
+        slots: Number of shared slots; bounds the images in flight. Defaults
+               to two per worker.
+    """
+
+    name = "process"
+
+    def __init__(self, workers: int = OCR_WORKERS, slot_bytes: int = OCR_SHM_SLOT_BYTES,
+                 slots: Optional[int] = None) -> None:
+        # multiprocessing is only loaded when this backend is used.
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import shared_memory
+        self.slot_bytes = slot_bytes
+        self._slots = [shared_memory.SharedMemory(create=True, size=slot_bytes)
+                       for _ in range(slots or workers * 2)]
+        self._free: queue.Queue[shared_memory.SharedMemory] = queue.Queue()
+        for slot in self._slots:
+            self._free.put(slot)
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=([slot.name for slot in self._slots],))
+        self._closed = False
+        atexit.register(self.close)
+
+    def submit(self, task: OCRTask) -> Future:
+        image = np.ascontiguousarray(task.image, dtype=np.uint8)
+        if image.nbytes > self.slot_bytes:
+            return self._executor.submit(_worker_recognize, None, image.shape, image, task.psm, task.whitelist)
+
+        slot = self._free.get()  # Blocks while every slot is in flight.
+        try:
+            np.ndarray(image.shape, dtype=np.uint8, buffer=slot.buf)[...] = image
+            future = self._executor.submit(_worker_recognize, slot.name, image.shape, None,
+                                           task.psm, task.whitelist)
+        except Exception:
+            self._free.put(slot)
+            raise
+        future.add_done_callback(lambda _: self._free.put(slot))
+        return future
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._executor.shutdown(wait=True)
+        for slot in self._slots:
+            slot.close()
+            slot.unlink()
+
+
+def create_backend(kind: str = OCR_BACKEND, workers: int = OCR_WORKERS) -> OCRBackend:
+    """Creates an OCR backend.
+
+    Args:
+        kind: "auto" (tesserocr if installed, else the process pool),
+              "tesserocr", "process" or "inline".
+        workers: Worker threads/processes for pooled backends.
+
+    Raises:
+        ValueError: If `kind` is unknown.
+    """
+    if kind == "auto":
+        kind = "tesserocr" if tesserocr_available() else "process"
+    if kind == "tesserocr":
+        backend: OCRBackend = TesserocrBackend(workers)
+    elif kind == "process":
+        backend = ProcessPoolBackend(workers)
+    elif kind == "inline":
+        backend = InlineBackend()
+    else:
+        raise ValueError(f"Invalid OCR backend: {kind}")
+    logging.info("Using OCR backend '%s' with %d workers.", backend.name, workers)
+    if TESSERACT_CMD_PATH and backend.name != "tesserocr":
+        logging.info("Using Tesseract executable at: %s", TESSERACT_CMD_PATH)
+    return backend
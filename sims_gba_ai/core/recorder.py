@@ -0,0 +1,231 @@
+"""
+Session Recorder Module.
+
+Persists what the agent saw and did so slow or bad runs can be reproduced and
+benchmarked offline. A session is a directory holding:
+
+* `frames.bin` - an append-only, memory-mapped file of fixed-size frame
+  records. Each frame is sampled to native GBA resolution and stored as a
+  256-colour palette plus one uint8 palette index per pixel (~38 KB/frame).
+* `index.jsonl` - one JSON line per frame with its timestamp, OCR text, LLM
+  prompt and response, chosen button(s) and per-stage latencies.
+* `meta.json` - frame geometry and record layout.
+
+`SessionRecorder` writes sessions; `SessionReader` maps them read-only and
+returns zero-copy NumPy views of any frame, so long sessions open instantly.
+"""
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Iterator, Optional
+
+import numpy as np
+from PIL import Image
+
+from sims_gba_ai.config.settings import (
+    GBA_NATIVE_RESOLUTION,
+    RECORDING_DIR,
+    RECORDING_CHUNK_FRAMES,
+)
+from sims_gba_ai.utils.image_utils import Frame, to_native
+
+FORMAT_VERSION = 1
+PALETTE_SIZE = 256
+FRAMES_FILE = "frames.bin"
+INDEX_FILE = "index.jsonl"
+META_FILE = "meta.json"
+
+
+def frame_record_dtype(resolution: tuple[int, int] = GBA_NATIVE_RESOLUTION) -> np.dtype:
+    """Returns the structured dtype of one frame record."""
+    width, height = resolution
+    return np.dtype([
+        ("palette", np.uint8, (PALETTE_SIZE, 3)),
+        ("pixels", np.uint8, (height, width)),
+    ])
+
+
+def quantize_frame(frame: Frame,
+                   resolution: tuple[int, int] = GBA_NATIVE_RESOLUTION) -> tuple[np.ndarray, np.ndarray]:
+    """Samples a frame to `resolution` and converts it to palette form.
+
+    GBA screens use few colours, so a 256-colour palette is near-lossless.
+
+    Returns:
+        `(palette, pixels)`: a `(256, 3)` uint8 palette and a `(height, width)`
+        uint8 array of palette indices.
+    """
+    native = Image.fromarray(to_native(frame, resolution))
+    quantized = native.quantize(PALETTE_SIZE, method=Image.Quantize.FASTOCTREE)
+    palette = np.zeros((PALETTE_SIZE, 3), dtype=np.uint8)
+    raw_palette = np.frombuffer(bytes(quantized.getpalette()[:PALETTE_SIZE * 3]), dtype=np.uint8)
+    palette.reshape(-1)[:raw_palette.size] = raw_palette
+    return palette, np.asarray(quantized, dtype=np.uint8)
+
+
+class SessionRecorder:
+    """Appends frames and decision metadata to a session directory.
+
+    The frame file grows in chunks of `chunk_frames` records and is written
+    through a memory map; `close()` trims it to the recorded length.
+
+    Args:
+        directory: Parent directory for sessions.
+        session_name: Session sub-directory name. Defaults to a timestamp.
+        chunk_frames: Number of frame records the file grows by at a time.
+        resolution: Resolution frames are stored at.
+    """
+
+    def __init__(self, directory: str = RECORDING_DIR, session_name: Optional[str] = None,
+                 chunk_frames: int = RECORDING_CHUNK_FRAMES,
+                 resolution: tuple[int, int] = GBA_NATIVE_RESOLUTION) -> None:
+        self.path = os.path.join(directory, session_name or datetime.now().strftime("%Y%m%d-%H%M%S"))
+        os.makedirs(self.path, exist_ok=True)
+        self.resolution = resolution
+        self.chunk_frames = chunk_frames
+        self.dtype = frame_record_dtype(resolution)
+        self.count = 0
+
+        with open(os.path.join(self.path, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({
+                "version": FORMAT_VERSION,
+                "width": resolution[0],
+                "height": resolution[1],
+                "palette_size": PALETTE_SIZE,
+                "record_size": self.dtype.itemsize,
+                "created": time.time(),
+            }, f)
+
+        self._frames_path = os.path.join(self.path, FRAMES_FILE)
+        open(self._frames_path, 'wb').close()
+        self._capacity = 0
+        self._map: Optional[np.memmap] = None
+        self._index = open(os.path.join(self.path, INDEX_FILE), 'a', encoding='utf-8')
+        logging.info("Recording session to '%s'.", self.path)
+
+    def _grow(self) -> None:
+        """Extends the frame file by one chunk and remaps it."""
+        if self._map is not None:
+            self._map.flush()
+            del self._map
+        self._capacity += self.chunk_frames
+        with open(self._frames_path, 'r+b') as f:
+            f.truncate(self._capacity * self.dtype.itemsize)
+        self._map = np.memmap(self._frames_path, dtype=self.dtype, mode='r+', shape=(self._capacity,))
+
+    def record(self, frame: Frame, *, ocr_text: str = "", prompt: Optional[str] = None,
+               response: Optional[str] = None, button: Optional[str] = None,
+               latencies: Optional[dict[str, float]] = None, **extra) -> int:
+        """Appends one frame and its metadata.
+
+        Args:
+            frame: The frame the decision was based on.
+            ocr_text: OCR text extracted from the frame.
+            prompt: Prompt sent to the LLM (None if no request was made).
+            response: Raw LLM response text.
+            button: The chosen button or plan description.
+            latencies: Per-stage latencies in seconds, e.g. {"llm": 1.8}.
+            **extra: Additional JSON-serializable fields for the index entry.
+
+        Returns:
+            The index of the recorded frame.
+        """
+        if self.count >= self._capacity:
+            self._grow()
+        palette, pixels = quantize_frame(frame, self.resolution)
+        record = self._map[self.count]
+        record["palette"] = palette
+        record["pixels"] = pixels
+
+        entry = {
+            "frame": self.count,
+            "ts": time.time(),
+            "ocr": ocr_text,
+            "prompt": prompt,
+            "response": response,
+            "button": button,
+            "latencies": latencies or {},
+        }
+        entry.update(extra)
+        self._index.write(json.dumps(entry) + "\n")
+        self._index.flush()
+
+        self.count += 1
+        return self.count - 1
+
+    def close(self) -> None:
+        """Flushes everything and trims the frame file to the recorded frames."""
+        if self._map is not None:
+            self._map.flush()
+            del self._map
+            self._map = None
+        with open(self._frames_path, 'r+b') as f:
+            f.truncate(self.count * self.dtype.itemsize)
+        self._index.close()
+        logging.info("Recorded %d frames to '%s'.", self.count, self.path)
+
+    def __enter__(self) -> 'SessionRecorder':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class SessionReader:
+    """Read-only, memory-mapped access to a recorded session.
+
+    Frames are returned as views into the mapped file; nothing is copied
+    until `rgb()` expands a frame through its palette.
+
+    Args:
+        path: The session directory.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported recording format version: {self.meta.get('version')}")
+
+        with open(os.path.join(path, INDEX_FILE), 'r', encoding='utf-8') as f:
+            self.entries = [json.loads(line) for line in f if line.strip()]
+
+        self.dtype = frame_record_dtype((self.meta["width"], self.meta["height"]))
+        frames_path = os.path.join(path, FRAMES_FILE)
+        # A session that was not closed cleanly may have a preallocated tail;
+        # the index is authoritative for how many frames are valid.
+        stored = os.path.getsize(frames_path) // self.dtype.itemsize
+        count = min(stored, len(self.entries))
+        self.entries = self.entries[:count]
+        self._frames = (np.memmap(frames_path, dtype=self.dtype, mode='r', shape=(count,))
+                        if count else np.zeros(0, dtype=self.dtype))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def frame(self, index: int) -> tuple[np.ndarray, np.ndarray]:
+        """Returns `(palette, pixels)` views of a frame without copying."""
+        record = self._frames[index]
+        return record["palette"], record["pixels"]
+
+    def rgb(self, index: int) -> np.ndarray:
+        """Returns a frame expanded to a `(height, width, 3)` RGB array."""
+        palette, pixels = self.frame(index)
+        return palette[pixels]
+
+    def image(self, index: int) -> Image.Image:
+        """Returns a frame as an RGB PIL Image."""
+        return Image.fromarray(self.rgb(index))
+
+    def entry(self, index: int) -> dict:
+        """Returns the index entry (OCR text, prompt, response, ...) of a frame."""
+        return self.entries[index]
+
+    def iter_frames(self, start: int = 0, stop: Optional[int] = None) -> Iterator[tuple[dict, np.ndarray, np.ndarray]]:
+        """Streams `(entry, palette, pixels)` for a range of frames, zero-copy."""
+        for index in range(start, len(self) if stop is None else min(stop, len(self))):
+            palette, pixels = self.frame(index)
+            yield self.entries[index], palette, pixels
@@ -0,0 +1,164 @@
+"""
+Adaptive Scheduler Module.
+
+Decides when the agent should make its next decision after an input. Instead
+of sleeping a fixed `LOOP_DELAY`, the `AdaptiveScheduler` samples frames from
+the capture engine and returns as soon as the screen has settled (a number of
+consecutive near-identical frames) or a maximum wait has passed. When inputs
+keep leaving the screen unchanged (a static screen where the agent makes no
+progress), it adds an exponentially growing back-off so the LLM is not queried
+in a tight loop. Every wait is recorded so the policy can be tuned.
+"""
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from sims_gba_ai.config.settings import (
+    SCHEDULER_SETTLE_FRAMES,
+    SCHEDULER_MIN_WAIT,
+    SCHEDULER_MAX_WAIT,
+    SCHEDULER_SAMPLE_INTERVAL,
+    SCHEDULER_BACKOFF_BASE,
+    SCHEDULER_MAX_BACKOFF,
+)
+from sims_gba_ai.core import metrics
+from sims_gba_ai.core.capture_engine import CaptureEngine
+from sims_gba_ai.core.change_detection import ChangeDetector
+from sims_gba_ai.utils.image_utils import Frame
+
+
+@dataclass
+class WaitRecord:
+    """Outcome of one post-input wait.
+
+    Attributes:
+        duration: Total time waited in seconds, including back-off.
+        samples: Number of frames compared.
+        settled: True if the screen settled, False if the max wait passed.
+        progressed: True if the settled frame differs from the reference
+                    frame (the input visibly did something).
+        backoff: Extra back-off delay applied before sampling, in seconds.
+        frame: The last sampled frame (None if no frame arrived).
+    """
+    duration: float
+    samples: int
+    settled: bool
+    progressed: bool
+    backoff: float
+    frame: Optional[np.ndarray] = None
+
+
+class AdaptiveScheduler:
+    """Waits for the screen to settle after an input.
+
+    Args:
+        engine: The running capture engine to sample frames from.
+        detector: Change detector deciding whether two frames are near-identical.
+        settle_frames: Consecutive unchanged frame comparisons required to settle.
+        min_wait: Seconds to wait before sampling starts (input latency).
+        max_wait: Seconds after which waiting stops even if the screen is moving.
+        sample_interval: Minimum seconds between sampled frames.
+        backoff_base: First back-off delay once an input made no progress.
+        max_backoff: Upper bound for the back-off delay.
+        history: Number of recent `WaitRecord`s kept for statistics.
+    """
+
+    def __init__(self, engine: CaptureEngine, detector: Optional[ChangeDetector] = None,
+                 settle_frames: int = SCHEDULER_SETTLE_FRAMES,
+                 min_wait: float = SCHEDULER_MIN_WAIT,
+                 max_wait: float = SCHEDULER_MAX_WAIT,
+                 sample_interval: float = SCHEDULER_SAMPLE_INTERVAL,
+                 backoff_base: float = SCHEDULER_BACKOFF_BASE,
+                 max_backoff: float = SCHEDULER_MAX_BACKOFF,
+                 history: int = 500) -> None:
+        self.engine = engine
+        self.detector = detector or ChangeDetector()
+        self.settle_frames = settle_frames
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        self.sample_interval = sample_interval
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+
+        self.records: deque[WaitRecord] = deque(maxlen=history)
+        self._static_streak = 0
+
+    @property
+    def current_backoff(self) -> float:
+        """Back-off (seconds) that the next wait will apply."""
+        if self._static_streak == 0:
+            return 0.0
+        return min(self.max_backoff, self.backoff_base * (2 ** (self._static_streak - 1)))
+
+    def wait_for_settle(self, reference: Optional[Frame] = None) -> WaitRecord:
+        """Blocks until the screen settles or the max wait passes.
+
+        Args:
+            reference: The frame the last decision was based on. If given, the
+                       result records whether the input changed the screen,
+                       and inputs without progress increase the back-off.
+
+        Returns:
+            A `WaitRecord` for this wait (also appended to `records`).
+        """
+        start = time.monotonic()
+        backoff = self.current_backoff
+        time.sleep(self.min_wait + backoff)
+        deadline = time.monotonic() + self.max_wait
+
+        last = self.engine.latest_with_sequence()
+        samples = 0
+        stable = 0
+        settled = False
+        while last is not None and time.monotonic() < deadline:
+            time.sleep(self.sample_interval)
+            current = self.engine.wait_for_frame(last[0], timeout=max(0.0, deadline - time.monotonic()))
+            if current is None:
+                break
+            samples += 1
+            if self.detector.compare(last[1], current[1]).changed:
+                stable = 0
+            else:
+                stable += 1
+            last = current
+            if stable >= self.settle_frames:
+                settled = True
+                break
+
+        frame = last[1] if last is not None else None
+        progressed = True
+        if reference is not None and frame is not None:
+            progressed = self.detector.compare(reference, frame).changed
+            self._static_streak = 0 if progressed else self._static_streak + 1
+
+        record = WaitRecord(
+            duration=time.monotonic() - start,
+            samples=samples,
+            settled=settled,
+            progressed=progressed,
+            backoff=backoff,
+            frame=frame,
+        )
+        self.records.append(record)
+        metrics.observe(metrics.STAGE_METRIC, record.duration, stage="wait")
+        return record
+
+    def stats(self) -> dict:
+        """Returns summary statistics over the recorded waits."""
+        if not self.records:
+            return {"waits": 0}
+        durations = sorted(record.duration for record in self.records)
+        count = len(durations)
+        return {
+            "waits": count,
+            "mean": sum(durations) / count,
+            "p50": durations[count // 2],
+            "p95": durations[min(count - 1, int(count * 0.95))],
+            "settled_rate": sum(record.settled for record in self.records) / count,
+            "progress_rate": sum(record.progressed for record in self.records) / count,
+            "mean_samples": sum(record.samples for record in self.records) / count,
+            "current_backoff": self.current_backoff,
+        }
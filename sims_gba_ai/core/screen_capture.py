@@ -2,13 +2,15 @@
 Screen Capture Module.
 
 Provides functionality to capture the screen content of a specific window,
-typically an emulator window, using the `mss` library.
+typically an emulator window, through a `FrameGrabber` (by default the `mss`
+screen grabber, imported on the first capture).
 """
-import mss
-import mss.tools
 from PIL import Image
 import numpy as np
 from typing import Optional # Added for type hinting
+
+from sims_gba_ai.core.frame_grabber import FrameGrabber, get_default_grabber
+from sims_gba_ai.core.window_tracker import WindowGeometry, WindowTracker
 # Note: pygetwindow is used for the type hint, but not directly imported
 # to avoid dependency if only used for type checking.
 
@@ -17,16 +19,32 @@ from typing import Optional # Added for type hinting
 # Removed EMULATOR_WINDOW_TITLE import as it's no longer needed here
 # from sims_gba_ai.config.settings import EMULATOR_WINDOW_TITLE
 
-def capture_emulator_window(window: 'pygetwindow.Window') -> Optional[Image.Image]:
+def _detect_viewport(tracker: WindowTracker, geometry: WindowGeometry, frame: np.ndarray) -> np.ndarray:
+    """Detects the viewport in a whole-client-area frame if the tracker needs it, and crops to it."""
+    if tracker.needs_viewport(geometry) and tracker.detect_frame(geometry, frame):
+        detected = tracker.geometry()
+        if detected is not None and detected.client == geometry.client:
+            return detected.crop(frame)
+    return frame
+
+def capture_emulator_window(window: 'pygetwindow.Window',
+                            tracker: Optional[WindowTracker] = None,
+                            grabber: Optional[FrameGrabber] = None) -> Optional[Image.Image]:
     """Captures the screen content of a specified window.
 
-    Uses the `mss` library to take a screenshot of the area defined by the
-    bounding box of the provided window object.
+    Grabs the area defined by the bounding box of the provided window object,
+    by default from the screen with the `mss` library.
 
     Args:
         window: A window object (compatible with `pygetwindow.Window` interface,
                 providing `top`, `left`, `width`, `height` attributes)
                 representing the target window to capture.
+        tracker: A `WindowTracker` for `window`. If given, only the game
+                 viewport is captured, at the tracker's cached position. Until
+                 the viewport is known, the whole client area is captured and
+                 the viewport is detected in it, like `CaptureEngine` does.
+        grabber: The pixel source; defaults to the module default grabber
+                 (see `frame_grabber.set_default_grabber`).
 
     Returns:
         A PIL.Image object containing the screenshot in RGB format,
@@ -36,35 +54,27 @@ def capture_emulator_window(window: 'pygetwindow.Window') -> Optional[Image.Imag
         print("Error: Invalid or incomplete window object passed to capture_emulator_window.")
         return None
 
-    # Define the screen region to capture based on the window's coordinates.
-    # `mss` requires a dictionary with 'top', 'left', 'width', and 'height'.
-    monitor = {
-        "top": window.top,
-        "left": window.left,
-        "width": window.width,
-        "height": window.height,
-    }
+    geometry = tracker.geometry() if tracker else None
+    if tracker and geometry is None:
+        print("Error: Emulator window is not available for capture.")
+        return None
 
+    grabber = grabber or get_default_grabber()
+    # Without a tracker, capture the window's bounding box.
+    box = geometry or WindowGeometry((window.left, window.top, window.width, window.height))
     try:
-        with mss.mss() as sct:
-            # Grab the image data for the specified monitor region.
-            sct_img = sct.grab(monitor)
-
-            # Convert the raw BGRA data from mss to an RGB PIL Image.
-            # Pillow's frombytes expects RGB, so we specify "BGRX" to correctly
-            # interpret the BGRA byte order and ignore the alpha channel.
-            img = Image.frombytes("RGB", sct_img.size, sct_img.bgra, "raw", "BGRX")
-
-            # Alternative numpy conversion (usually slightly slower):
-            # img_np = np.array(sct_img) # Convert to numpy array (BGRA)
-            # img_rgb = img_np[:, :, :3][:, :, ::-1] # Slice RGB, reverse BGR to RGB
-            # img = Image.fromarray(img_rgb) # Convert numpy array to PIL Image
-
-            return img
+        with grabber.session() as session:
+            frame = np.array(grabber.grab(session, window, box))
     except Exception as e:
         print(f"Error during screen capture: {e}")
+        if tracker:
+            tracker.capture_failed(e)
         return None
 
+    if tracker:
+        frame = _detect_viewport(tracker, geometry, frame)
+    return Image.fromarray(np.ascontiguousarray(frame))
+
 # Note: The example usage below needs updating to work with the current
 # function signature, which requires a valid window object.
 # It might involve using find_window from utils or mocking a window object.
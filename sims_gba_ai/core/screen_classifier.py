@@ -0,0 +1,351 @@
+"""
+Screen Classifier Module.
+
+Recognizes deterministic Sims 2 GBA screens (pause menu, dialog boxes waiting
+on 'A', save prompts, the title screen, ...) by matching reference templates
+with OpenCV at native GBA resolution. Each template carries a rule-based
+action, so a recognized screen is handled locally and the LLM round trip is
+skipped entirely.
+
+Templates live in `SCREEN_TEMPLATE_DIR` as PNG crops next to a `screens.json`
+manifest:
+
+    {
+      "version": 1,
+      "templates": [
+        {"name": "pause_menu", "image": "pause_menu.png",
+         "region": [72, 40, 96, 24], "action": "Start", "threshold": 0.93},
+        {"name": "dialog_more", "image": "dialog_more.png",
+         "region": [216, 140, 12, 10], "action": "A"}
+      ]
+    }
+
+`region` is the `[x, y, width, height]` position the crop was taken from;
+matching searches that position plus `SCREEN_MATCH_MARGIN` pixels around it.
+`action` uses the action plan format (a button name or a JSON list of steps)
+and may be null for screens that should be recognized but left to the LLM.
+
+New templates can be cut from a recorded session:
+
+    python -m sims_gba_ai.core.screen_classifier add recordings/<session> <frame> \\
+        pause_menu 72,40,96,24 Start
+"""
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from sims_gba_ai.core import metrics
+from sims_gba_ai.core.action_plan import PlanStep, parse_plan
+from sims_gba_ai.core.frame_transport import FrameView
+from sims_gba_ai.config.settings import (
+    GBA_NATIVE_RESOLUTION,
+    SCREEN_TEMPLATE_DIR,
+    SCREEN_MATCH_THRESHOLD,
+    SCREEN_MATCH_MARGIN,
+)
+from sims_gba_ai.utils.image_utils import Frame, to_native
+
+MANIFEST_FILE = "screens.json"
+
+
+@dataclass
+class ScreenTemplate:
+    """A reference crop and the rule applied when it is found.
+
+    Attributes:
+        name: Screen name, e.g. "pause_menu".
+        image: Grayscale uint8 crop at native resolution.
+        region: `(x, y, width, height)` where the crop was taken from.
+        action: Action in plan text form, or None to only recognize the screen.
+        threshold: Minimum match score for the template to count as found.
+        flat: True if the crop has a single grey level (e.g. an empty dialog
+              box), which normalized correlation cannot score; such crops
+              are scored by RMS difference only.
+    """
+    name: str
+    image: np.ndarray
+    region: tuple[int, int, int, int]
+    action: Optional[str]
+    threshold: float = SCREEN_MATCH_THRESHOLD
+    flat: bool = False
+
+    @property
+    def plan(self) -> Optional[list[PlanStep]]:
+        return parse_plan(self.action) if self.action else None
+
+
+@dataclass
+class ScreenMatch:
+    """Result of a successful classification.
+
+    Attributes:
+        name: Name of the matched template.
+        score: Match score (0.0-1.0).
+        location: `(x, y)` of the best match at native resolution.
+        action: The template's action in plan text form (None: defer to the LLM).
+    """
+    name: str
+    score: float
+    location: tuple[int, int]
+    action: Optional[str]
+
+
+def _to_gray(frame: Frame) -> np.ndarray:
+    """Samples a frame to native resolution and converts it to grayscale."""
+    import cv2
+    return cv2.cvtColor(np.ascontiguousarray(to_native(frame)), cv2.COLOR_RGB2GRAY)
+
+
+class ScreenClassifier:
+    """Matches frames against a library of screen templates.
+
+    Args:
+        templates: The templates, checked in order; the best match above its
+                   threshold wins.
+        margin: Search margin around each template's region, in native pixels.
+    """
+
+    def __init__(self, templates: list[ScreenTemplate], margin: int = SCREEN_MATCH_MARGIN) -> None:
+        self.templates = templates
+        self.margin = margin
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits: dict[str, int] = {template.name: 0 for template in templates}
+        self.classify_time = 0.0
+
+    @classmethod
+    def load(cls, directory: str = SCREEN_TEMPLATE_DIR, **kwargs) -> Optional['ScreenClassifier']:
+        """Loads templates from `directory`. Returns None if it has no manifest."""
+        templates = load_templates(directory)
+        if templates is None:
+            return None
+        return cls(templates, **kwargs)
+
+    def _score(self, gray: np.ndarray, template: ScreenTemplate) -> tuple[float, tuple[int, int]]:
+        """Best score and location of a template within its search window."""
+        import cv2
+        x, y, width, height = template.region
+        frame_height, frame_width = gray.shape
+        left, top = max(0, x - self.margin), max(0, y - self.margin)
+        right = min(frame_width, x + width + self.margin)
+        bottom = min(frame_height, y + height + self.margin)
+        window = gray[top:bottom, left:right]
+        if window.shape[0] < height or window.shape[1] < width:
+            return 0.0, (x, y)
+
+        # RMS difference scores absolute grey levels (1.0 for an exact match);
+        # normalized correlation alone would also match a darkened copy, such
+        # as the same room behind the pause overlay.
+        squared = cv2.matchTemplate(window, template.image, cv2.TM_SQDIFF)
+        if template.flat:
+            min_value, _, loc, _ = cv2.minMaxLoc(squared)
+            score = 1.0 - np.sqrt(min_value / template.image.size) / 255.0
+        else:
+            correlation = cv2.matchTemplate(window, template.image, cv2.TM_CCOEFF_NORMED)
+            _, best_correlation, _, loc = cv2.minMaxLoc(correlation)
+            rms_score = 1.0 - np.sqrt(squared[loc[1], loc[0]] / template.image.size) / 255.0
+            score = min(best_correlation, rms_score)
+        return float(score), (left + loc[0], top + loc[1])
+
+    def _match(self, gray: np.ndarray) -> Optional[ScreenMatch]:
+        best: Optional[ScreenMatch] = None
+        for template in self.templates:
+            score, location = self._score(gray, template)
+            if score >= template.threshold and (best is None or score > best.score):
+                best = ScreenMatch(template.name, score, location, template.action)
+        return best
+
+    def classify(self, frame: Frame) -> Optional[ScreenMatch]:
+        """Returns the best template match above threshold, or None."""
+        start = time.perf_counter()
+        best = self._match(_to_gray(frame))
+        self.record(best, time.perf_counter() - start)
+        return best
+
+    def record(self, best: Optional[ScreenMatch], elapsed: float) -> None:
+        """Counts a classification, e.g. one made by `classify_task` in a frame worker."""
+        metrics.observe(metrics.STAGE_METRIC, elapsed, stage="classify")
+        with self._lock:
+            self.lookups += 1
+            self.classify_time += elapsed
+            if best is not None:
+                self.hits[best.name] += 1
+        metrics.inc("sims_screen_classifier_lookups_total", result=best.name if best else "none")
+
+    def stats(self, llm_latency: Optional[float] = None) -> dict:
+        """Returns hit counters and the time spent classifying.
+
+        Args:
+            llm_latency: Mean LLM request latency in seconds. If given, the
+                         result estimates the time saved by rule-based
+                         actions (one model round trip per actionable hit).
+        """
+        with self._lock:
+            hits = sum(self.hits.values())
+            actionable = sum(self.hits[template.name] for template in self.templates if template.action)
+            result = {
+                "lookups": self.lookups,
+                "hits": hits,
+                "hit_rate": hits / self.lookups if self.lookups else 0.0,
+                "per_screen": {name: count for name, count in self.hits.items() if count},
+                "mean_classify_ms": self.classify_time / self.lookups * 1000 if self.lookups else 0.0,
+            }
+        if llm_latency is not None:
+            result["estimated_saved_s"] = max(0.0, actionable * llm_latency - self.classify_time)
+        return result
+
+
+# Classifier of a frame worker process (see `classify_task`); False until loaded.
+_worker_classifier = False
+
+
+def classify_task(view: FrameView) -> tuple[Optional[ScreenMatch], float]:
+    """Frame worker task: classifies a shared frame.
+
+    The worker loads its own copy of the templates once. The caller records
+    the result with `ScreenClassifier.record`, so the statistics stay in the
+    agent process.
+
+    Returns:
+        `(match, seconds spent classifying)`.
+    """
+    global _worker_classifier
+    start = time.perf_counter()
+    gray = _to_gray(view.array)
+    view.release()
+    if _worker_classifier is False:
+        _worker_classifier = ScreenClassifier.load()
+    best = _worker_classifier._match(gray) if _worker_classifier else None
+    return best, time.perf_counter() - start
+
+
+def load_templates(directory: str = SCREEN_TEMPLATE_DIR) -> Optional[list[ScreenTemplate]]:
+    """Reads the template manifest and crops from `directory`.
+
+    Invalid entries (missing images, bad regions or actions) are skipped with
+    a warning.
+
+    Returns:
+        The templates, or None if the directory has no manifest.
+    """
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    import cv2  # Only needed once there are templates to match.
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    templates = []
+    for entry in manifest.get("templates", []):
+        name = entry.get("name", "?")
+        image = cv2.imread(os.path.join(directory, entry.get("image", "")), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            logging.warning("Screen template '%s': image '%s' could not be read.", name, entry.get("image"))
+            continue
+        region = tuple(entry.get("region") or (0, 0, image.shape[1], image.shape[0]))
+        if len(region) != 4 or (region[3], region[2]) != image.shape:
+            logging.warning("Screen template '%s': region %s does not match the image size.", name, region)
+            continue
+        action = entry.get("action")
+        if action is not None and not isinstance(action, str):
+            action = json.dumps(action)  # A plan given as a JSON list in the manifest.
+        if action is not None and parse_plan(action) is None:
+            logging.warning("Screen template '%s': invalid action %r.", name, action)
+            continue
+        templates.append(ScreenTemplate(
+            name=name,
+            image=image,
+            region=region,
+            action=action,
+            threshold=float(entry.get("threshold", SCREEN_MATCH_THRESHOLD)),
+            flat=bool(image.min() == image.max()),
+        ))
+    logging.info("Loaded %d screen templates from '%s'.", len(templates), directory)
+    return templates
+
+
+def add_template(frame: Frame, name: str, region: tuple[int, int, int, int],
+                 action: Optional[str], directory: str = SCREEN_TEMPLATE_DIR,
+                 threshold: Optional[float] = None) -> ScreenTemplate:
+    """Cuts a template from a frame and adds it to the manifest in `directory`.
+
+    An existing template with the same name is replaced.
+
+    Args:
+        frame: A frame showing the screen (any resolution; sampled to native).
+        name: Screen name.
+        region: `(x, y, width, height)` of the crop at native resolution.
+        action: Action in plan text form, or None to only recognize the screen.
+        directory: Template directory (created if needed).
+        threshold: Per-template threshold; defaults to `SCREEN_MATCH_THRESHOLD`.
+    """
+    x, y, width, height = region
+    native_width, native_height = GBA_NATIVE_RESOLUTION
+    if width <= 0 or height <= 0 or x < 0 or y < 0 or x + width > native_width or y + height > native_height:
+        raise ValueError(f"Region {region} is outside the {native_width}x{native_height} frame.")
+    if action is not None and parse_plan(action) is None:
+        raise ValueError(f"Invalid action: {action!r}")
+
+    import cv2
+    os.makedirs(directory, exist_ok=True)
+    crop = _to_gray(frame)[y:y + height, x:x + width]
+    image_name = f"{name}.png"
+    cv2.imwrite(os.path.join(directory, image_name), crop)
+
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    manifest = {"version": 1, "templates": []}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    entry = {"name": name, "image": image_name, "region": list(region), "action": action}
+    if threshold is not None:
+        entry["threshold"] = threshold
+    manifest["templates"] = [t for t in manifest.get("templates", []) if t.get("name") != name] + [entry]
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    return ScreenTemplate(name, crop, region, action, threshold or SCREEN_MATCH_THRESHOLD,
+                          flat=bool(crop.min() == crop.max()))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from sims_gba_ai.core.recorder import SessionReader
+
+    parser = argparse.ArgumentParser(description="Manage screen classifier templates.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add_parser = commands.add_parser("add", help="Cut a template from a recorded frame.")
+    add_parser.add_argument("session", help="Session recording directory.")
+    add_parser.add_argument("frame", type=int, help="Frame index in the session.")
+    add_parser.add_argument("name", help="Screen name.")
+    add_parser.add_argument("region", help="x,y,width,height at native resolution.")
+    add_parser.add_argument("action", nargs="?", help="Button or JSON plan; omit to defer to the LLM.")
+    add_parser.add_argument("--threshold", type=float)
+    add_parser.add_argument("--dir", default=SCREEN_TEMPLATE_DIR)
+    match_parser = commands.add_parser("match", help="Classify every frame of a recorded session.")
+    match_parser.add_argument("session", help="Session recording directory.")
+    match_parser.add_argument("--dir", default=SCREEN_TEMPLATE_DIR)
+    args = parser.parse_args()
+
+    reader = SessionReader(args.session)
+    if args.command == "add":
+        crop_region = tuple(int(value) for value in args.region.split(","))
+        added = add_template(reader.rgb(args.frame), args.name, crop_region, args.action,
+                             args.dir, args.threshold)
+        print(f"Added template '{added.name}' ({added.region}) -> {added.action}")
+    else:
+        classifier = ScreenClassifier.load(args.dir)
+        if classifier is None:
+            parser.error(f"No {MANIFEST_FILE} in '{args.dir}'.")
+        for index in range(len(reader)):
+            match = classifier.classify(reader.rgb(index))
+            if match:
+                print(f"{index}: {match.name} ({match.score:.3f}) -> {match.action}")
+        print(classifier.stats())
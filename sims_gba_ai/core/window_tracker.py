@@ -0,0 +1,295 @@
+"""
+Window Geometry Tracker.
+
+Keeps track of where the emulator's game screen is, so the capture engine
+grabs only the game's pixels. The window handle and its client-area rectangle
+are cached, instead of being re-read through `pygetwindow` on every frame, and
+the 3:2 GBA viewport inside the client area (without the emulator's menu bar,
+status bar or letterbox borders) is detected once from a captured frame.
+
+The cached geometry is refreshed only when it is invalidated: the client
+rectangle is re-checked every `WINDOW_CHECK_INTERVAL` seconds (one native call
+on Windows), after a failed grab, or on an explicit `invalidate()`. A moved
+window keeps its viewport; a resized one has it detected again. If the window
+is gone (e.g. the emulator was restarted), it is found again by its title.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Optional
+
+import numpy as np
+
+from sims_gba_ai.core import metrics
+from sims_gba_ai.config.settings import (
+    GBA_NATIVE_RESOLUTION, VIEWPORT_DETECTION, VIEWPORT_DETECTION_RETRY, WINDOW_CHECK_INTERVAL,
+)
+from sims_gba_ai.utils.window_utils import client_rect, find_windows
+
+Box = tuple[int, int, int, int]  # (x, y, width, height)
+
+# Channel difference below which a pixel counts as letterbox or menu colour.
+_BORDER_TOLERANCE = 12
+# A row or column belongs to the game screen if at least this fraction of the
+# fullest one's pixels differ from the window chrome.
+_FILL_RATIO = 0.5
+# Deviation from the GBA's aspect ratio (pixels of width) accepted for a viewport.
+_ASPECT_SLACK = 0.01
+
+
+def _fits_aspect(width: int, height: int, aspect: float) -> bool:
+    return abs(width - height * aspect) <= max(2.0, width * _ASPECT_SLACK)
+
+
+def _chrome_colours(pixels: np.ndarray) -> list[np.ndarray]:
+    """Colours of the frame's edges that are a single colour (menu bar, letterbox)."""
+    colours = []
+    for edge in (pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]):
+        if (edge.max(axis=0) - edge.min(axis=0)).max() <= _BORDER_TOLERANCE:
+            colours.append(edge[0])
+    return colours
+
+
+def _edge_offset(gray: np.ndarray, length: int) -> int:
+    """Offset of the `length`-row band of `gray` whose top and bottom edges are strongest.
+
+    Used when the content box is taller than the viewport, e.g. because the
+    emulator's menu bar or status bar is part of the client area.
+    """
+    # edges[i]: change between row i - 1 and row i; the image borders count as strong edges.
+    steps = np.abs(np.diff(gray, axis=0)).mean(axis=1)
+    strongest = float(steps.max()) if steps.size else 0.0
+    edges = np.concatenate(([strongest], steps, [strongest]))
+    scores = edges[:gray.shape[0] - length + 1] + edges[length:]
+    return int(np.argmax(scores))
+
+
+def detect_viewport(frame: np.ndarray, native: tuple[int, int] = GBA_NATIVE_RESOLUTION) -> Optional[Box]:
+    """Finds the game viewport in a capture of the emulator's client area.
+
+    Edges of the frame that are a single colour (a menu bar's background,
+    letterbox borders) give the window chrome's colours; the box of rows and
+    columns mostly of other colours is the game screen. If that box is not
+    3:2, the band with the strongest edges is kept, which cuts off what is
+    left of a menu bar above or a status bar below the game.
+
+    Args:
+        frame: RGB array of the client area.
+        native: The GBA's native `(width, height)`, which fixes the aspect
+                ratio and the smallest plausible viewport.
+
+    Returns:
+        `(x, y, width, height)` of the viewport within `frame`, or None if no
+        plausible viewport was found (e.g. the game shows a blank screen).
+    """
+    height, width = frame.shape[:2]
+    aspect = native[0] / native[1]
+    pixels = frame[..., :3].astype(np.int16)
+    content = np.ones((height, width), dtype=bool)
+    for colour in _chrome_colours(pixels):
+        content &= np.abs(pixels - colour).max(axis=2) > _BORDER_TOLERANCE
+    row_fill = content.mean(axis=1)
+    col_fill = content.mean(axis=0)
+    if not row_fill.any():
+        return None
+    # Sparse rows and columns are menu labels or the like, not the game screen.
+    rows = np.flatnonzero(row_fill >= row_fill.max() * _FILL_RATIO)
+    cols = np.flatnonzero(col_fill >= col_fill.max() * _FILL_RATIO)
+    x, y = int(cols[0]), int(rows[0])
+    box_width, box_height = int(cols[-1]) - x + 1, int(rows[-1]) - y + 1
+
+    if not _fits_aspect(box_width, box_height, aspect):
+        gray = pixels[y:y + box_height, x:x + box_width].mean(axis=2)
+        if box_width / box_height < aspect:
+            viewport_height = round(box_width / aspect)
+            y += _edge_offset(gray, viewport_height)
+            box_height = viewport_height
+        else:
+            viewport_width = round(box_height * aspect)
+            x += _edge_offset(gray.T, viewport_width)
+            box_width = viewport_width
+    if box_width < native[0] or box_height < native[1] or box_width > width or box_height > height:
+        return None
+    return x, y, box_width, box_height
+
+
+@dataclass(frozen=True)
+class WindowGeometry:
+    """Where to capture the game screen.
+
+    Attributes:
+        client: Screen rectangle `(left, top, width, height)` of the window's client area.
+        viewport: The game viewport relative to `client`, or None until detected.
+    """
+    client: Box
+    viewport: Optional[Box] = None
+
+    @property
+    def capture_box(self) -> Box:
+        """Screen rectangle to grab: the viewport if known, else the client area."""
+        left, top, width, height = self.client
+        if self.viewport is None:
+            return self.client
+        x, y, viewport_width, viewport_height = self.viewport
+        return left + x, top + y, viewport_width, viewport_height
+
+    def region(self) -> dict:
+        """Returns `capture_box` as an `mss` monitor region."""
+        left, top, width, height = self.capture_box
+        return {"top": top, "left": left, "width": width, "height": height}
+
+    def crop(self, frame: np.ndarray) -> np.ndarray:
+        """Cuts the viewport out of a frame of the whole client area (a view, not a copy)."""
+        if self.viewport is None:
+            return frame
+        x, y, width, height = self.viewport
+        return frame[y:y + height, x:x + width]
+
+
+class WindowTracker:
+    """Caches an emulator window's geometry and refreshes it when invalidated.
+
+    Args:
+        window: The emulator window (e.g. a `pygetwindow.Window`), or None to
+                find it by `title`.
+        title: Title to find the window by when it disappears. None never
+               re-finds it (the orchestrator replaces agents of closed windows).
+        check_interval: Seconds between checks of the cached client rectangle.
+        detect: Detect the game viewport inside the client area.
+
+    Example:
+        tracker = WindowTracker(window, title="mGBA")
+        geometry = tracker.geometry()
+        if geometry:
+            frame = sct.grab(geometry.region())
+    """
+
+    def __init__(self, window, title: Optional[str] = None, check_interval: float = WINDOW_CHECK_INTERVAL,
+                 detect: bool = VIEWPORT_DETECTION) -> None:
+        self._window = window
+        self.title = title
+        self.check_interval = check_interval
+        self.detect = detect
+        self._geometry: Optional[WindowGeometry] = None
+        self._checked_at = float('-inf')
+        self._detect_after = 0.0
+        self._lost_since: Optional[float] = None
+        self._lock = threading.Lock()
+
+        self.refreshes: dict[str, int] = {}
+        self.refinds = 0
+        self.detections = 0
+
+    @property
+    def window(self):
+        """The current window object, or None while it can't be found."""
+        return self._window
+
+    def geometry(self) -> Optional[WindowGeometry]:
+        """Returns the cached geometry, re-checking the window if it is due.
+
+        Returns:
+            The geometry, or None if the window is gone (and could not be
+            found again) or minimized.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked_at < self.check_interval:
+                return self._geometry
+            self._checked_at = now
+            try:
+                if self._window is None:
+                    raise OSError("window not found")
+                client = tuple(int(value) for value in client_rect(self._window))
+            except Exception as e:
+                self._lost(e)
+                return None
+            if self._lost_since is not None:
+                logging.info("Emulator window available again after %.1fs.", now - self._lost_since)
+                self._lost_since = None
+            if client[2] <= 0 or client[3] <= 0:
+                return None  # Minimized.
+
+            previous = self._geometry
+            if previous is None or previous.client != client:
+                if previous is None:
+                    reason, viewport = "initial", None
+                elif previous.client[2:] == client[2:]:
+                    reason, viewport = "moved", previous.viewport
+                else:
+                    reason, viewport = "resized", None
+                if viewport is None:
+                    self._detect_after = 0.0
+                self._geometry = WindowGeometry(client, viewport)
+                self._count(reason)
+                logging.debug("Window geometry %s: client area %s.", reason, client)
+            return self._geometry
+
+    def needs_viewport(self, geometry: WindowGeometry) -> bool:
+        """Whether `detect_frame` should be called with a frame captured for `geometry`."""
+        return self.detect and geometry.viewport is None and time.monotonic() >= self._detect_after
+
+    def detect_frame(self, geometry: WindowGeometry, frame: np.ndarray) -> bool:
+        """Detects the viewport in a frame of `geometry`'s whole client area.
+
+        Returns:
+            True if a viewport was found and will be used from now on.
+        """
+        viewport = detect_viewport(frame)
+        with self._lock:
+            if self._geometry is not geometry:
+                return False  # The window changed while the frame was analysed.
+            if viewport is None:
+                self._detect_after = time.monotonic() + VIEWPORT_DETECTION_RETRY
+                return False
+            self._geometry = replace(geometry, viewport=viewport)
+            self.detections += 1
+        logging.info("Game viewport detected at %s in a %dx%d client area.",
+                     viewport, geometry.client[2], geometry.client[3])
+        return True
+
+    def invalidate(self, reason: str = "event") -> None:
+        """Drops the cached geometry; the next `geometry()` re-reads it and re-detects the viewport."""
+        with self._lock:
+            if self._geometry is not None:
+                self._geometry = None
+                self._checked_at = float('-inf')
+                self._count(reason)
+
+    def capture_failed(self, error: Exception) -> None:
+        """Invalidates the geometry after a failed grab (the window may have moved or closed)."""
+        logging.debug("Capture failed, refreshing window geometry: %s", error)
+        self.invalidate("capture_failure")
+
+    def _count(self, reason: str) -> None:
+        self.refreshes[reason] = self.refreshes.get(reason, 0) + 1
+        metrics.inc("sims_window_geometry_refreshes_total", reason=reason)
+
+    def _lost(self, error: Exception) -> None:
+        """Handles a window that can't be queried: finds it again by title. Call with the lock held."""
+        self._geometry = None
+        if self._lost_since is None:
+            self._lost_since = time.monotonic()
+            logging.warning("Emulator window is not available: %s", error)
+        if not self.title:
+            return
+        windows = find_windows(self.title)
+        self._window = windows[0] if windows else None
+        if self._window is not None:
+            self.refinds += 1
+            metrics.inc("sims_window_refinds_total")
+            logging.info("Emulator window '%s' found again.", self.title)
+            self._checked_at = float('-inf')
+
+    def stats(self) -> dict:
+        """Returns the current geometry and refresh counters."""
+        with self._lock:
+            geometry = self._geometry
+            return {
+                "client": geometry.client if geometry else None,
+                "viewport": geometry.viewport if geometry else None,
+                "refreshes": dict(self.refreshes),
+                "refinds": self.refinds,
+                "detections": self.detections,
+            }
@@ -8,113 +8,305 @@ gets a suggested action (button press) from an LLM, and executes that action.
 It includes specific logic to handle potential game pauses by trying 'A'
 and falling back to 'START' if 'A' doesn't appear to resume the game.
 """
+import logging
+import threading
 import time
-from sims_gba_ai.core.screen_capture import capture_emulator_window
-from sims_gba_ai.core.llm_interaction import get_llm_suggestion
-from sims_gba_ai.core.input_simulation import press_gba_button
-from sims_gba_ai.core.ocr import extract_text_from_image # Added
-from sims_gba_ai.config.settings import LOOP_DELAY
+from typing import Optional
+from sims_gba_ai.agent import DecisionMaker, latest_frame, perform_plan, prefetch_frame, speculate_after_input
+from sims_gba_ai.core import metrics
+from sims_gba_ai.core.capture_engine import CaptureEngine
+from sims_gba_ai.core.frame_transport import close_frame_pool, get_frame_pool
+from sims_gba_ai.core.llm_client import get_client, provider_stats
+from sims_gba_ai.core.llm_dispatcher import get_dispatcher
+from sims_gba_ai.core.llm_interaction import path_stats
+from sims_gba_ai.core.ocr import format_ocr_results, get_ocr_service, read_regions
+from sims_gba_ai.core.action_plan import describe_plan
+from sims_gba_ai.core.decision_cache import DecisionCache
+from sims_gba_ai.core.frame_history import FrameHistory
+from sims_gba_ai.core.recorder import SessionRecorder
+from sims_gba_ai.core.scheduler import AdaptiveScheduler
+from sims_gba_ai.core.screen_classifier import ScreenClassifier
+from sims_gba_ai.core.window_tracker import WindowTracker
+from sims_gba_ai.config.settings import (
+    LLM_PROVIDER, LOOP_DELAY, LOOP_MODE, DECISION_CACHE_ENABLED, ADAPTIVE_SCHEDULING, RECORDING_ENABLED,
+    LOG_LEVEL, METRICS_HTTP_PORT, METRICS_JSON_PATH, SCREEN_CLASSIFIER_ENABLED, EMULATOR_WINDOW_TITLE,
+    TEXT_FIRST_ENABLED, STUCK_DETECTION_ENABLED,
+)
 from sims_gba_ai.utils.window_utils import find_window # Changed import
 
-def main_loop() -> None:
+def main_loop(window=None, max_iterations: Optional[int] = None) -> None:
     """Runs the main control loop for the Sims GBA AI agent.
 
     This loop performs the following steps repeatedly:
     1. Finds the emulator window.
     2. Captures the current screen content of the emulator.
     3. Extracts text using OCR to understand the initial state.
-    4. Sends the captured image to an LLM to get a suggested button press.
-    5. Simulates the suggested button press.
+    4. Sends the captured image to an LLM to get a suggested button press
+       (or, with `PLAN_MODE_ENABLED`, a short multi-button plan).
+    5. Simulates the suggested button press(es).
     6. Includes special handling for the 'A' button, attempting 'START' as a
-       fallback if 'A' doesn't seem to change the game state (e.g., unpause).
-    7. Waits for a configured delay before the next iteration.
+       fallback if 'A' doesn't visibly change the screen (e.g., unpause).
+    7. Waits until the screen settles (`AdaptiveScheduler`), or for a fixed
+       `LOOP_DELAY` if adaptive scheduling is disabled, before the next iteration.
+
+    Frames are read from a background `CaptureEngine`, so capturing the
+    screen never waits on a fresh grab. With `LOOP_MODE = "pipelined"` the
+    steps run as overlapping asyncio stages instead (see `pipeline.py`).
 
     The loop continues indefinitely until manually stopped or if the emulator
     window cannot be found initially.
+
+    Args:
+        window: Emulator window to control. If None, the first window titled
+                `EMULATOR_WINDOW_TITLE` is used (see `orchestrator.py` for
+                driving several). The benchmarks pass a synthetic window.
+        max_iterations: Stop after this many loop iterations (actions in
+                        pipelined mode). None runs until interrupted.
     """
     print("Starting Sims GBA AI control loop...")
-    emulator_title = "mGBA" # Target emulator window title
-    print(f"Attempting to find emulator window: '{emulator_title}'")
+    configure_logging()
+    # Start OCR, LLM and frame worker backends while the window is found and the first frame grabbed.
+    start_backend_warm_up()
+    hwnd = window
+    if hwnd is None:
+        emulator_title = EMULATOR_WINDOW_TITLE # Target emulator window title
+        print(f"Attempting to find emulator window: '{emulator_title}'")
 
-    # Attempt to find the handle (hwnd) of the emulator window.
-    hwnd = find_window(emulator_title)
+        # Attempt to find the handle (hwnd) of the emulator window.
+        hwnd = find_window(emulator_title)
     if not hwnd:
         # If the window is not found, the agent cannot function.
-        print(f"Error: Emulator window '{emulator_title}' not found. Exiting.")
+        print("Error: Emulator window not found. Exiting.")
         return # Exit the application if the window isn't found.
 
-    while True:
-        print("\n--- New Loop Iteration ---")
+    # Keep one capture session open and grab frames of the game viewport in the
+    # background. A window found by title is found again if the emulator restarts.
+    tracker = WindowTracker(hwnd, title=EMULATOR_WINDOW_TITLE if window is None else None)
+    engine = CaptureEngine(tracker)
+    engine.start()
+
+    # Reuse decisions for screens that were already answered by the LLM.
+    cache = DecisionCache() if DECISION_CACHE_ENABLED else None
+    # Handle known screens (pause menu, dialogs, ...) with local rules.
+    classifier = ScreenClassifier.load() if SCREEN_CLASSIFIER_ENABLED else None
+    # Notice when the agent goes in circles and show the LLM the recent frames.
+    history = FrameHistory() if STUCK_DETECTION_ENABLED else None
+    decision_maker = DecisionMaker(cache, classifier=classifier, history=history)
+
+    # Wait for the screen to settle after inputs instead of a fixed delay.
+    scheduler = AdaptiveScheduler(engine) if ADAPTIVE_SCHEDULING else None
+
+    # Persist frames, OCR text and decisions for offline replay.
+    recorder = SessionRecorder() if RECORDING_ENABLED else None
+
+    # Expose stage timings and counters (see core/metrics.py).
+    exporters = start_metrics_exporters()
+
+    try:
+        run_agent(hwnd, engine, decision_maker, scheduler, recorder, max_iterations)
+    finally:
+        ring_stats = engine.ring_stats()
+        if ring_stats:
+            print(f"Shared frame ring stats (per slot): {ring_stats}")
+        engine.stop()
+        print(f"Window geometry stats: {tracker.stats()}")
+        if recorder:
+            recorder.close()
+        if scheduler:
+            print(f"Scheduler wait stats: {scheduler.stats()}")
+        if decision_maker.text_first:
+            print(f"Text-first stats: {decision_maker.text_first_stats()}")
+        if decision_maker.speculative:
+            decision_maker.cancel_speculation()
+            print(f"Speculative inference stats: {decision_maker.speculation_stats()}")
+        if history:
+            print(f"Stuck-loop detections: {history.stats()}")
+        report_shared_stats(cache, classifier)
+        stop_metrics_exporters(exporters)
+
+def configure_logging() -> None:
+    """Logs to the console at `LOG_LEVEL`, unless the caller configured logging already."""
+    logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.getLogger().setLevel(LOG_LEVEL)
+
+def start_backend_warm_up() -> threading.Thread:
+    """Initializes the OCR backend, LLM connections and frame workers in the background.
+
+    They would otherwise start on first use, inside the first iteration,
+    delaying the first action by their start-up time.
+    """
+    def warm_up() -> None:
+        start = time.perf_counter()
+        try:
+            get_ocr_service().backend
+            dispatcher = get_dispatcher()
+            clients = [backend.client for backend in dispatcher.backends] if dispatcher else [get_client(LLM_PROVIDER)]
+            for client in clients:
+                client.warm_up()
+            pool = get_frame_pool()
+            if pool:
+                pool.warm_up(("sims_gba_ai.core.ocr", "sims_gba_ai.core.image_encoding",
+                              "sims_gba_ai.core.screen_classifier"))
+        except Exception as e:
+            # Whatever failed is retried (and reported) on first use.
+            logging.warning("Backend warm-up failed: %s", e)
+            return
+        logging.info("Backends warmed up in %.0f ms.", (time.perf_counter() - start) * 1000)
+
+    thread = threading.Thread(target=warm_up, name="WarmUp", daemon=True)
+    thread.start()
+    return thread
+
+def start_metrics_exporters() -> tuple:
+    """Starts the metrics HTTP server and JSON dumper if configured.
+
+    Returns:
+        Handles for `stop_metrics_exporters`.
+    """
+    metrics_server = None
+    if METRICS_HTTP_PORT is not None:
+        metrics_server = metrics.MetricsServer(metrics.REGISTRY, METRICS_HTTP_PORT)
+        metrics_server.start()
+    metrics_dumper = None
+    if METRICS_JSON_PATH:
+        metrics_dumper = metrics.MetricsDumper(metrics.REGISTRY, METRICS_JSON_PATH)
+        metrics_dumper.start()
+    return metrics_server, metrics_dumper
+
+def stop_metrics_exporters(exporters: tuple) -> None:
+    """Stops what `start_metrics_exporters` started (the dumper writes a final snapshot)."""
+    metrics_server, metrics_dumper = exporters
+    if metrics_dumper:
+        metrics_dumper.stop()
+    if metrics_server:
+        metrics_server.stop()
+
+def report_shared_stats(cache: Optional[DecisionCache], classifier: Optional[ScreenClassifier]) -> None:
+    """Prints OCR, LLM, classifier and cache statistics and saves the decision cache."""
+    print(f"OCR cache stats: {get_ocr_service().stats()}")
+    get_ocr_service().close()
+    pool = get_frame_pool()
+    if pool:
+        print(f"Frame worker stats (per slot): {pool.stats()}")
+        close_frame_pool()
+    llm_stats = provider_stats()
+    print(f"LLM provider stats: {llm_stats}")
+    if TEXT_FIRST_ENABLED:
+        print(f"LLM request path stats (text-first vs. vision): {path_stats()}")
+    dispatcher = get_dispatcher()
+    if dispatcher:
+        print(f"LLM backend stats: {dispatcher.stats()}")
+    if classifier:
+        mean_latencies = [stats["mean"] for stats in llm_stats.values() if "mean" in stats]
+        llm_latency = sum(mean_latencies) / len(mean_latencies) if mean_latencies else None
+        print(f"Screen classifier stats: {classifier.stats(llm_latency)}")
+    if cache:
+        print(f"Decision cache stats: {cache.stats()}")
+        cache.save()
+
+def run_agent(hwnd, engine: CaptureEngine, decision_maker: DecisionMaker,
+              scheduler: AdaptiveScheduler | None, recorder: SessionRecorder | None,
+              max_iterations: Optional[int] = None, stop_event: Optional[threading.Event] = None) -> None:
+    """Runs the agent loop for one emulator window in the configured `LOOP_MODE`.
+
+    Args:
+        max_iterations: Stop after this many iterations (actions in pipelined
+                        mode). None runs until interrupted.
+        stop_event: Stops the loop once set (checked between iterations).
+    """
+    if LOOP_MODE == "pipelined":
+        # Imported here so the sequential loop doesn't load asyncio machinery.
+        from sims_gba_ai.pipeline import run_pipelined_loop
+        run_pipelined_loop(hwnd, engine, decision_maker, scheduler, recorder, max_iterations, stop_event)
+    else:
+        _run_loop(hwnd, engine, decision_maker, scheduler, recorder, max_iterations, stop_event)
+
+def _run_loop(hwnd, engine: CaptureEngine, decision_maker: DecisionMaker,
+              scheduler: AdaptiveScheduler | None, recorder: SessionRecorder | None,
+              max_iterations: Optional[int] = None, stop_event: Optional[threading.Event] = None) -> None:
+    """Runs the sequential capture/decide/act iterations of `main_loop`."""
+    iteration = 0
+    while max_iterations is None or iteration < max_iterations:
+        if stop_event is not None and stop_event.is_set():
+            break
+        iteration += 1
+        logging.debug("--- New Loop Iteration %d ---", iteration)
+        latencies: dict[str, float] = {}
 
         # --- Step 1: Capture and Analyze Current State ---
-        print("Capturing emulator window...")
-        initial_image = capture_emulator_window(hwnd)
-        if not initial_image:
-            print("Error: Failed to capture emulator window. Retrying...")
-            # Consider adding logic to re-find hwnd if capture fails repeatedly.
-            time.sleep(LOOP_DELAY)
+        logging.debug("Reading latest frame from capture engine...")
+        stage_start = time.perf_counter()
+        frame = latest_frame(engine)
+        latencies["capture"] = time.perf_counter() - stage_start
+        if not frame:
+            logging.warning("Failed to capture emulator window. Retrying...")
+            # The capture engine's window tracker refreshes the geometry (or finds the window again).
+            with metrics.span("sleep"):
+                time.sleep(LOOP_DELAY)
             continue # Skip to the next iteration if capture failed.
+        initial_seq, initial_image = frame
+        # With frame workers, OCR, encoding and classification start now, in parallel.
+        prefetch = prefetch_frame(engine, initial_seq, initial_image, decision_maker.classifier)
 
-        print("Extracting text via OCR...")
-        initial_ocr_text = extract_text_from_image(initial_image)
-        print(f"Initial OCR Text (first 50 chars): '{initial_ocr_text[:50]}'")
+        logging.debug("Extracting text via OCR...")
+        stage_start = time.perf_counter()
+        # Region results (with confidences) feed the text-first decision path.
+        ocr_results = prefetch.ocr_results(read_regions) if prefetch else read_regions(initial_image)
+        initial_ocr_text = format_ocr_results(ocr_results)
+        latencies["ocr"] = time.perf_counter() - stage_start
+        logging.debug("Initial OCR Text (first 50 chars): '%s'", initial_ocr_text[:50])
 
-        # --- Step 2: Get LLM Suggestion ---
-        print("Sending current state to LLM for action suggestion...")
-        suggested_button = get_llm_suggestion(initial_image)
+        # --- Step 2: Get Suggestion (decision cache, then LLM) ---
+        logging.debug("Looking up action suggestion for current state...")
+        stage_start = time.perf_counter()
+        plan, from_cache = decision_maker.decide(initial_image, prefetch, ocr_results)
+        latencies["decide"] = time.perf_counter() - stage_start
+        exchange = decision_maker.last_exchange
+        latencies.update(decision_maker.llm_latencies())
 
-        if not suggested_button:
-            print("Warning: LLM did not provide a valid button suggestion. Skipping action.")
-            time.sleep(LOOP_DELAY)
+        if not plan:
+            logging.warning("LLM did not provide a valid button suggestion. Skipping action.")
+            if recorder:
+                recorder.record(initial_image, ocr_text=initial_ocr_text,
+                                prompt=exchange.prompt if exchange else None,
+                                response=exchange.response_text if exchange else None,
+                                latencies=latencies)
+            with metrics.span("sleep"):
+                time.sleep(LOOP_DELAY)
             continue # Skip action if no valid suggestion received.
 
-        print(f"LLM suggested button press: {suggested_button}")
+        logging.info("%s suggested button press: %s", decision_maker.source_label, describe_plan(plan))
 
         # --- Step 3: Simulate Input (with 'A' vs 'START' fallback) ---
-        # Special handling for 'A' button: Often used for confirmation or interaction,
-        # but sometimes the game might be paused, requiring 'START'.
-        if suggested_button == 'A':
-            print("LLM suggested 'A'. Executing 'A' and verifying state change...")
-            press_gba_button(hwnd, 'A')
-            print("Pressed 'A'.")
-            time.sleep(0.5) # Brief pause to allow the screen to potentially update.
-
-            # Verify if pressing 'A' changed the game state by re-capturing and comparing OCR text.
-            print("Capturing screen again to check if 'A' was effective...")
-            new_image = capture_emulator_window(hwnd)
-            if not new_image:
-                # If capture fails after pressing 'A', we can't verify.
-                # As a fallback, assume 'A' might not have worked (e.g., game was paused)
-                # and try pressing 'START' instead.
-                print("Error: Failed to capture screen after pressing 'A'.")
-                print("Fallback: Assuming 'A' was ineffective, trying 'START'...")
-                press_gba_button(hwnd, 'START')
-                print("Pressed 'START'.")
-            else:
-                print("Extracting text after 'A' press...")
-                new_ocr_text = extract_text_from_image(new_image)
-                print(f"New OCR Text (first 50 chars): '{new_ocr_text[:50]}'")
-
-                # Compare OCR text before and after pressing 'A'.
-                # If the text hasn't changed, 'A' likely didn't advance the game state
-                # (e.g., the game might be paused). Try 'START' as a fallback.
-                if new_ocr_text == initial_ocr_text:
-                    print("OCR text unchanged after 'A'. Fallback: Trying 'START'...")
-                    press_gba_button(hwnd, 'START')
-                    print("Pressed 'START'.")
-                else:
-                    # If the text changed, assume 'A' was the correct action.
-                    print("'A' press appears to have changed the game state. Proceeding.")
+        stage_start = time.perf_counter()
+        # The engine's window, in case the tracker found a restarted emulator.
+        settled = perform_plan(engine.window or hwnd, engine, plan, initial_image, scheduler)
+        latencies["act"] = time.perf_counter() - stage_start
 
+        # --- Step 4: Wait Before Next Cycle ---
+        stage_start = time.perf_counter()
+        # With SPECULATIVE_INFERENCE, the next LLM request runs during the wait.
+        if speculate_after_input(engine, decision_maker, engine.sequence):
+            logging.debug("Started a speculative LLM request on the first post-input frame.")
+        if scheduler:
+            # An effective 'A' press already waited for the screen to settle.
+            record = settled if settled is not None else scheduler.wait_for_settle(initial_image)
+            logging.debug(
+                "Waited %.2fs for the screen to settle (settled=%s, progressed=%s, backoff=%.2fs).",
+                record.duration, record.settled, record.progressed, record.backoff,
+            )
         else:
-            # If the suggestion is not 'A', press the suggested button directly.
-            print(f"Executing suggested button press: {suggested_button}")
-            press_gba_button(hwnd, suggested_button)
-            print(f"Pressed '{suggested_button}'.")
+            logging.debug("Waiting for %s seconds before next loop iteration...", LOOP_DELAY)
+            with metrics.span("sleep"):
+                time.sleep(LOOP_DELAY)
+        latencies["wait"] = time.perf_counter() - stage_start
 
-        # --- Step 4: Wait Before Next Cycle ---
-        print(f"Waiting for {LOOP_DELAY} seconds before next loop iteration...")
-        time.sleep(LOOP_DELAY)
+        if recorder:
+            recorder.record(initial_image, ocr_text=initial_ocr_text,
+                            prompt=exchange.prompt if exchange else None,
+                            response=exchange.response_text if exchange else None,
+                            button=describe_plan(plan), latencies=latencies,
+                            from_cache=from_cache, source=decision_maker.last_source)
 
 if __name__ == "__main__":
-    main_loop()
\ No newline at end of file
+    main_loop()
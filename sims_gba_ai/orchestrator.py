@@ -0,0 +1,272 @@
+"""
+Multi-Emulator Orchestrator.
+
+Drives every emulator window matching `EMULATOR_WINDOW_TITLE` from one
+process, e.g. to collect data from many game instances on one machine. Each
+window gets an `AgentInstance` with its own capture engine, screen-settle
+scheduler, decision state, input dispatcher and session recording, running
+the usual agent loop (`main.run_agent`) on its own thread. What is worth
+pooling is shared across instances:
+
+* the decision cache and screen classifier, so a screen answered for one
+  instance is answered for all of them;
+* the OCR service and its warm Tesseract workers;
+* the LLM clients, whose request limiter caps the requests in flight per
+  server (`LLM_MAX_CONCURRENT_REQUESTS`) and serves the agents first come,
+  first served, so throughput grows with the instance count until the
+  inference server is saturated;
+* keyboard focus: inputs to different windows are serialized by the input
+  dispatchers, so a key never lands in the wrong game.
+
+The window list is rescanned every `ORCHESTRATOR_RESCAN_INTERVAL` seconds:
+new emulator windows get an agent, agents of closed windows are stopped, and
+a window whose agent stopped with an error (or that reappears after being
+closed) gets a new agent.
+
+Usage (from the project root):
+    python -m sims_gba_ai.orchestrator
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+from sims_gba_ai.agent import DecisionMaker
+from sims_gba_ai.core.capture_engine import CaptureEngine
+from sims_gba_ai.core.decision_cache import DecisionCache
+from sims_gba_ai.core.frame_history import FrameHistory
+from sims_gba_ai.core.input_dispatcher import close_dispatcher
+from sims_gba_ai.core.recorder import SessionRecorder
+from sims_gba_ai.core.scheduler import AdaptiveScheduler
+from sims_gba_ai.core.screen_classifier import ScreenClassifier
+from sims_gba_ai.config.settings import (
+    ADAPTIVE_SCHEDULING, DECISION_CACHE_ENABLED, EMULATOR_WINDOW_TITLE,
+    ORCHESTRATOR_MAX_INSTANCES, ORCHESTRATOR_RESCAN_INTERVAL, RECORDING_ENABLED,
+    SCREEN_CLASSIFIER_ENABLED, STUCK_DETECTION_ENABLED,
+)
+from sims_gba_ai.main import (
+    configure_logging, report_shared_stats, run_agent, start_backend_warm_up, start_metrics_exporters,
+    stop_metrics_exporters,
+)
+from sims_gba_ai.utils.window_utils import find_windows, window_key
+
+# Creates the session recorder of the instance with the given index (or None).
+RecorderFactory = Callable[[int], Optional[SessionRecorder]]
+
+
+def default_recorder_factory(index: int) -> Optional[SessionRecorder]:
+    """One recording session per instance, if `RECORDING_ENABLED`."""
+    if not RECORDING_ENABLED:
+        return None
+    return SessionRecorder(session_name=f"{datetime.now():%Y%m%d-%H%M%S}-{index}")
+
+
+class AgentInstance:
+    """One emulator window and the agent loop driving it.
+
+    Args:
+        index: Instance number, used in thread and session names.
+        window: The emulator window.
+        cache: The shared decision cache, or None.
+        classifier: The shared screen classifier, or None.
+        recorder: Session recorder for this instance, or None.
+        max_iterations: Stop after this many iterations. None runs until stopped.
+    """
+
+    def __init__(self, index: int, window, cache: Optional[DecisionCache],
+                 classifier: Optional[ScreenClassifier], recorder: Optional[SessionRecorder] = None,
+                 max_iterations: Optional[int] = None) -> None:
+        self.index = index
+        self.window = window
+        self.engine = CaptureEngine(window)
+        # The history is per window: each game gets stuck on its own.
+        history = FrameHistory() if STUCK_DETECTION_ENABLED else None
+        self.decision_maker = DecisionMaker(cache, classifier=classifier, history=history)
+        self.scheduler = AdaptiveScheduler(self.engine) if ADAPTIVE_SCHEDULING else None
+        self.recorder = recorder
+        self.max_iterations = max_iterations
+        self.stop_event = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # Per-slot counters of the shared frame ring, kept when the engine stops.
+        self.ring_stats: Optional[list[dict]] = None
+        self._thread = threading.Thread(target=self._run, name=f"Agent-{index}", daemon=True)
+
+    @property
+    def alive(self) -> bool:
+        return self._thread.is_alive()
+
+    @property
+    def completed(self) -> bool:
+        """True if the loop ended on its own, without an error or a stop request (e.g. after `max_iterations`)."""
+        return self.finished_at is not None and self.error is None and not self.stop_event.is_set()
+
+    def start(self) -> None:
+        """Starts the capture engine and the agent thread."""
+        self.started_at = time.monotonic()
+        self.engine.start()
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Asks the agent loop to stop after its current iteration."""
+        self.stop_event.set()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        try:
+            run_agent(self.window, self.engine, self.decision_maker, self.scheduler, self.recorder,
+                      self.max_iterations, self.stop_event)
+        except Exception as e:
+            self.error = e
+            logging.exception("Agent %d for window '%s' stopped with an error.", self.index, self.window.title)
+        finally:
+            self.finished_at = time.monotonic()
+            self.ring_stats = self.engine.ring_stats()
+            self.engine.stop()
+            close_dispatcher(self.window)  # Don't keep an input thread per retired window.
+            if self.recorder:
+                self.recorder.close()
+
+    def stats(self) -> dict:
+        """Returns decision counts and run time of this instance."""
+        decisions = sum(self.decision_maker.source_counts.values())
+        end = self.finished_at or time.monotonic()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "window": self.window.title,
+            "decisions": decisions,
+            "sources": dict(self.decision_maker.source_counts),
+            "text_first": self.decision_maker.text_first_stats() if self.decision_maker.text_first else None,
+            "speculation": self.decision_maker.speculation_stats() if self.decision_maker.speculative else None,
+            "stuck": self.decision_maker.history.stats() if self.decision_maker.history else None,
+            "decisions_per_s": decisions / elapsed if elapsed else 0.0,
+            "scheduler": self.scheduler.stats() if self.scheduler else None,
+            "frame_ring": self.ring_stats,
+            "error": repr(self.error) if self.error else None,
+        }
+
+
+class Orchestrator:
+    """Runs one agent per emulator window with shared caches and LLM clients.
+
+    Args:
+        title: Title (substring) of the emulator windows to drive.
+        max_instances: Maximum number of windows driven at once; None for all.
+        rescan_interval: Seconds between window scans; 0 scans once at start.
+        windows: Fixed windows to drive instead of searching by title (e.g.
+                 the benchmark's synthetic windows).
+        recorder_factory: Creates each instance's session recorder.
+    """
+
+    def __init__(self, title: str = EMULATOR_WINDOW_TITLE,
+                 max_instances: Optional[int] = ORCHESTRATOR_MAX_INSTANCES,
+                 rescan_interval: float = ORCHESTRATOR_RESCAN_INTERVAL,
+                 windows: Optional[list] = None,
+                 recorder_factory: RecorderFactory = default_recorder_factory) -> None:
+        self.title = title
+        self.max_instances = max_instances
+        self.rescan_interval = rescan_interval
+        self.recorder_factory = recorder_factory
+        self._windows = windows
+        # Shared by every instance.
+        self.cache = DecisionCache() if DECISION_CACHE_ENABLED else None
+        self.classifier = ScreenClassifier.load() if SCREEN_CLASSIFIER_ENABLED else None
+        self.instances: dict[int, AgentInstance] = {}
+        # Instances replaced or dropped by `scan`, kept for their stats.
+        self.retired: list[AgentInstance] = []
+        self._stop_event = threading.Event()
+
+    def _find_windows(self) -> list:
+        return list(self._windows) if self._windows is not None else find_windows(self.title)
+
+    def _all_instances(self) -> list[AgentInstance]:
+        return sorted([*self.retired, *self.instances.values()], key=lambda instance: instance.index)
+
+    def _active(self) -> bool:
+        """True while an agent runs, or a failed one waits for the next scan to restart it."""
+        return any(instance.alive or (self.rescan_interval and instance.error is not None)
+                   for instance in self.instances.values())
+
+    def scan(self, max_iterations: Optional[int] = None) -> None:
+        """Starts agents for new windows and stops agents of windows that disappeared.
+
+        Agents that stopped (their window closed) or failed are retired, so
+        their window gets a new agent while it is, or once it is again,
+        present. Agents that completed their iterations are left in place.
+        """
+        windows = {window_key(window): window for window in self._find_windows()}
+        for key, instance in list(self.instances.items()):
+            if instance.alive:
+                if key not in windows and not instance.stop_event.is_set():
+                    print(f"Emulator window '{instance.window.title}' is gone. Stopping agent {instance.index}.")
+                    instance.stop()
+            elif not instance.completed:
+                del self.instances[key]
+                self.retired.append(instance)
+                if instance.error is not None and key in windows:
+                    logging.warning("Agent %d for window '%s' failed; starting a new one.",
+                                    instance.index, instance.window.title)
+
+        running = sum(1 for instance in self.instances.values() if instance.alive)
+        for key, window in windows.items():
+            if key in self.instances:
+                continue
+            if self.max_instances is not None and running >= self.max_instances:
+                break
+            index = len(self.instances) + len(self.retired)
+            print(f"Starting agent {index} for emulator window '{window.title}'.")
+            instance = AgentInstance(index, window, self.cache, self.classifier,
+                                     self.recorder_factory(index), max_iterations)
+            self.instances[key] = instance
+            instance.start()
+            running += 1
+
+    def run(self, max_iterations: Optional[int] = None) -> None:
+        """Drives all emulator windows until interrupted or every agent finished.
+
+        Args:
+            max_iterations: Iterations per instance. None runs until stopped.
+        """
+        print("Starting multi-emulator orchestrator...")
+        configure_logging()
+        start_backend_warm_up()
+        exporters = start_metrics_exporters()
+        try:
+            self.scan(max_iterations)
+            if not self.instances:
+                print(f"Error: No emulator windows matching '{self.title}' found. Exiting.")
+                return
+            last_scan = time.monotonic()
+            while self._active():
+                if self._stop_event.wait(0.2):
+                    break
+                if self.rescan_interval and time.monotonic() - last_scan >= self.rescan_interval:
+                    self.scan(max_iterations)
+                    last_scan = time.monotonic()
+        except KeyboardInterrupt:
+            print("Interrupted. Stopping agents...")
+        finally:
+            for instance in self.instances.values():
+                instance.stop()
+            for instance in self.instances.values():
+                instance.join()
+            for instance in self._all_instances():
+                print(f"Agent {instance.index} stats: {instance.stats()}")
+            report_shared_stats(self.cache, self.classifier)
+            stop_metrics_exporters(exporters)
+
+    def stop(self) -> None:
+        """Stops all agents (from another thread)."""
+        self._stop_event.set()
+
+    def stats(self) -> list[dict]:
+        """Returns the stats of every instance started so far."""
+        return [instance.stats() for instance in self._all_instances()]
+
+
+if __name__ == "__main__":
+    Orchestrator().run()
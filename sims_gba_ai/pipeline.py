@@ -0,0 +1,256 @@
+"""
+Pipelined Agent Loop.
+
+An asyncio-based alternative to the strictly sequential `main_loop`. Each
+stage runs as its own task, connected by bounded queues:
+
+    perceive (capture + OCR)  ->  decide (cache / LLM)  ->  act (input)
+
+Blocking work (waiting for frames, Tesseract, HTTP requests, key presses) runs
+in worker threads via `asyncio.to_thread`, so the next frame is captured and
+OCR'd while an LLM request is still in flight. Observation queues hold only
+the newest item: a stale observation is replaced instead of queued, and the
+decide stage discards any observation captured before the last action
+finished. Throughput is therefore bounded by the slowest stage rather than
+the sum of all stages.
+"""
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from PIL import Image
+
+from sims_gba_ai.agent import DecisionMaker, FramePrefetch, perform_plan, prefetch_frame, speculate_after_input
+from sims_gba_ai.core import metrics
+from sims_gba_ai.core.action_plan import PlanStep, describe_plan
+from sims_gba_ai.core.capture_engine import CaptureEngine
+from sims_gba_ai.core.ocr import OCRResult, format_ocr_results, read_regions
+from sims_gba_ai.core.recorder import SessionRecorder
+from sims_gba_ai.core.scheduler import AdaptiveScheduler
+from sims_gba_ai.config.settings import FRAME_WAIT_TIMEOUT, PIPELINE_SETTLE_DELAY
+
+
+@dataclass
+class Observation:
+    """A captured frame and what was extracted from it."""
+    seq: int
+    image: Image.Image
+    ocr_text: str
+    captured_at: float
+    # Frame worker analyses of the frame, if `FRAME_WORKERS` is set.
+    prefetch: Optional[FramePrefetch] = None
+    # OCR results per region, for the text-first decision path.
+    ocr_results: dict[str, OCRResult] = field(default_factory=dict)
+
+
+@dataclass
+class Action:
+    """A decided plan and the observation it was based on."""
+    plan: list[PlanStep]
+    observation: Observation
+    from_cache: bool
+    decide_time: float
+    prompt: Optional[str] = None
+    response: Optional[str] = None
+    source: Optional[str] = None
+    # LLM latencies of the decision (see `DecisionMaker.llm_latencies`); empty without an LLM request.
+    llm_latencies: dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class PipelineStats:
+    """Counters and cumulative stage timings (seconds) for the pipelined loop."""
+    observations: int = 0
+    dropped_observations: int = 0
+    stale_observations: int = 0
+    decisions: int = 0
+    actions: int = 0
+    perceive_time: float = 0.0
+    decide_time: float = 0.0
+    act_time: float = 0.0
+
+    def summary(self) -> str:
+        """One-line summary with mean stage latencies."""
+        def mean(total: float, count: int) -> str:
+            return f"{total / count * 1000:.0f}ms" if count else "n/a"
+        return (
+            f"observations={self.observations} (dropped={self.dropped_observations}, "
+            f"stale={self.stale_observations}) decisions={self.decisions} actions={self.actions} "
+            f"mean perceive={mean(self.perceive_time, self.observations)} "
+            f"decide={mean(self.decide_time, self.decisions)} act={mean(self.act_time, self.actions)}"
+        )
+
+
+def _put_latest(queue: asyncio.Queue, item) -> bool:
+    """Puts `item` into a size-1 queue, replacing any unconsumed item.
+
+    Returns:
+        True if an older item was dropped.
+    """
+    dropped = False
+    if queue.full():
+        queue.get_nowait()
+        dropped = True
+    queue.put_nowait(item)
+    return dropped
+
+
+class PipelinedAgent:
+    """Runs the perceive, decide and act stages as concurrent asyncio tasks.
+
+    Args:
+        hwnd: The emulator window.
+        engine: A running capture engine for the window.
+        decision_maker: Chooses buttons (decision cache, then LLM).
+        scheduler: If given, waits for the screen to settle after each action
+                   instead of the fixed `settle_delay`.
+        recorder: If given, every executed action is recorded.
+        settle_delay: Seconds to wait after an action before frames are
+                      considered for the next decision.
+    """
+
+    def __init__(self, hwnd, engine: CaptureEngine, decision_maker: DecisionMaker,
+                 scheduler: Optional[AdaptiveScheduler] = None,
+                 recorder: Optional[SessionRecorder] = None,
+                 settle_delay: float = PIPELINE_SETTLE_DELAY) -> None:
+        self.hwnd = hwnd
+        self.engine = engine
+        self.decision_maker = decision_maker
+        self.scheduler = scheduler
+        self.recorder = recorder
+        self.settle_delay = settle_delay
+        self.stats = PipelineStats()
+
+        self._observations: asyncio.Queue[Observation] = asyncio.Queue(maxsize=1)
+        self._actions: asyncio.Queue[Action] = asyncio.Queue(maxsize=1)
+        # Frames with a sequence number <= this were captured before the last
+        # action settled and must not drive a decision.
+        self._min_seq = -1
+        self._action_done = asyncio.Event()
+        self._action_done.set()
+
+    async def _perceive(self) -> None:
+        """Captures frames and runs OCR, publishing only the newest observation."""
+        last_seq = -1
+        while True:
+            result = await asyncio.to_thread(self.engine.wait_for_frame, last_seq, FRAME_WAIT_TIMEOUT)
+            if result is None:
+                logging.warning("No new frame from capture engine.")
+                continue
+            start = time.perf_counter()
+            last_seq, frame = result
+            image = Image.fromarray(frame)
+            prefetch = prefetch_frame(self.engine, last_seq, image, self.decision_maker.classifier)
+            if prefetch:
+                ocr_results = await asyncio.to_thread(prefetch.ocr_results, read_regions)
+            else:
+                ocr_results = await asyncio.to_thread(read_regions, image)
+            self.stats.perceive_time += time.perf_counter() - start
+            self.stats.observations += 1
+
+            observation = Observation(last_seq, image, format_ocr_results(ocr_results), time.monotonic(),
+                                      prefetch, ocr_results)
+            if _put_latest(self._observations, observation):
+                self.stats.dropped_observations += 1
+
+    async def _decide(self) -> None:
+        """Turns fresh observations into actions, one action in flight at a time."""
+        while True:
+            await self._action_done.wait()
+            observation = await self._observations.get()
+            if observation.seq <= self._min_seq:
+                self.stats.stale_observations += 1
+                continue
+
+            start = time.perf_counter()
+            plan, from_cache = await asyncio.to_thread(
+                self.decision_maker.decide, observation.image, observation.prefetch, observation.ocr_results)
+            exchange = self.decision_maker.last_exchange
+            source = self.decision_maker.source_label
+            decide_time = time.perf_counter() - start
+            self.stats.decide_time += decide_time
+            self.stats.decisions += 1
+
+            if not plan:
+                logging.warning("LLM did not provide a valid button suggestion. Skipping action.")
+                continue
+
+            logging.info("%s suggested button press: %s (OCR: '%s')", source, describe_plan(plan), observation.ocr_text[:50])
+            self._action_done.clear()
+            await self._actions.put(Action(
+                plan, observation, from_cache, decide_time,
+                prompt=exchange.prompt if exchange else None,
+                response=exchange.response_text if exchange else None,
+                source=self.decision_maker.last_source,
+                llm_latencies=self.decision_maker.llm_latencies(),
+            ))
+
+    async def _act(self) -> None:
+        """Executes actions and marks frames captured before they settled as stale."""
+        while True:
+            action = await self._actions.get()
+            start = time.perf_counter()
+            try:
+                before_image = action.observation.image
+                settled = await asyncio.to_thread(
+                    perform_plan, self.engine.window or self.hwnd, self.engine, action.plan, before_image, self.scheduler)
+                # With SPECULATIVE_INFERENCE, the next LLM request runs while the screen settles.
+                await asyncio.to_thread(speculate_after_input, self.engine, self.decision_maker, self.engine.sequence)
+                if self.scheduler is not None and settled is None:
+                    # An effective 'A' press already waited for the screen to settle.
+                    await asyncio.to_thread(self.scheduler.wait_for_settle, before_image)
+                else:
+                    with metrics.span("sleep"):
+                        await asyncio.sleep(self.settle_delay)
+            finally:
+                self._min_seq = self.engine.sequence
+                self._action_done.set()
+            act_time = time.perf_counter() - start
+            self.stats.act_time += act_time
+            self.stats.actions += 1
+            if self.recorder:
+                observation = action.observation
+                await asyncio.to_thread(
+                    self.recorder.record, observation.image, ocr_text=observation.ocr_text,
+                    prompt=action.prompt, response=action.response, button=describe_plan(action.plan),
+                    latencies={"decide": action.decide_time, "act": act_time, **action.llm_latencies},
+                    from_cache=action.from_cache, source=action.source,
+                )
+            if self.stats.actions % 10 == 0:
+                logging.info("Pipeline stats: %s", self.stats.summary())
+
+    async def run(self, max_actions: Optional[int] = None,
+                  stop_event: Optional[threading.Event] = None) -> None:
+        """Runs the pipeline until cancelled, `max_actions` actions were executed or `stop_event` is set."""
+        tasks = [
+            asyncio.create_task(self._perceive(), name="perceive"),
+            asyncio.create_task(self._decide(), name="decide"),
+            asyncio.create_task(self._act(), name="act"),
+        ]
+        try:
+            if max_actions is None and stop_event is None:
+                await asyncio.gather(*tasks)
+            else:
+                while ((max_actions is None or self.stats.actions < max_actions)
+                       and not (stop_event is not None and stop_event.is_set())):
+                    done = [t for t in tasks if t.done()]
+                    if done:
+                        done[0].result()  # Propagate stage errors.
+                    await asyncio.sleep(0.05)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            print(f"Pipeline stats: {self.stats.summary()}")
+
+
+def run_pipelined_loop(hwnd, engine: CaptureEngine, decision_maker: DecisionMaker,
+                       scheduler: Optional[AdaptiveScheduler] = None,
+                       recorder: Optional[SessionRecorder] = None,
+                       max_actions: Optional[int] = None,
+                       stop_event: Optional[threading.Event] = None) -> None:
+    """Runs the pipelined agent loop until interrupted, `max_actions` actions were executed or `stop_event` is set."""
+    asyncio.run(PipelinedAgent(hwnd, engine, decision_maker, scheduler, recorder).run(max_actions, stop_event))
@@ -0,0 +1,70 @@
+"""
+Image Utilities.
+
+Small helpers shared by the frame-processing modules for moving between PIL
+Images and NumPy arrays and for sampling frames down to the GBA's native
+resolution.
+"""
+from functools import lru_cache
+from typing import Union
+
+import numpy as np
+from PIL import Image
+
+from sims_gba_ai.config.settings import GBA_NATIVE_RESOLUTION
+
+Frame = Union[Image.Image, np.ndarray]
+
+
+def to_rgb_array(frame: Frame) -> np.ndarray:
+    """Returns `frame` as a `(height, width, 3)` uint8 RGB array.
+
+    NumPy arrays that are already in that layout are returned as-is (no copy).
+
+    Args:
+        frame: A PIL Image (any mode) or an RGB/RGBA/grayscale NumPy array.
+    """
+    if isinstance(frame, Image.Image):
+        if frame.mode != 'RGB':
+            frame = frame.convert('RGB')
+        return np.asarray(frame)
+
+    array = np.asarray(frame)
+    if array.ndim == 2:
+        return np.repeat(array[:, :, None], 3, axis=2).astype(np.uint8, copy=False)
+    if array.shape[2] == 4:
+        array = array[:, :, :3]
+    return array.astype(np.uint8, copy=False)
+
+
+@lru_cache(maxsize=16)
+def _sample_indices(src_height: int, src_width: int,
+                    dst_height: int, dst_width: int) -> tuple[np.ndarray, np.ndarray]:
+    """Row/column indices for nearest-neighbour sampling between two sizes."""
+    rows = ((np.arange(dst_height) + 0.5) * src_height / dst_height).astype(np.intp)
+    cols = ((np.arange(dst_width) + 0.5) * src_width / dst_width).astype(np.intp)
+    return rows, cols
+
+
+def to_native(frame: Frame,
+              size: tuple[int, int] = GBA_NATIVE_RESOLUTION) -> np.ndarray:
+    """Samples a frame down (or up) to `size` using nearest-neighbour indexing.
+
+    Emulators upscale the 240x160 GBA picture by whole or fractional factors,
+    so picking the centre pixel of each source block recovers the original
+    pixels without blurring the palette. Frames already at `size` are returned
+    without copying.
+
+    Args:
+        frame: A PIL Image or NumPy array.
+        size: Target `(width, height)`.
+
+    Returns:
+        A `(height, width, 3)` uint8 RGB array.
+    """
+    array = to_rgb_array(frame)
+    width, height = size
+    if array.shape[:2] == (height, width):
+        return array
+    rows, cols = _sample_indices(array.shape[0], array.shape[1], height, width)
+    return array[rows[:, None], cols[None, :]]
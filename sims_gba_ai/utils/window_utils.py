@@ -1,19 +1,78 @@
-import pygetwindow as gw
+import sys
 import warnings
+from typing import Hashable
 
 def find_window(title: str):
     """
     Finds a window by its title.
 
+    `pygetwindow` is imported on first use because it is not available on
+    every platform (e.g. headless Linux benchmark machines).
+
     Args:
         title: The exact title of the window to find.
 
     Returns:
         The window object if found, otherwise None.
     """
+    import pygetwindow as gw
+
     windows = gw.getWindowsWithTitle(title)
     if windows:
         return windows[0] # Return the first match
     else:
         warnings.warn(f"Window with title '{title}' not found.")
-        return None
\ No newline at end of file
+        return None
+
+
+def find_windows(title: str) -> list:
+    """
+    Finds every window whose title contains `title`, e.g. all running
+    emulator instances.
+
+    Args:
+        title: The window title to search for.
+
+    Returns:
+        The matching window objects (possibly empty), in the order the OS lists them.
+    """
+    import pygetwindow as gw
+
+    return list(gw.getWindowsWithTitle(title))
+
+
+def window_key(window) -> Hashable:
+    """
+    Returns a stable identity for a window. `pygetwindow` returns new window
+    objects on every lookup, so its native handle is used where available.
+    Windows without a handle (e.g. the benchmarks' synthetic windows) are
+    identified by their title, so they need distinct titles. Object ids are
+    not used: a window object found again is a new object, and the id of a
+    discarded one may be reused by another window.
+    """
+    return getattr(window, '_hWnd', None) or window.title
+
+
+def client_rect(window) -> tuple[int, int, int, int]:
+    """
+    Returns the screen rectangle of a window's client area as
+    `(left, top, width, height)`, i.e. without title bar and borders.
+
+    On Windows the native handle is queried directly; elsewhere (and for
+    virtual windows) the window's bounding box is used.
+
+    Raises:
+        OSError: If the window no longer exists.
+    """
+    hwnd = getattr(window, '_hWnd', None)
+    if hwnd and sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        user32 = ctypes.windll.user32
+        rect = wintypes.RECT()
+        origin = wintypes.POINT(0, 0)
+        if not (user32.GetClientRect(hwnd, ctypes.byref(rect)) and user32.ClientToScreen(hwnd, ctypes.byref(origin))):
+            raise OSError(f"Window {hwnd} no longer exists.")
+        return origin.x, origin.y, rect.right - rect.left, rect.bottom - rect.top
+    return window.left, window.top, window.width, window.height
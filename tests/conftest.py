@@ -0,0 +1,23 @@
+"""Shared test fixtures."""
+import time
+
+import pytest
+
+
+class FakeClock:
+    """A clock that only moves when a test advances `now`."""
+
+    def __init__(self) -> None:
+        self.now = 1_700_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    """Replaces `time.time` and `time.monotonic` with a `FakeClock`."""
+    clock = FakeClock()
+    monkeypatch.setattr(time, "time", clock)
+    monkeypatch.setattr(time, "monotonic", clock)
+    return clock
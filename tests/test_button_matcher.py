@@ -0,0 +1,74 @@
+"""Tests for the streaming `ButtonMatcher`."""
+from typing import Optional
+
+import pytest
+
+from sims_gba_ai.config.settings import VALID_GBA_BUTTONS
+from sims_gba_ai.core.button_matcher import ButtonMatcher
+
+
+def stream(deltas: list[str]) -> tuple[Optional[str], int]:
+    """Feeds `deltas` like a stream. Returns the button and how many deltas were read."""
+    matcher = ButtonMatcher(VALID_GBA_BUTTONS)
+    for index, delta in enumerate(deltas, 1):
+        button = matcher.feed(delta)
+        if button:
+            return button, index
+    return matcher.finish(), len(deltas)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Start", "Start"),
+    ("I would press **start** to open the menu.", "Start"),
+    ("UP", "Up"),
+    ("a", "A"),
+    ("Press a button. Left seems right.", "Left"),
+    ("Starting over is not an option. Select.", "Select"),
+    ("<think>Maybe Down? No.</think> Right", "Right"),
+    ("up", "Up"),
+    ("start the game", "Start"),
+    ("I would pick up the item, so A", "A"),
+    ("To select the door press A", "A"),
+    ("That is right, press B", "B"),
+    ("Press 'select' now.", "Select"),
+    ("No idea.", None),
+])
+def test_finds_the_first_button_in_the_whole_text(text, expected):
+    assert stream([text])[0] == expected
+
+
+def test_matches_as_soon_as_the_word_is_complete():
+    button, read = stream(["I'd press St", "art", " to", " open the menu."])
+    assert (button, read) == ("Start", 3)
+
+
+def test_does_not_match_a_word_that_may_still_continue():
+    matcher = ButtonMatcher(VALID_GBA_BUTTONS)
+    assert matcher.feed("Le") is None
+    assert matcher.feed("ft") is None
+    assert matcher.feed("!") == "Left"
+
+
+def test_prefix_of_a_longer_word_is_not_a_button():
+    assert stream(["Start", "ing now; press ", "B", "."]) == ("B", 4)
+
+
+def test_last_word_counts_when_the_stream_ends():
+    matcher = ButtonMatcher(VALID_GBA_BUTTONS)
+    assert matcher.feed("Select") is None
+    assert matcher.finish() == "Select"
+
+
+def test_ignores_reasoning_split_across_deltas():
+    assert stream(["<th", "ink>press Up", " now</thi", "nk>", "Down", "\n"]) == ("Down", 6)
+
+
+def test_ignores_everything_after_an_unclosed_think_tag():
+    assert stream(["<think>Up, then Down"]) == (None, 1)
+
+
+def test_keeps_the_first_match():
+    matcher = ButtonMatcher(VALID_GBA_BUTTONS)
+    assert matcher.feed("A, ") == "A"
+    assert matcher.feed("B ") == "A"
+    assert matcher.finish() == "A"
@@ -0,0 +1,132 @@
+"""Tests for the LRU, TTL, tolerance and persistence of `DecisionCache`."""
+import threading
+
+import pytest
+
+from sims_gba_ai.core.decision_cache import DecisionCache
+
+
+def make_cache(**kwargs) -> DecisionCache:
+    options = {"max_entries": 3, "ttl_seconds": None, "tolerance": 0, "path": None}
+    return DecisionCache(**{**options, **kwargs})
+
+
+def test_get_returns_the_stored_decision():
+    cache = make_cache()
+    cache.put(0b1010, "A")
+    assert cache.get(0b1010) == "A"
+    assert cache.get(0b0101) is None
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1, "evictions": 0, "hit_rate": 0.5}
+
+
+def test_evicts_the_least_recently_used_entry():
+    cache = make_cache()
+    for key, decision in [(1, "A"), (2, "B"), (3, "Start")]:
+        cache.put(key, decision)
+    cache.get(1)  # 2 is now the least recently used.
+    cache.put(4, "Up")
+    assert 2 not in cache
+    assert [cache.get(key) for key in (1, 3, 4)] == ["A", "Start", "Up"]
+    assert cache.evictions == 1
+
+
+def test_put_refreshes_an_existing_entry():
+    cache = make_cache()
+    for key in (1, 2, 3):
+        cache.put(key, "A")
+    cache.put(1, "B")
+    cache.put(4, "A")
+    assert 2 not in cache
+    assert cache.get(1) == "B"
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = make_cache(ttl_seconds=60)
+    cache.put(1, "A")
+    clock.now += 60
+    assert cache.get(1) == "A"
+    clock.now += 1
+    assert 1 not in cache
+    assert cache.get(1) is None
+    assert len(cache) == 0  # The expired entry is dropped on lookup.
+
+
+def test_contains_does_not_count_as_a_lookup():
+    cache = make_cache()
+    cache.put(1, "A")
+    assert 1 in cache
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 0
+
+
+def test_matches_hashes_within_the_hamming_tolerance():
+    cache = make_cache(tolerance=2)
+    cache.put(0b1111_0000, "A")
+    assert cache.get(0b1111_0011) == "A"
+    assert cache.get(0b1111_0111) is None
+
+
+def test_prefers_the_closest_entry():
+    cache = make_cache(tolerance=2)
+    cache.put(0b0000, "A")
+    cache.put(0b0111, "B")
+    assert cache.get(0b0011) == "B"
+
+
+def test_invalidate_removes_the_matching_entry():
+    cache = make_cache(tolerance=1)
+    cache.put(0b100, "A")
+    assert cache.invalidate(0b101)
+    assert not cache.invalidate(0b101)
+    assert len(cache) == 0
+
+
+def test_saves_and_loads_live_entries(tmp_path, clock):
+    path = str(tmp_path / "cache.json")
+    cache = make_cache(path=path, ttl_seconds=60)
+    cache.put(0xABC, "Start")
+    clock.now += 30
+    cache.put(0xDEF, "B")
+    cache.save()
+
+    clock.now += 45  # 0xABC is now older than the TTL.
+    loaded = make_cache(path=path, ttl_seconds=60)
+    assert len(loaded) == 1
+    assert loaded.get(0xDEF) == "B"
+
+
+def test_saves_automatically_every_save_interval_entries(tmp_path):
+    path = tmp_path / "cache.json"
+    cache = make_cache(path=str(path), save_interval=2)
+    cache.put(1, "A")
+    assert not path.exists()
+    cache.put(2, "B")
+    assert path.exists()
+
+
+def test_ignores_an_unreadable_cache_file(tmp_path):
+    path = tmp_path / "cache.json"
+    path.write_text("not json")
+    assert len(make_cache(path=str(path))) == 0
+
+
+def test_skips_malformed_entries(tmp_path):
+    path = tmp_path / "cache.json"
+    path.write_text('{"version": 1, "entries": [["abc", "A", 1e18], ["xyz", "B", 1e18], ["def"], 5,'
+                    ' ["123", null, 1e18], ["456", "B", "soon"]]}')
+    cache = make_cache(path=str(path), max_entries=10)
+    assert len(cache) == 1
+    assert cache.get(0xABC) == "A"
+
+
+def test_concurrent_saves_leave_a_complete_file(tmp_path):
+    path = tmp_path / "cache.json"
+    cache = make_cache(path=str(path), max_entries=1000, save_interval=0)
+    for key in range(500):
+        cache.put(key, "A")
+    threads = [threading.Thread(target=cache.save) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(make_cache(path=str(path), max_entries=1000)) == 500
+    assert [entry.name for entry in tmp_path.iterdir()] == ["cache.json"]
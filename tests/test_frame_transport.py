@@ -0,0 +1,95 @@
+"""Tests for the seqlock handoff of `SharedFrameRing`."""
+import numpy as np
+import pytest
+
+from sims_gba_ai.core.frame_transport import FrameOverwrittenError, SharedFrameRing
+
+HEIGHT, WIDTH = 4, 6
+
+
+@pytest.fixture
+def ring():
+    ring = SharedFrameRing(slots=2, slot_bytes=HEIGHT * WIDTH * 3)
+    yield ring
+    ring.close()
+
+
+def write(ring: SharedFrameRing, seq: int, value: int, commit: bool = True) -> None:
+    slot = seq % ring.slots
+    ring.begin_write(slot)
+    ring.frames(HEIGHT, WIDTH)[slot] = value
+    if commit:
+        ring.commit(slot, seq, HEIGHT, WIDTH)
+
+
+def test_rejects_fewer_than_two_slots():
+    with pytest.raises(ValueError):
+        SharedFrameRing(slots=1, slot_bytes=64)
+
+
+def test_frames_rejects_frames_larger_than_a_slot(ring):
+    with pytest.raises(ValueError):
+        ring.frames(HEIGHT * 2, WIDTH)
+
+
+def test_reads_a_committed_frame(ring):
+    write(ring, 0, 7)
+    view = ring.read(0)
+    assert view is not None
+    assert view.array.shape == (HEIGHT, WIDTH, 3)
+    assert (view.array == 7).all()
+    assert not view.array.flags.writeable
+    view.release()
+    assert view.hold_time is not None
+
+
+def test_frame_being_written_is_not_readable(ring):
+    write(ring, 0, 1, commit=False)
+    assert ring.read(0) is None
+    ring.commit(0, 0, HEIGHT, WIDTH)
+    assert ring.read(0) is not None
+
+
+def test_release_fails_when_the_slot_was_overwritten_during_the_read(ring):
+    write(ring, 0, 1)
+    view = ring.read(0)
+    copied = np.array(view.array)
+    write(ring, 2, 2)  # Same slot as frame 0.
+    assert not view.valid()
+    with pytest.raises(FrameOverwrittenError) as error:
+        view.release()
+    assert (error.value.seq, error.value.slot) == (0, 0)
+    assert (copied == 1).all()
+    view.release()  # A second release is a no-op.
+
+
+def test_reader_retries_with_the_newest_frame(ring):
+    write(ring, 0, 1)
+    write(ring, 1, 2)
+    write(ring, 2, 3)
+    assert ring.read(0) is None  # Overwritten by frame 2: the reader asks again for a newer one.
+    view = ring.read(2)
+    assert (view.array == 3).all()
+    view.release()
+
+
+def test_counts_overwritten_unread_frames_as_drops(ring):
+    write(ring, 0, 1)
+    ring.read(0).release()
+    write(ring, 1, 1)
+    write(ring, 2, 1)  # Frame 0 was read: not a drop.
+    write(ring, 3, 1)  # Frame 1 was never read: dropped.
+    assert ring.slot_stats() == [{"writes": 2, "drops": 0}, {"writes": 2, "drops": 1}]
+
+
+def test_attached_ring_reads_the_writers_frames(ring):
+    write(ring, 1, 9)
+    reader = SharedFrameRing.attach(ring.name)
+    try:
+        assert (reader.slots, reader.slot_bytes) == (ring.slots, ring.slot_bytes)
+        view = reader.read(1)
+        assert (view.array == 9).all()
+        view.release()
+        del view
+    finally:
+        reader.close()
@@ -0,0 +1,119 @@
+"""Tests for the ordering and focus handling of `InputDispatcher`."""
+import time
+
+import pytest
+
+from sims_gba_ai.config.settings import GBA_KEY_MAPPINGS
+from sims_gba_ai.core import input_dispatcher
+from sims_gba_ai.core.input_dispatcher import (
+    InputDispatcher,
+    RecordingBackend,
+    close_dispatcher,
+    get_dispatcher,
+    set_default_backend,
+)
+
+
+class Window:
+    """The attributes of an emulator window the dispatcher reads."""
+
+    def __init__(self, title: str = "mGBA - The Urbz") -> None:
+        self.title = title
+
+
+@pytest.fixture
+def backend():
+    backend = RecordingBackend()
+    set_default_backend(backend)
+    yield backend
+    set_default_backend(None)  # Also closes the dispatchers the test created.
+
+
+@pytest.fixture
+def dispatcher(backend):
+    dispatcher = InputDispatcher(Window(), backend, min_gap=0.01, activation_delay=0)
+    yield dispatcher
+    dispatcher.close()
+
+
+def kinds_and_keys(backend: RecordingBackend) -> list[tuple[str, str]]:
+    return [(kind, key) for _, kind, key in backend.events]
+
+
+def test_sends_inputs_in_order(backend, dispatcher):
+    for button in ("Up", "A", "Start"):
+        dispatcher.press(button)
+    assert dispatcher.wait_idle(5)
+    keys = [GBA_KEY_MAPPINGS[button] for button in ("Up", "A", "Start")]
+    assert kinds_and_keys(backend) == [(kind, key) for key in keys for kind in ("down", "up")]
+
+
+def test_holds_the_key_and_keeps_the_gap_before_the_next_input(backend, dispatcher):
+    start = time.monotonic()
+    dispatcher.press("A", hold=0.05)
+    dispatcher.press("B")
+    assert dispatcher.wait_idle(5)
+    _, (a_up, _, _), (b_down, _, _), _ = backend.events
+    # Events are never sent before they are due (they may be late, so this
+    # is measured from the start rather than between events).
+    assert a_up - start >= 0.05
+    assert b_down - start >= 0.05 + 0.01
+
+
+def test_chord_presses_and_releases_together(backend, dispatcher):
+    dispatcher.chord(["L", "R"]).result(5)
+    l_key, r_key = GBA_KEY_MAPPINGS["L"], GBA_KEY_MAPPINGS["R"]
+    assert kinds_and_keys(backend) == [("down", l_key), ("down", r_key), ("up", l_key), ("up", r_key)]
+
+
+def test_rejects_an_unknown_button(dispatcher):
+    with pytest.raises(ValueError):
+        dispatcher.press("Turbo")
+
+
+def test_activates_the_window_only_when_focus_was_lost(backend, dispatcher):
+    dispatcher.press("A").result(5)
+    assert (dispatcher.activations, dispatcher.focus_checks) == (1, 1)
+    dispatcher.press("B").result(5)
+    assert (dispatcher.activations, dispatcher.focus_checks) == (1, 1)  # Focus still trusted.
+
+    backend.focused = False
+    dispatcher.invalidate_focus()
+    dispatcher.press("A").result(5)
+    assert (dispatcher.activations, dispatcher.focus_checks) == (2, 2)
+    assert backend.activations == 2
+
+
+def test_rechecks_focus_after_the_check_interval(backend):
+    dispatcher = InputDispatcher(Window(), backend, min_gap=0, focus_check_interval=0, activation_delay=0)
+    try:
+        dispatcher.press("A").result(5)
+        dispatcher.press("A").result(5)
+        assert (dispatcher.activations, dispatcher.focus_checks) == (1, 2)
+    finally:
+        dispatcher.close()
+
+
+def test_close_releases_held_keys(backend, dispatcher):
+    dispatcher.hold("Left").result(5)
+    dispatcher.close()
+    assert kinds_and_keys(backend)[-1] == ("up", GBA_KEY_MAPPINGS["Left"])
+    with pytest.raises(RuntimeError):
+        dispatcher.press("A")
+
+
+def test_shares_one_dispatcher_per_window(backend):
+    dispatcher = get_dispatcher(Window("mGBA #0"))
+    assert get_dispatcher(Window("mGBA #0")) is dispatcher  # Found again as a new object.
+    assert get_dispatcher(Window("mGBA #1")) is not dispatcher
+
+
+def test_close_dispatcher_stops_and_forgets_the_dispatcher(backend):
+    window = Window()
+    dispatcher = get_dispatcher(window)
+    dispatcher.press("A").result(5)
+    close_dispatcher(window)
+    assert not dispatcher._worker.is_alive()
+    assert input_dispatcher._dispatchers == {}
+    assert get_dispatcher(window) is not dispatcher
+    close_dispatcher(Window("never dispatched"))  # No-op.
@@ -0,0 +1,98 @@
+"""Tests for the retries of `LLMClient` against the stub LLM server."""
+import threading
+import time
+
+import pytest
+import requests
+
+from benchmarks.stub_llm_server import StubLLMServer
+from sims_gba_ai.core.llm_client import LLMClient
+
+PAYLOAD = {"model": "stub", "messages": [{"role": "user", "content": "Which button?"}]}
+
+
+@pytest.fixture
+def sleeps(monkeypatch) -> list[float]:
+    """Records the backoff delays of the test thread instead of sleeping."""
+    delays: list[float] = []
+    sleep = time.sleep
+    caller = threading.current_thread()
+
+    def record(seconds: float) -> None:
+        if threading.current_thread() is caller:
+            delays.append(seconds)
+        else:
+            sleep(seconds)  # The stub server's handler threads.
+    monkeypatch.setattr(time, "sleep", record)
+    return delays
+
+
+@pytest.fixture
+def closes(monkeypatch) -> list[int]:
+    """Records the status of every `requests.Response` that is closed."""
+    statuses: list[int] = []
+    close = requests.Response.close
+
+    def record(response: requests.Response) -> None:
+        statuses.append(response.status_code)
+        close(response)
+    monkeypatch.setattr(requests.Response, "close", record)
+    return statuses
+
+
+def make_client(server: StubLLMServer, **kwargs) -> LLMClient:
+    options = {"max_retries": 2, "backoff_base": 0.01, "backoff_max": 0.5, "max_concurrent": 1}
+    return LLMClient("stub", server.base_url, **{**options, **kwargs})
+
+
+def assert_slot_released(client: LLMClient) -> None:
+    """Fails (instead of hanging) if a failed request kept the client's only limiter slot."""
+    thread = threading.Thread(target=lambda: (client.limiter.acquire(), client.limiter.release()))
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive(), "limiter slot was not released"
+
+
+def test_retries_rate_limits_and_server_errors(sleeps):
+    with StubLLMServer(["Up"], statuses=(429, 503)) as server:
+        client = make_client(server)
+        result = client.chat_completion(PAYLOAD)
+        assert result["choices"][0]["message"]["content"] == "Up"
+        assert (server.requests, server.errors) == (3, 2)
+    assert len(sleeps) == 2
+    assert client.stats.summary()["retries"] == 2
+
+
+def test_honours_retry_after(sleeps):
+    with StubLLMServer(["A"], statuses=(429,), retry_after="0.25") as server:
+        make_client(server).chat_completion(PAYLOAD)
+    assert sleeps == [0.25]
+
+
+def test_caps_retry_after_at_the_backoff_max(sleeps):
+    with StubLLMServer(["A"], statuses=(503,), retry_after="120") as server:
+        make_client(server, backoff_max=0.5).chat_completion(PAYLOAD)
+    assert sleeps == [0.5]
+
+
+def test_does_not_retry_a_client_error(sleeps, closes):
+    with StubLLMServer(["A"], statuses=(400,)) as server:
+        client = make_client(server)
+        with pytest.raises(requests.exceptions.HTTPError):
+            client.chat_completion(PAYLOAD)
+        assert server.requests == 1
+        assert_slot_released(client)
+    assert sleeps == []
+    assert closes == [400]
+    assert client.stats.summary()["failures"] == 1
+
+
+def test_closes_every_response_when_retries_run_out(sleeps, closes):
+    with StubLLMServer(["A"], statuses=(503, 502, 429)) as server:
+        client = make_client(server)
+        with pytest.raises(requests.exceptions.HTTPError):
+            client.chat_completion(PAYLOAD)
+        assert server.requests == 3
+        assert_slot_released(client)
+    assert closes == [503, 502, 429]
+    assert client.stats.summary()["failures"] == 1
@@ -0,0 +1,147 @@
+"""Tests for `CircuitBreaker` and the failover and hedging of `LLMDispatcher`."""
+import threading
+
+import pytest
+
+from sims_gba_ai.config import settings
+from sims_gba_ai.core.llm_dispatcher import Backend, CircuitBreaker, LLMDispatcher
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=10)
+    assert not breaker.record_failure()
+    assert breaker.state == "closed"
+    assert breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=10)
+    breaker.record_failure()
+    breaker.record_success()
+    assert not breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_breaker_allows_one_probe_after_the_cooldown(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()  # The probe is taken.
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_breaker_reopens_when_the_probe_fails(clock):
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=10)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    assert not breaker.record_failure()  # Already open: not counted as opening again.
+    assert breaker.state == "open"
+
+
+def test_released_probe_can_be_claimed_again(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def make_dispatcher(*names: str) -> LLMDispatcher:
+    # The model tells the fake attempts which backend they run on.
+    return LLMDispatcher([Backend(name, "lmstudio", model=name) for name in names])
+
+
+def fake_attempt(behaviour: dict, calls: list):
+    """An attempt that, per backend, returns a value, raises an exception or runs a callable."""
+    def attempt(client, payload, read_timeout, cancel):
+        name = payload["model"]
+        calls.append(name)
+        outcome = behaviour[name]
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome(cancel) if callable(outcome) else outcome
+    return attempt
+
+
+def test_dispatch_uses_the_first_backend():
+    calls = []
+    result = make_dispatcher("a", "b").dispatch({}, fake_attempt({"a": "Up", "b": "Down"}, calls), bool)
+    assert (result.answer, result.valid, result.backend, result.attempts, result.hedged) == ("Up", True, "a", 1, False)
+    assert calls == ["a"]
+
+
+def test_dispatch_fails_over_to_the_next_backend_on_an_error():
+    dispatcher = make_dispatcher("a", "b")
+    calls = []
+    result = dispatcher.dispatch({}, fake_attempt({"a": ConnectionError("down"), "b": "Down"}, calls), bool)
+    assert (result.answer, result.backend, result.attempts) == ("Down", "b", 2)
+    assert calls == ["a", "b"]
+    assert dispatcher.backends[0].breaker.failures == 1
+
+
+def test_dispatch_fails_over_on_an_invalid_answer():
+    result = make_dispatcher("a", "b").dispatch({}, fake_attempt({"a": "", "b": "Left"}, []), bool)
+    assert (result.answer, result.valid, result.backend) == ("Left", True, "b")
+
+
+def test_dispatch_returns_the_last_invalid_answer():
+    result = make_dispatcher("a", "b").dispatch({}, fake_attempt({"a": "", "b": ""}, []), bool)
+    assert (result.valid, result.backend, result.attempts) == (False, "b", 2)
+
+
+def test_dispatch_raises_the_last_error_when_every_backend_fails():
+    behaviour = {"a": ConnectionError("a down"), "b": TimeoutError("b slow")}
+    with pytest.raises(TimeoutError):
+        make_dispatcher("a", "b").dispatch({}, fake_attempt(behaviour, []), bool)
+
+
+def test_dispatch_skips_a_backend_with_an_open_circuit():
+    dispatcher = make_dispatcher("a", "b")
+    dispatcher.backends[0].breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+    dispatcher.backends[0].breaker.record_failure()
+    calls = []
+    result = dispatcher.dispatch({}, fake_attempt({"a": "Up", "b": "Down"}, calls), bool)
+    assert result.backend == "b"
+    assert calls == ["b"]
+
+
+def test_dispatch_hedges_a_slow_backend_and_cancels_the_loser(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_INITIAL_DELAY", 0.05)
+    loser_cancelled = threading.Event()
+
+    def slow(cancel: threading.Event) -> str:
+        if cancel.wait(5):
+            loser_cancelled.set()
+        return "Up"
+
+    result = make_dispatcher("a", "b").dispatch({}, fake_attempt({"a": slow, "b": "Down"}, []), bool)
+    assert (result.answer, result.backend, result.attempts, result.hedged) == ("Down", "b", 2, True)
+    assert loser_cancelled.wait(1)
+
+
+def test_concurrent_dispatches_are_not_limited_by_the_backend_count(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_INITIAL_DELAY", 5)
+    dispatcher = make_dispatcher("a")
+    callers = 8
+    barrier = threading.Barrier(callers, timeout=5)
+
+    def together(cancel: threading.Event) -> str:
+        barrier.wait()  # Breaks (and fails the attempt) unless every attempt runs at once.
+        return "Up"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        dispatcher.dispatch({}, fake_attempt({"a": together}, []), bool))) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [result.valid for result in results] == [True] * callers
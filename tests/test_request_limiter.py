@@ -0,0 +1,73 @@
+"""Tests for the first-come, first-served `RequestLimiter`."""
+import threading
+import time
+
+from sims_gba_ai.core.llm_client import RequestLimiter
+
+
+def wait_until(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_no_limit_never_blocks():
+    limiter = RequestLimiter(0)
+    for _ in range(100):
+        assert limiter.acquire() == 0.0
+    assert limiter.queued == 0
+
+
+def test_allows_max_concurrent_without_waiting():
+    limiter = RequestLimiter(2)
+    assert limiter.acquire() == 0.0
+    assert limiter.acquire() == 0.0
+    assert limiter.queued == 0
+
+
+def test_waiters_get_slots_in_arrival_order():
+    limiter = RequestLimiter(1)
+    limiter.acquire()
+    order: list[int] = []
+    threads = []
+    for index in range(5):
+        def waiter(index: int = index) -> None:
+            limiter.acquire()
+            order.append(index)
+            limiter.release()
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        threads.append(thread)
+        # Queue the next waiter only once this one waits.
+        wait_until(lambda: limiter.queued == index + 1)
+
+    limiter.release()
+    for thread in threads:
+        thread.join(5)
+    assert order == [0, 1, 2, 3, 4]
+
+
+def test_released_slot_is_handed_to_the_waiter_not_a_newcomer():
+    limiter = RequestLimiter(1)
+    limiter.acquire()
+    acquired = threading.Event()
+
+    def waiter() -> None:
+        limiter.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    wait_until(lambda: limiter.queued == 1)
+    limiter.release()  # Hands the slot straight to the waiter.
+    assert acquired.wait(5)
+
+    late = threading.Thread(target=limiter.acquire, daemon=True)
+    late.start()
+    wait_until(lambda: limiter.queued == 2)  # The slot is still held by the waiter.
+    assert late.is_alive()
+    limiter.release()
+    late.join(5)
+    assert not late.is_alive()
+    thread.join(5)